@@ -0,0 +1,137 @@
+"""
+Edge JWT verification and verified-claims forwarding
+
+Access tokens are verified at the gateway with the auth service's SECRET_KEY
+and ALGORITHM, so invalid or expired tokens are rejected before any upstream
+hop. Verified tokens are remembered in an LRU keyed by their digest until
+they expire. The verified claims are forwarded in an HMAC-signed internal
+header bound to the token digest, which lets downstream services skip
+decoding the JWT again.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import Request
+from jose import JWTError, jwt
+
+from app.core.config import settings
+
+# Internal header carrying the signed claims; never accepted from clients
+GATEWAY_CLAIMS_HEADER = "x-gateway-claims"
+
+
+class InvalidTokenError(Exception):
+    """The bearer token failed verification"""
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def token_digest(token: str) -> str:
+    """Digest identifying a token without keeping the token itself"""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def sign_claims(claims: Dict[str, Any], digest: str) -> str:
+    """
+    Encode claims for the internal header
+
+    Format: base64url(JSON claims + token digest) "." base64url(HMAC-SHA256).
+    Binding the digest means the header is only valid alongside the token it
+    was issued for.
+    """
+    payload = json.dumps({**claims, "tkn": digest}, separators=(",", ":"), sort_keys=True)
+    encoded = _b64encode(payload.encode("utf-8"))
+    signature = hmac.new(
+        settings.GATEWAY_CLAIMS_SECRET.encode("utf-8"), encoded.encode("ascii"), hashlib.sha256
+    ).digest()
+    return f"{encoded}.{_b64encode(signature)}"
+
+
+class TokenVerifier:
+    """Verifies access tokens and caches the results by token digest"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        # digest -> (claims, signed claims header or None)
+        self._verified: "OrderedDict[str, Tuple[Dict[str, Any], Optional[str]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    def verify(self, token: str) -> Tuple[Dict[str, Any], Optional[str]]:
+        """
+        Verify an access token
+
+        Returns:
+            The claims and the signed claims header (None when forwarding is
+            not configured)
+
+        Raises:
+            InvalidTokenError: If the token is malformed, forged, expired or
+                not an access token
+        """
+        digest = token_digest(token)
+        entry = self._verified.get(digest)
+        if entry is not None:
+            if entry[0]["exp"] > time.time():
+                self._verified.move_to_end(digest)
+                self.hits += 1
+                return entry
+            del self._verified[digest]
+
+        self.misses += 1
+        try:
+            claims = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        except JWTError:
+            self.rejected += 1
+            raise InvalidTokenError("Invalid or expired token")
+        if claims.get("type") != "access" or not claims.get("sub") or not isinstance(claims.get("exp"), (int, float)):
+            self.rejected += 1
+            raise InvalidTokenError("Invalid token payload")
+
+        header = sign_claims(claims, digest) if settings.GATEWAY_CLAIMS_SECRET else None
+        entry = (claims, header)
+        self._verified[digest] = entry
+        if len(self._verified) > self.max_entries:
+            self._verified.popitem(last=False)
+        return entry
+
+    def authenticate(self, request: Request) -> Optional[Dict[str, Any]]:
+        """
+        Verify the request's bearer token, if any
+
+        Verified claims are stored on request.state for routing decisions
+        (cache and rate-limit keys) and for the forwarded claims header.
+
+        Returns:
+            The claims, or None for requests without a bearer token
+
+        Raises:
+            InvalidTokenError: If a bearer token is present but invalid
+        """
+        authorization = request.headers.get("authorization", "")
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return None
+        claims, header = self.verify(token.strip())
+        request.state.claims = claims
+        request.state.claims_header = header
+        return claims
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._verified),
+            "hits": self.hits,
+            "misses": self.misses,
+            "rejected": self.rejected,
+        }
+
+
+token_verifier = TokenVerifier(settings.JWT_CACHE_SIZE)
@@ -0,0 +1,140 @@
+"""
+Replica load balancing and active health checking for upstream services
+
+Each upstream may list several replica URLs. Calls go to the healthy replica
+with the fewest outstanding requests (or the better of two random picks) and
+a background task probes every replica's /health, ejecting replicas after
+consecutive failures and re-adding them after consecutive successes.
+"""
+import asyncio
+import logging
+import random
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import httpx
+
+from app.core.clients import upstream_clients
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+LEAST_OUTSTANDING = "least_outstanding"
+POWER_OF_TWO = "p2c"
+
+
+@dataclass
+class Replica:
+    """One upstream replica and its balancing/health state"""
+    url: str
+    outstanding: int = 0
+    healthy: bool = True
+    consecutive_failures: int = 0
+    consecutive_successes: int = 0
+
+    def absolute_url(self, relative: httpx.URL) -> httpx.URL:
+        """Resolve a relative request URL (path and query) against this replica"""
+        return httpx.URL(self.url.rstrip("/") + relative.raw_path.decode("ascii"))
+
+
+class ReplicaPool:
+    """Replicas of one upstream service"""
+
+    def __init__(self, name: str, urls: Sequence[str], strategy: str):
+        if not urls:
+            raise ValueError(f"Upstream '{name}' has no replica URLs")
+        self.name = name
+        self.strategy = strategy
+        self.replicas: List[Replica] = [Replica(url=url) for url in urls]
+
+    def pick(self, exclude: Sequence[Replica] = ()) -> Replica:
+        """
+        Choose a replica for the next call
+
+        Only healthy replicas are considered; if every replica is ejected the
+        whole pool is used so the circuit breaker, not the balancer, decides.
+        """
+        candidates = [r for r in self.replicas if r.healthy and r not in exclude]
+        if not candidates:
+            candidates = [r for r in self.replicas if r not in exclude] or self.replicas
+        if len(candidates) == 1:
+            return candidates[0]
+        if self.strategy == POWER_OF_TWO:
+            first, second = random.sample(candidates, 2)
+            return first if first.outstanding <= second.outstanding else second
+        return min(candidates, key=lambda r: r.outstanding)
+
+    def record_health(self, replica: Replica, ok: bool) -> None:
+        """Update a replica's health after a probe or a failed connection"""
+        if ok:
+            replica.consecutive_failures = 0
+            replica.consecutive_successes += 1
+            if not replica.healthy and replica.consecutive_successes >= settings.HEALTH_CHECK_HEALTHY_THRESHOLD:
+                replica.healthy = True
+                logger.info(f"Replica {replica.url} of '{self.name}' is healthy again")
+        else:
+            replica.consecutive_successes = 0
+            replica.consecutive_failures += 1
+            if replica.healthy and replica.consecutive_failures >= settings.HEALTH_CHECK_UNHEALTHY_THRESHOLD:
+                replica.healthy = False
+                logger.warning(f"Ejecting replica {replica.url} of '{self.name}'")
+
+    def stats(self) -> List[Dict[str, object]]:
+        return [
+            {"url": r.url, "healthy": r.healthy, "outstanding": r.outstanding}
+            for r in self.replicas
+        ]
+
+
+class Balancer:
+    """Replica pools for all upstreams plus the background health checker"""
+
+    def __init__(self):
+        self._pools: Dict[str, ReplicaPool] = {}
+        self._health_task: Optional[asyncio.Task] = None
+
+    def start(self, upstreams: Dict[str, List[str]]) -> None:
+        """Create the replica pools and start active health checks"""
+        self._pools = {
+            name: ReplicaPool(name, urls, settings.LB_STRATEGY)
+            for name, urls in upstreams.items()
+        }
+        if settings.HEALTH_CHECK_INTERVAL > 0:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def close(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+
+    def pool(self, upstream: str) -> ReplicaPool:
+        return self._pools[upstream]
+
+    async def _probe(self, pool: ReplicaPool, replica: Replica) -> None:
+        client = upstream_clients.get(pool.name)
+        try:
+            response = await client.get(f"{replica.url.rstrip('/')}/health", timeout=settings.HEALTH_CHECK_TIMEOUT)
+            ok = response.status_code == 200
+        except httpx.HTTPError:
+            ok = False
+        pool.record_health(replica, ok)
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.HEALTH_CHECK_INTERVAL)
+            probes = [
+                self._probe(pool, replica)
+                for pool in self._pools.values()
+                for replica in pool.replicas
+            ]
+            await asyncio.gather(*probes, return_exceptions=True)
+
+    def stats(self) -> Dict[str, List[Dict[str, object]]]:
+        return {name: pool.stats() for name, pool in self._pools.items()}
+
+
+balancer = Balancer()
@@ -0,0 +1,230 @@
+"""
+Batch execution - several API calls in one gateway round trip
+
+Each sub-request goes through the regular proxy pipeline (routing, rate
+limits, cache, coalescing, pooled upstream clients) with the caller's own
+headers, so a batch is exactly as authorised as the individual calls.
+Sub-requests run concurrently unless ordered with depends_on.
+"""
+import asyncio
+import base64
+import json
+from typing import Awaitable, Callable, Dict, List, Sequence, Set, Tuple
+from urllib.parse import urlsplit
+
+from fastapi import Request, Response
+
+from app.core.config import settings
+from app.schemas.batch import BatchItem, BatchItemResult
+
+# The proxy entry point: (path relative to /api/v1, request) -> response
+Dispatch = Callable[[str, Request], Awaitable[Response]]
+
+# Parent headers that describe the batch request itself, not its sub-requests.
+# Accept-Encoding is dropped so sub-response bodies come back as plain text.
+BATCH_ONLY_HEADERS = {
+    b"content-length",
+    b"content-type",
+    b"content-encoding",
+    b"transfer-encoding",
+    b"accept-encoding",
+    b"if-none-match",
+    b"if-modified-since",
+}
+
+# Sub-response headers reported back in the batch result
+RESULT_HEADERS = {
+    b"content-type",
+    b"content-encoding",
+    b"cache-control",
+    b"etag",
+    b"location",
+    b"retry-after",
+    b"x-cache",
+}
+
+# Scope keys shared by the batch request and its sub-requests (not "state":
+# each sub-request carries its own verified claims)
+INHERITED_SCOPE_KEYS = ("type", "http_version", "scheme", "server", "client", "root_path", "app")
+
+
+class BatchError(ValueError):
+    """The batch is malformed (too large, duplicate or unknown ids, cycles)"""
+
+
+def validate_batch(items: Sequence[BatchItem]) -> None:
+    """
+    Check a batch before running any of it
+
+    Raises:
+        BatchError: If the batch cannot be executed as given
+    """
+    if len(items) > settings.BATCH_MAX_REQUESTS:
+        raise BatchError(f"A batch may contain at most {settings.BATCH_MAX_REQUESTS} requests")
+
+    by_id: Dict[str, BatchItem] = {}
+    for item in items:
+        if item.id in by_id:
+            raise BatchError(f"Duplicate request id '{item.id}'")
+        if urlsplit(item.path).path.strip("/") == "batch":
+            raise BatchError("Batches cannot be nested")
+        by_id[item.id] = item
+
+    for item in items:
+        for dependency in item.depends_on:
+            if dependency not in by_id:
+                raise BatchError(f"Request '{item.id}' depends on unknown id '{dependency}'")
+
+    # Depth-first search for dependency cycles
+    done: Set[str] = set()
+
+    def visit(item_id: str, path: Tuple[str, ...]) -> None:
+        if item_id in path:
+            raise BatchError(f"Dependency cycle: {' -> '.join(path + (item_id,))}")
+        if item_id in done:
+            return
+        for dependency in by_id[item_id].depends_on:
+            visit(dependency, path + (item_id,))
+        done.add(item_id)
+
+    for item in items:
+        visit(item.id, ())
+
+
+def build_sub_request(parent: Request, item: BatchItem) -> Tuple[str, Request]:
+    """
+    Build the request for one batch item from the caller's request
+
+    Returns:
+        The path relative to /api/v1 and the sub-request
+    """
+    split = urlsplit(item.path)
+    path = split.path.lstrip("/")
+
+    overrides = {name.lower().encode("latin-1"): value for name, value in item.headers.items()}
+    headers: List[Tuple[bytes, bytes]] = [
+        (name, value) for name, value in parent.scope["headers"]
+        if name not in BATCH_ONLY_HEADERS and name not in overrides
+    ]
+    headers.extend((name, value.encode("latin-1")) for name, value in overrides.items())
+
+    body = b""
+    if item.body is not None:
+        body = json.dumps(item.body).encode("utf-8")
+        headers.append((b"content-type", b"application/json"))
+        headers.append((b"content-length", str(len(body)).encode("latin-1")))
+
+    full_path = f"{settings.API_V1_PREFIX}/{path}"
+    scope = {key: parent.scope[key] for key in INHERITED_SCOPE_KEYS if key in parent.scope}
+    scope.update({
+        # ASGI 2.4: responses do not listen for disconnects on this receive
+        "asgi": {"version": "3.0", "spec_version": "2.4"},
+        "method": item.method,
+        "path": full_path,
+        "raw_path": full_path.encode("utf-8"),
+        "query_string": split.query.encode("latin-1"),
+        "headers": headers,
+        "path_params": {"path": path},
+    })
+
+    sent = False
+
+    async def receive() -> dict:
+        nonlocal sent
+        if sent:
+            return {"type": "http.disconnect"}
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return path, Request(scope, receive)
+
+
+async def collect_response(response: Response, request: Request) -> Tuple[int, List[Tuple[bytes, bytes]], bytes]:
+    """Run a response (buffered or streaming) and capture its status, headers and body"""
+    status_code = 500
+    headers: List[Tuple[bytes, bytes]] = []
+    chunks: List[bytes] = []
+
+    async def send(message: dict) -> None:
+        nonlocal status_code, headers
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+            headers = list(message.get("headers", []))
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await response(request.scope, request.receive, send)
+    return status_code, headers, b"".join(chunks)
+
+
+def to_result(item_id: str, status_code: int, headers: List[Tuple[bytes, bytes]], body: bytes) -> BatchItemResult:
+    """Shape a captured sub-response as a batch result item"""
+    result_headers = {
+        name.decode("latin-1"): value.decode("latin-1")
+        for name, value in headers
+        if name.lower() in RESULT_HEADERS
+    }
+    content_type = result_headers.get("content-type", "")
+    result = BatchItemResult(id=item_id, status=status_code, headers=result_headers)
+    if not body:
+        return result
+
+    if "content-encoding" not in result_headers:
+        try:
+            text = body.decode("utf-8")
+        except UnicodeDecodeError:
+            text = None
+        if text is not None:
+            if "json" in content_type:
+                try:
+                    result.body = json.loads(text)
+                    return result
+                except ValueError:
+                    pass
+            result.body = text
+            return result
+
+    result.body = base64.b64encode(body).decode("ascii")
+    result.body_encoding = "base64"
+    return result
+
+
+async def run_batch(items: Sequence[BatchItem], parent: Request, dispatch: Dispatch) -> List[BatchItemResult]:
+    """
+    Execute a batch
+
+    Items without dependencies start immediately and run concurrently; an
+    item with depends_on starts once those items finish, and is answered
+    with 424 without being sent if any of them failed (status >= 400).
+
+    Returns:
+        One result per item, in request order
+
+    Raises:
+        BatchError: If the batch is malformed
+    """
+    validate_batch(items)
+    tasks: Dict[str, asyncio.Task] = {}
+
+    async def run(item: BatchItem) -> BatchItemResult:
+        for dependency in item.depends_on:
+            outcome = await tasks[dependency]
+            if outcome.status >= 400:
+                return BatchItemResult(
+                    id=item.id,
+                    status=424,
+                    headers={"content-type": "application/json"},
+                    body={"detail": f"Dependency '{dependency}' failed with status {outcome.status}"},
+                )
+        path, request = build_sub_request(parent, item)
+        response = await dispatch(path, request)
+        return to_result(item.id, *await collect_response(response, request))
+
+    # Every task is registered before any of them runs, so lookups by id succeed
+    for item in items:
+        tasks[item.id] = asyncio.create_task(run(item))
+    try:
+        return list(await asyncio.gather(*tasks.values()))
+    finally:
+        for task in tasks.values():
+            task.cancel()
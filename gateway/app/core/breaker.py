@@ -0,0 +1,142 @@
+"""
+Per-upstream circuit breaker
+
+CLOSED: calls flow; outcomes are tracked over a rolling window.
+OPEN: calls fail fast until the open period has elapsed.
+HALF_OPEN: a limited number of probe calls decide whether to close or re-open.
+"""
+import time
+from collections import deque
+from typing import Deque, Dict
+
+from app.core.config import settings
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Upstream statuses that mean the service itself is unavailable or stalled
+FAILURE_STATUS_CODES = {502, 503, 504}
+
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker for one upstream"""
+
+    def __init__(
+        self,
+        name: str,
+        window: int,
+        min_calls: int,
+        failure_rate: float,
+        open_seconds: float,
+        half_open_probes: int
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+
+        self.state = CLOSED
+        self._outcomes: Deque[bool] = deque(maxlen=window)  # True = failure
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """
+        Whether a call may go upstream now
+
+        Every allowed call must be followed by exactly one of
+        record_success(), record_failure() or release().
+        """
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                self.rejected += 1
+                return False
+            self.state = HALF_OPEN
+            self._probes_in_flight = 0
+
+        if self.state == HALF_OPEN:
+            if self._probes_in_flight >= self.half_open_probes:
+                self.rejected += 1
+                return False
+            self._probes_in_flight += 1
+
+        return True
+
+    def retry_after(self) -> int:
+        """Seconds until the breaker lets a probe through"""
+        remaining = self.open_seconds - (time.monotonic() - self._opened_at)
+        return max(1, int(remaining + 0.999))
+
+    def record_success(self) -> None:
+        if self.state == OPEN:
+            # A call let through before the trip; the open period runs from the trip
+            return
+        if self.state == HALF_OPEN:
+            self._close()
+            return
+        self._outcomes.append(False)
+
+    def record_failure(self) -> None:
+        if self.state == OPEN:
+            return
+        if self.state == HALF_OPEN:
+            self._open()
+            return
+        self._outcomes.append(True)
+        if len(self._outcomes) >= self.min_calls:
+            failures = sum(self._outcomes)
+            if failures / len(self._outcomes) >= self.failure_rate:
+                self._open()
+
+    def release(self) -> None:
+        """The call ended without an outcome (e.g. the client went away)"""
+        if self.state == HALF_OPEN and self._probes_in_flight > 0:
+            self._probes_in_flight -= 1
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+
+    def _close(self) -> None:
+        self.state = CLOSED
+        self._outcomes.clear()
+        self._probes_in_flight = 0
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "state": self.state,
+            "window_calls": len(self._outcomes),
+            "window_failures": sum(self._outcomes),
+            "rejected": self.rejected,
+        }
+
+
+class BreakerRegistry:
+    """Lazily created circuit breakers, one per upstream"""
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, upstream: str) -> CircuitBreaker:
+        breaker = self._breakers.get(upstream)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                name=upstream,
+                window=settings.BREAKER_WINDOW,
+                min_calls=settings.BREAKER_MIN_CALLS,
+                failure_rate=settings.BREAKER_FAILURE_RATE,
+                open_seconds=settings.BREAKER_OPEN_SECONDS,
+                half_open_probes=settings.BREAKER_HALF_OPEN_PROBES,
+            )
+            self._breakers[upstream] = breaker
+        return breaker
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        return {name: breaker.stats() for name, breaker in self._breakers.items()}
+
+
+breakers = BreakerRegistry()
@@ -0,0 +1,285 @@
+"""
+Gateway response cache for idempotent GET routes
+
+Entries are keyed by method, path, query, Accept-Encoding and auth subject,
+expire after the route's TTL (capped by the upstream Cache-Control max-age)
+and are evicted least-recently-used once the byte budget is exceeded.
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Union
+
+from fastapi import Request, Response
+
+from app.core.config import settings
+from app.core.coalesce import single_flight
+from app.core.proxy import (
+    BufferedResponse, RequestKey, auth_subject, build_upstream_request, fetch_buffered,
+    filter_request_headers, request_key
+)
+from app.core.routing import RouteRule
+
+# Conditional headers are answered by the gateway, never forwarded as-is
+CONDITIONAL_HEADERS = {"if-none-match", "if-modified-since"}
+
+
+def parse_cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+    """Parse a Cache-Control header into {directive: argument}"""
+    directives: Dict[str, Optional[str]] = {}
+    if not value:
+        return directives
+    for part in value.split(","):
+        name, _, argument = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') or None
+    return directives
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+@dataclass
+class CacheEntry:
+    """A cached upstream response"""
+    upstream: str
+    response: BufferedResponse
+    etag: str
+    upstream_etag: Optional[str]  # Set when the upstream itself sent an ETag
+    expires_at: float
+    size: int = field(init=False)
+
+    def __post_init__(self):
+        self.size = len(self.response.body) + sum(len(k) + len(v) for k, v in self.response.headers)
+
+    @property
+    def fresh(self) -> bool:
+        return time.monotonic() < self.expires_at
+
+    def respond(self, request: Request, cache_status: str) -> Response:
+        """Serve the entry, answering If-None-Match with 304 when it matches"""
+        marker = (b"x-cache", cache_status.encode("latin-1"))
+        if etag_matches(request.headers.get("if-none-match"), self.etag):
+            response = Response(status_code=304)
+            response.raw_headers = [
+                (name, value) for name, value in self.response.headers
+                if name in (b"etag", b"cache-control", b"vary")
+            ] + [marker]
+            return response
+        return self.response.to_response(extra_headers=[marker])
+
+
+class ResponseCache:
+    """LRU response cache bounded by a byte budget"""
+
+    def __init__(self, max_bytes: int, max_entry_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries: "OrderedDict[RequestKey, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+
+    def get(self, key: RequestKey) -> Optional[CacheEntry]:
+        """Look up an entry (fresh or stale) and mark it recently used"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: RequestKey, entry: CacheEntry) -> None:
+        """Store an entry and evict least-recently-used ones over the budget"""
+        if entry.size > self.max_entry_bytes:
+            return
+        self.discard(key)
+        self._entries[key] = entry
+        self._bytes += entry.size
+        while self._bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+            self.evictions += 1
+
+    def discard(self, key: RequestKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def invalidate_upstream(self, upstream: str) -> None:
+        """Drop every entry served by an upstream (after a write went through it)"""
+        for key in [k for k, entry in self._entries.items() if entry.upstream == upstream]:
+            self.discard(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def _entry_ttl(rule: RouteRule, response: BufferedResponse) -> Optional[float]:
+    """Cache lifetime for a response, or None if it must not be stored"""
+    if response.status_code != 200:
+        return None
+    return _freshness(rule, response)
+
+
+def _freshness(rule: RouteRule, response: BufferedResponse) -> Optional[float]:
+    """Lifetime allowed by the route TTL and the response's headers, or None"""
+    if response.header("set-cookie") is not None:
+        return None
+    directives = parse_cache_control(response.header("cache-control"))
+    if "no-store" in directives or "no-cache" in directives:
+        return None
+    ttl = rule.cache_ttl
+    max_age = directives.get("s-maxage") or directives.get("max-age")
+    if max_age is not None:
+        try:
+            ttl = min(ttl, float(max_age))
+        except ValueError:
+            pass
+    return ttl if ttl > 0 else None
+
+
+async def _refresh_entry(
+    rule: RouteRule,
+    request: Request,
+    path: str,
+    key: RequestKey,
+    stale: Optional[CacheEntry]
+) -> Union[CacheEntry, BufferedResponse]:
+    """
+    Fetch a missing or stale entry and store it if cacheable
+
+    Stale entries that carry an upstream ETag are revalidated with
+    If-None-Match, so an unchanged resource is refreshed without a body.
+    A 304's Cache-Control replaces the stored one and sets the new lifetime.
+
+    Returns:
+        The stored entry, or the fetched response if it cannot be cached
+    """
+    headers = [(k, v) for k, v in filter_request_headers(request.headers) if k.lower() not in CONDITIONAL_HEADERS]
+    if stale is not None and stale.upstream_etag:
+        headers.append(("if-none-match", stale.upstream_etag))
+
+    upstream_request = build_upstream_request(rule, request, path, headers=headers)
+    fetched = await fetch_buffered(rule, upstream_request)
+
+    if fetched.status_code == 304 and stale is not None:
+        response_cache.revalidations += 1
+        return _revalidated_entry(rule, key, stale, fetched)
+
+    ttl = _entry_ttl(rule, fetched)
+    if ttl is None:
+        response_cache.discard(key)
+        return fetched
+
+    upstream_etag = fetched.header("etag")
+    etag = upstream_etag
+    if etag is None:
+        etag = f'W/"{hashlib.sha1(fetched.body).hexdigest()}"'
+        fetched.headers.append((b"etag", etag.encode("latin-1")))
+
+    entry = CacheEntry(
+        upstream=rule.upstream,
+        response=fetched,
+        etag=etag,
+        upstream_etag=upstream_etag,
+        expires_at=time.monotonic() + ttl,
+    )
+    response_cache.set(key, entry)
+    return entry
+
+
+def _revalidated_entry(
+    rule: RouteRule,
+    key: RequestKey,
+    stale: CacheEntry,
+    not_modified: BufferedResponse
+) -> Union[CacheEntry, BufferedResponse]:
+    """
+    Refresh a stale entry from a 304, with the same freshness rules as a fill
+
+    Returns:
+        The refreshed entry, or the stored response if the 304 forbids
+        keeping it
+    """
+    headers = stale.response.headers
+    cache_control = not_modified.header("cache-control")
+    if cache_control is not None:
+        headers = [(k, v) for k, v in headers if k != b"cache-control"]
+        headers.append((b"cache-control", cache_control.encode("latin-1")))
+    response = BufferedResponse(status_code=stale.response.status_code, headers=headers, body=stale.response.body)
+
+    ttl = _freshness(rule, response) if not_modified.header("set-cookie") is None else None
+    if ttl is None:
+        response_cache.discard(key)
+        return response
+
+    entry = CacheEntry(
+        upstream=stale.upstream,
+        response=response,
+        etag=stale.etag,
+        upstream_etag=stale.upstream_etag,
+        expires_at=time.monotonic() + ttl,
+    )
+    response_cache.set(key, entry)
+    return entry
+
+
+async def serve_cached(rule: RouteRule, request: Request, path: str) -> Response:
+    """
+    Serve a GET from the cache, fetching and storing it on a miss
+
+    Concurrent misses for the same key share a single upstream fetch.
+    """
+    key = request_key(request, path, auth_subject(request))
+    entry = response_cache.get(key)
+    if entry is not None and entry.fresh:
+        response_cache.hits += 1
+        return entry.respond(request, "HIT")
+    response_cache.misses += 1
+
+    def refresh():
+        return _refresh_entry(rule, request, path, key, entry)
+
+    if settings.COALESCE_ENABLED:
+        result = await single_flight.do(key, refresh)
+    else:
+        result = await refresh()
+
+    if isinstance(result, CacheEntry):
+        return result.respond(request, "MISS")
+    return result.to_response(extra_headers=[(b"x-cache", b"MISS")])
+
+
+response_cache = ResponseCache(
+    max_bytes=settings.CACHE_MAX_BYTES,
+    max_entry_bytes=settings.CACHE_MAX_ENTRY_BYTES,
+)
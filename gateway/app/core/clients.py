@@ -0,0 +1,83 @@
+"""
+Long-lived upstream HTTP clients - one keep-alive connection pool per service
+"""
+import logging
+from typing import Dict, Iterable, Optional
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _http2_available() -> bool:
+    """HTTP/2 support in httpx needs the optional 'h2' package"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class UpstreamClients:
+    """
+    Registry of pooled httpx clients keyed by upstream name
+
+    Clients are created once at startup and closed at shutdown, so requests
+    reuse warm keep-alive connections instead of paying for a new TCP
+    connection and client setup on every call.
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        # Transport for every client; None uses the network (tests install a stub)
+        self.transport: Optional[httpx.AsyncBaseTransport] = None
+
+    async def start(self, upstreams: Iterable[str]) -> None:
+        """
+        Create one pooled client per upstream
+
+        Clients have no base URL: each request is addressed to the replica
+        chosen by the balancer, and the pool keeps connections to all of them.
+        """
+        http2 = settings.UPSTREAM_HTTP2
+        if http2 and not _http2_available():
+            logger.warning("UPSTREAM_HTTP2 is enabled but 'h2' is not installed, falling back to HTTP/1.1")
+            http2 = False
+
+        limits = httpx.Limits(
+            max_connections=settings.UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.UPSTREAM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.UPSTREAM_KEEPALIVE_EXPIRY,
+        )
+        timeout = httpx.Timeout(settings.UPSTREAM_TIMEOUT, connect=settings.UPSTREAM_CONNECT_TIMEOUT)
+
+        for name in upstreams:
+            self._clients[name] = httpx.AsyncClient(
+                limits=limits,
+                timeout=timeout,
+                http2=http2,
+                transport=self.transport,
+            )
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """
+        Get the pooled client for an upstream
+
+        Raises:
+            RuntimeError: If the clients have not been started
+        """
+        try:
+            return self._clients[name]
+        except KeyError:
+            raise RuntimeError(f"Upstream client '{name}' is not initialized")
+
+    async def close(self) -> None:
+        """Close all pooled clients and their connections"""
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+
+
+upstream_clients = UpstreamClients()
@@ -0,0 +1,69 @@
+"""
+Request coalescing (single-flight) for identical in-flight GETs
+
+Concurrent callers with the same key share one upstream call and all
+receive its result (or its exception).
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from fastapi import Request, Response
+
+from app.core.proxy import BufferedResponse, auth_subject, build_upstream_request, fetch_buffered, request_key
+from app.core.routing import RouteRule
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Deduplicates concurrent calls that share a key"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, "asyncio.Task"] = {}
+        self.leaders = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run fn once for all concurrent callers with the same key
+
+        The call runs in its own task, so a caller that disconnects (and is
+        cancelled) does not cancel the call for the others still waiting.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: "asyncio.Task") -> None:
+        self._calls.pop(key, None)
+        if not task.cancelled():
+            # Mark the exception as retrieved even if every waiter went away
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "shared": self.shared,
+        }
+
+
+async def serve_coalesced(rule: RouteRule, request: Request, path: str) -> Response:
+    """Forward a GET, sharing the upstream call with identical in-flight requests"""
+    key = request_key(request, path, auth_subject(request))
+
+    async def fetch() -> BufferedResponse:
+        upstream_request = build_upstream_request(rule, request, path)
+        return await fetch_buffered(rule, upstream_request)
+
+    buffered = await single_flight.do(key, fetch)
+    return buffered.to_response()
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,139 @@
+"""
+Configuration for API Gateway
+"""
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Load .env from project root (3 levels up from this file)
+env_path = Path(__file__).parent.parent.parent.parent / ".env"
+load_dotenv(dotenv_path=env_path)
+
+
+def _env_bool(name: str, default: str = "false") -> bool:
+    """Read a boolean flag from the environment"""
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_list(name: str, default: str) -> list:
+    """Read a comma-separated list from the environment"""
+    return [item.strip() for item in os.getenv(name, default).split(",") if item.strip()]
+
+
+class Settings:
+    """Application settings"""
+    APP_NAME: str = "API Gateway"
+    VERSION: str = "1.0.0"
+    API_V1_PREFIX: str = "/api/v1"
+
+    # Service URLs (defaults for local development); each may be a
+    # comma-separated list of replica URLs
+    AUTH_SERVICE_URL: str = os.getenv("AUTH_SERVICE_URL", "http://localhost:8001")
+    NOTIFICATION_SERVICE_URL: str = os.getenv("NOTIFICATION_SERVICE_URL", "http://localhost:8002")
+    LEGACY_SERVICE_URL: str = os.getenv("LEGACY_SERVICE_URL", "http://localhost:8003")
+
+    # Upstream name (as used in route rules) -> replica base URLs
+    UPSTREAMS: dict = {
+        "auth": _env_list("AUTH_SERVICE_URL", AUTH_SERVICE_URL),
+        "notification": _env_list("NOTIFICATION_SERVICE_URL", NOTIFICATION_SERVICE_URL),
+        "legacy": _env_list("LEGACY_SERVICE_URL", LEGACY_SERVICE_URL),
+    }
+
+    # Replica balancing: "least_outstanding" or "p2c" (power of two choices)
+    LB_STRATEGY: str = os.getenv("LB_STRATEGY", "p2c")
+
+    # Active replica health checks against each replica's /health (0 disables)
+    HEALTH_CHECK_INTERVAL: float = float(os.getenv("HEALTH_CHECK_INTERVAL", "5"))
+    HEALTH_CHECK_TIMEOUT: float = float(os.getenv("HEALTH_CHECK_TIMEOUT", "2"))
+    HEALTH_CHECK_UNHEALTHY_THRESHOLD: int = int(os.getenv("HEALTH_CHECK_UNHEALTHY_THRESHOLD", "2"))
+    HEALTH_CHECK_HEALTHY_THRESHOLD: int = int(os.getenv("HEALTH_CHECK_HEALTHY_THRESHOLD", "2"))
+
+    # Deep health: upstreams whose /health/deep is probed in the background
+    DEEP_HEALTH_UPSTREAMS: list = _env_list("DEEP_HEALTH_UPSTREAMS", "auth,notification")
+    DEEP_HEALTH_INTERVAL: float = float(os.getenv("DEEP_HEALTH_INTERVAL", "15"))
+    DEEP_HEALTH_TIMEOUT: float = float(os.getenv("DEEP_HEALTH_TIMEOUT", "3"))
+
+    # Retries and hedging (opt-in per route): budget as a fraction of calls
+    RETRY_BUDGET_RATIO: float = float(os.getenv("RETRY_BUDGET_RATIO", "0.1"))
+    RETRY_BUDGET_MIN_PER_SECOND: float = float(os.getenv("RETRY_BUDGET_MIN_PER_SECOND", "1"))
+    RETRY_BACKOFF_BASE: float = float(os.getenv("RETRY_BACKOFF_BASE", "0.05"))
+    RETRY_BACKOFF_MAX: float = float(os.getenv("RETRY_BACKOFF_MAX", "1.0"))
+
+    # Token-bucket rate limits ("memory", or "shared" for multi-worker deployments)
+    RATE_LIMIT_ENABLED: bool = _env_bool("RATE_LIMIT_ENABLED", "true")
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    RATE_LIMIT_MAX_KEYS: int = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+    RATE_LIMIT_SHM_NAME: str = os.getenv("RATE_LIMIT_SHM_NAME", "gateway_ratelimit")
+    RATE_LIMIT_SHM_SLOTS: int = int(os.getenv("RATE_LIMIT_SHM_SLOTS", "65536"))
+    RATE_LIMIT_TRUST_FORWARDED: bool = _env_bool("RATE_LIMIT_TRUST_FORWARDED")
+
+    # Edge JWT verification (same key and algorithm as the auth service)
+    JWT_VERIFY_ENABLED: bool = _env_bool("JWT_VERIFY_ENABLED", "true")
+    SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
+    ALGORITHM: str = "HS256"
+    JWT_CACHE_SIZE: int = int(os.getenv("JWT_CACHE_SIZE", "10000"))
+    # Shared with the services to sign forwarded claims (empty: do not forward)
+    GATEWAY_CLAIMS_SECRET: str = os.getenv("GATEWAY_CLAIMS_SECRET", "")
+
+    # Server-Sent Events push channel (/api/v1/events) and its publish token
+    GATEWAY_INTERNAL_TOKEN: str = os.getenv("GATEWAY_INTERNAL_TOKEN", "")
+    EVENTS_REPLAY_SIZE: int = int(os.getenv("EVENTS_REPLAY_SIZE", "100"))
+    EVENTS_MAX_CHANNELS: int = int(os.getenv("EVENTS_MAX_CHANNELS", "10000"))
+    EVENTS_MAX_QUEUED: int = int(os.getenv("EVENTS_MAX_QUEUED", "256"))
+    EVENTS_KEEPALIVE: float = float(os.getenv("EVENTS_KEEPALIVE", "15"))
+    EVENTS_RETRY_MS: int = int(os.getenv("EVENTS_RETRY_MS", "3000"))
+
+    # Batch endpoint: maximum sub-requests per call
+    BATCH_MAX_REQUESTS: int = int(os.getenv("BATCH_MAX_REQUESTS", "20"))
+
+    # Response compression (brotli/zstd need the optional 'brotli'/'zstandard' packages)
+    COMPRESSION_ENABLED: bool = _env_bool("COMPRESSION_ENABLED", "true")
+    COMPRESSION_MIN_SIZE: int = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+    COMPRESSION_GZIP_LEVEL: int = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+    COMPRESSION_BROTLI_QUALITY: int = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+    COMPRESSION_ZSTD_LEVEL: int = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+
+    # Load shedding: reject API requests beyond this many in flight (0 disables)
+    SHED_MAX_IN_FLIGHT: int = int(os.getenv("SHED_MAX_IN_FLIGHT", "0"))
+
+    # Route table (JSON file with a list of rules; empty uses the built-in table)
+    GATEWAY_ROUTES_FILE: str = os.getenv("GATEWAY_ROUTES_FILE", "")
+
+    # Token required by the gateway's management endpoints (disabled when empty)
+    GATEWAY_ADMIN_TOKEN: str = os.getenv("GATEWAY_ADMIN_TOKEN", "")
+
+    # Upstream connection pools (one long-lived pool per upstream)
+    UPSTREAM_MAX_CONNECTIONS: int = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+    UPSTREAM_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("UPSTREAM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    UPSTREAM_KEEPALIVE_EXPIRY: float = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "5.0"))
+    UPSTREAM_HTTP2: bool = _env_bool("UPSTREAM_HTTP2")
+    UPSTREAM_TIMEOUT: float = float(os.getenv("UPSTREAM_TIMEOUT", "30.0"))
+    UPSTREAM_CONNECT_TIMEOUT: float = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "5.0"))
+
+    # Stream request/response bodies through the gateway instead of buffering them
+    PROXY_STREAMING: bool = _env_bool("PROXY_STREAMING", "true")
+
+    # Response cache for GET routes with a cache_ttl
+    CACHE_ENABLED: bool = _env_bool("CACHE_ENABLED", "true")
+    CACHE_MAX_BYTES: int = int(os.getenv("CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+    CACHE_MAX_ENTRY_BYTES: int = int(os.getenv("CACHE_MAX_ENTRY_BYTES", str(1024 * 1024)))
+
+    # Single-flight coalescing of identical in-flight GETs (coalesce routes and cache misses)
+    COALESCE_ENABLED: bool = _env_bool("COALESCE_ENABLED", "true")
+
+    # Circuit breaker per upstream
+    BREAKER_WINDOW: int = int(os.getenv("BREAKER_WINDOW", "20"))
+    BREAKER_MIN_CALLS: int = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+    BREAKER_FAILURE_RATE: float = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+    BREAKER_OPEN_SECONDS: float = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+    BREAKER_HALF_OPEN_PROBES: int = int(os.getenv("BREAKER_HALF_OPEN_PROBES", "1"))
+
+    # Adaptive per-route timeouts (p99 x multiplier, clamped to the route budget)
+    ADAPTIVE_TIMEOUTS: bool = _env_bool("ADAPTIVE_TIMEOUTS", "true")
+    ADAPTIVE_TIMEOUT_MULTIPLIER: float = float(os.getenv("ADAPTIVE_TIMEOUT_MULTIPLIER", "3.0"))
+    ADAPTIVE_TIMEOUT_MIN: float = float(os.getenv("ADAPTIVE_TIMEOUT_MIN", "1.0"))
+    ADAPTIVE_TIMEOUT_MIN_SAMPLES: int = int(os.getenv("ADAPTIVE_TIMEOUT_MIN_SAMPLES", "50"))
+    LATENCY_WINDOW: int = int(os.getenv("LATENCY_WINDOW", "500"))
+
+
+settings = Settings()
@@ -0,0 +1,162 @@
+"""
+In-memory event bus behind the Server-Sent Events push channel
+
+Services publish events (new pending action, vote cast, action confirmed or
+rejected, wallet transaction) to user and group channels; every open SSE
+connection subscribed to one of those channels receives them. Each channel
+keeps a short replay buffer so a client reconnecting with Last-Event-ID does
+not miss events published in between.
+
+The bus lives in the gateway process: with several gateway workers,
+publishers and subscribers must reach the same worker (one worker, or
+sticky routing for /api/v1/events and /internal/events).
+"""
+import asyncio
+import itertools
+import json
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Deque, Dict, Iterable, List, Optional, Set
+
+from app.core.config import settings
+
+# Event types the services publish
+PENDING_ACTION_CREATED = "pending_action.created"
+VOTE_CAST = "vote.cast"
+ACTION_CONFIRMED = "action.confirmed"
+ACTION_REJECTED = "action.rejected"
+WALLET_TRANSACTION = "wallet.transaction"
+EVENT_TYPES = {PENDING_ACTION_CREATED, VOTE_CAST, ACTION_CONFIRMED, ACTION_REJECTED, WALLET_TRANSACTION}
+
+
+def user_channel(user_id: Any) -> str:
+    return f"user:{user_id}"
+
+
+def group_channel(group_id: Any) -> str:
+    return f"group:{group_id}"
+
+
+@dataclass(frozen=True)
+class Event:
+    """One published event"""
+    id: int
+    type: str
+    channel: str
+    data: Dict[str, Any]
+
+    def encode(self) -> bytes:
+        """Server-Sent Events wire format"""
+        payload = json.dumps({"channel": self.channel, "data": self.data}, separators=(",", ":"))
+        return f"id: {self.id}\nevent: {self.type}\ndata: {payload}\n\n".encode("utf-8")
+
+
+class Subscription:
+    """A subscriber's queue; the oldest events are dropped if it falls behind"""
+
+    def __init__(self, channels: Set[str], max_queued: int):
+        self.channels = channels
+        self.queue: "asyncio.Queue[Event]" = asyncio.Queue(maxsize=max_queued)
+        self.dropped = 0
+
+    def deliver(self, event: Event) -> None:
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+
+class EventBus:
+    """Channel-based publish/subscribe with per-channel replay buffers"""
+
+    def __init__(self, replay_size: int, max_channels: int, max_queued: int):
+        self.replay_size = replay_size
+        self.max_channels = max_channels
+        self.max_queued = max_queued
+        self._ids = itertools.count(1)
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._replay: "OrderedDict[str, Deque[Event]]" = OrderedDict()
+        self.published = 0
+
+    def subscribe(self, channels: Iterable[str], last_event_id: Optional[int] = None) -> Subscription:
+        """
+        Subscribe to channels
+
+        With last_event_id, buffered events newer than it are queued first
+        (as many as the replay buffers still hold).
+        """
+        subscription = Subscription(set(channels), self.max_queued)
+        if last_event_id is not None:
+            missed: List[Event] = [
+                event
+                for channel in subscription.channels
+                for event in self._replay.get(channel, ())
+                if event.id > last_event_id
+            ]
+            for event in sorted(missed, key=lambda e: e.id):
+                subscription.deliver(event)
+        for channel in subscription.channels:
+            self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        for channel in subscription.channels:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+    def publish(self, event_type: str, channel: str, data: Dict[str, Any]) -> int:
+        """
+        Publish an event to a channel
+
+        Returns:
+            Number of subscriptions it was delivered to
+        """
+        event = Event(id=next(self._ids), type=event_type, channel=channel, data=data)
+        self.published += 1
+
+        buffer = self._replay.get(channel)
+        if buffer is None:
+            buffer = deque(maxlen=self.replay_size)
+            self._replay[channel] = buffer
+            if len(self._replay) > self.max_channels:
+                self._replay.popitem(last=False)
+        else:
+            self._replay.move_to_end(channel)
+        buffer.append(event)
+
+        subscribers = self._subscribers.get(channel, ())
+        for subscription in subscribers:
+            subscription.deliver(event)
+        return len(subscribers)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "channels": len(self._subscribers),
+            "subscriptions": len({s for subs in self._subscribers.values() for s in subs}),
+            "published": self.published,
+        }
+
+
+event_bus = EventBus(
+    replay_size=settings.EVENTS_REPLAY_SIZE,
+    max_channels=settings.EVENTS_MAX_CHANNELS,
+    max_queued=settings.EVENTS_MAX_QUEUED,
+)
+
+
+async def event_stream(subscription: Subscription) -> AsyncIterator[bytes]:
+    """SSE response body: queued events, with comment lines as keep-alives"""
+    try:
+        yield f"retry: {settings.EVENTS_RETRY_MS}\n\n".encode("utf-8")
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), timeout=settings.EVENTS_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            yield event.encode()
+    finally:
+        event_bus.unsubscribe(subscription)
@@ -0,0 +1,122 @@
+"""
+Aggregated deep health, probed in the background
+
+Every DEEP_HEALTH_INTERVAL seconds the gateway calls /health/deep on each
+replica of the probed upstreams (auth_service reports its database,
+notification_service its Celery broker) and keeps the latest results.
+/health/deep on the gateway serves that snapshot, so orchestrator polling
+never turns into synchronous upstream calls.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from app.core.balancer import balancer
+from app.core.clients import upstream_clients
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+HEALTHY = "healthy"
+UNHEALTHY = "unhealthy"
+STARTING = "starting"
+
+
+class DeepHealthMonitor:
+    """Background prober and cache of upstream deep health"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._services: Dict[str, Dict[str, Any]] = {}
+        self._checked_at: Optional[datetime] = None
+        self._checked_monotonic = 0.0
+
+    def start(self) -> None:
+        """Start probing; the first round runs immediately"""
+        if settings.DEEP_HEALTH_INTERVAL > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _probe_replica(self, upstream: str, url: str) -> Dict[str, Any]:
+        client = upstream_clients.get(upstream)
+        started = time.perf_counter()
+        try:
+            response = await client.get(f"{url.rstrip('/')}/health/deep", timeout=settings.DEEP_HEALTH_TIMEOUT)
+            try:
+                body = response.json()
+            except ValueError:
+                body = {}
+            result = {
+                "status": HEALTHY if response.status_code == 200 else UNHEALTHY,
+                "components": body.get("components", {}) if isinstance(body, dict) else {},
+            }
+        except httpx.HTTPError as e:
+            result = {"status": UNHEALTHY, "error": str(e) or type(e).__name__, "components": {}}
+        result["url"] = url
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return result
+
+    async def _probe_service(self, upstream: str) -> Dict[str, Any]:
+        replicas = [replica.url for replica in balancer.pool(upstream).replicas]
+        results: List[Dict[str, Any]] = await asyncio.gather(
+            *(self._probe_replica(upstream, url) for url in replicas)
+        )
+        # The service is up while any replica is; its components are reported
+        # by the first healthy replica
+        healthy = [result for result in results if result["status"] == HEALTHY]
+        reporter = healthy[0] if healthy else results[0]
+        return {
+            "status": HEALTHY if healthy else UNHEALTHY,
+            "latency_ms": reporter["latency_ms"],
+            "components": reporter["components"],
+            "replicas": [
+                {key: result[key] for key in ("url", "status", "latency_ms", "error") if key in result}
+                for result in results
+            ],
+        }
+
+    async def probe(self) -> None:
+        """Run one round of probes and replace the cached snapshot"""
+        upstreams = [name for name in settings.DEEP_HEALTH_UPSTREAMS if name in settings.UPSTREAMS]
+        results = await asyncio.gather(*(self._probe_service(name) for name in upstreams))
+        self._services = dict(zip(upstreams, results))
+        self._checked_at = datetime.now(timezone.utc)
+        self._checked_monotonic = time.monotonic()
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.probe()
+            except Exception:
+                logger.exception("Deep health probe round failed")
+            await asyncio.sleep(settings.DEEP_HEALTH_INTERVAL)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Latest aggregated health; 'starting' until the first round completes"""
+        if self._checked_at is None:
+            return {"status": STARTING, "services": {}}
+
+        age = time.monotonic() - self._checked_monotonic
+        stale = age > 3 * settings.DEEP_HEALTH_INTERVAL
+        healthy = not stale and all(service["status"] == HEALTHY for service in self._services.values())
+        return {
+            "status": HEALTHY if healthy else UNHEALTHY,
+            "checked_at": self._checked_at.isoformat(),
+            "age_seconds": round(age, 1),
+            "services": self._services,
+        }
+
+
+deep_health = DeepHealthMonitor()
@@ -0,0 +1,91 @@
+"""
+Observed upstream latency per route, used to derive adaptive timeout budgets
+"""
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from app.core.config import settings
+
+
+class LatencyTracker:
+    """
+    Rolling window of recent latencies for one route
+
+    Percentiles are recomputed every few samples instead of on every
+    lookup, so reading them on the hot path is a dictionary access.
+    """
+
+    RECOMPUTE_EVERY = 20
+
+    def __init__(self, window: int):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._since_recompute = 0
+        self._percentiles: Dict[int, float] = {}
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        self._since_recompute += 1
+        if self._since_recompute >= self.RECOMPUTE_EVERY:
+            self._recompute()
+
+    def _recompute(self) -> None:
+        ordered = sorted(self._samples)
+        last = len(ordered) - 1
+        self._percentiles = {p: ordered[min(last, int(last * p / 100 + 0.5))] for p in (50, 95, 99)}
+        self._since_recompute = 0
+
+    @property
+    def count(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: int) -> Optional[float]:
+        """p50, p95 or p99 in seconds; None until enough samples were seen"""
+        if len(self._samples) < settings.ADAPTIVE_TIMEOUT_MIN_SAMPLES:
+            return None
+        if not self._percentiles:
+            self._recompute()
+        return self._percentiles.get(p)
+
+
+class LatencyRegistry:
+    """Latency trackers keyed by route prefix"""
+
+    def __init__(self):
+        self._trackers: Dict[str, LatencyTracker] = {}
+
+    def get(self, route: str) -> LatencyTracker:
+        tracker = self._trackers.get(route)
+        if tracker is None:
+            tracker = LatencyTracker(settings.LATENCY_WINDOW)
+            self._trackers[route] = tracker
+        return tracker
+
+    def timeout_for(self, route: str, budget: float) -> float:
+        """
+        Timeout for the next call on a route
+
+        Derived from the observed p99 times a safety multiplier, clamped to
+        [ADAPTIVE_TIMEOUT_MIN, budget]; the route's full budget is used until
+        enough samples exist or when adaptive timeouts are disabled.
+        """
+        if not settings.ADAPTIVE_TIMEOUTS:
+            return budget
+        p99 = self.get(route).percentile(99)
+        if p99 is None:
+            return budget
+        adaptive = p99 * settings.ADAPTIVE_TIMEOUT_MULTIPLIER
+        return min(budget, max(settings.ADAPTIVE_TIMEOUT_MIN, adaptive))
+
+    def stats(self) -> Dict[str, Dict[str, Optional[float]]]:
+        return {
+            route: {
+                "samples": tracker.count,
+                "p50": tracker.percentile(50),
+                "p95": tracker.percentile(95),
+                "p99": tracker.percentile(99),
+            }
+            for route, tracker in self._trackers.items()
+        }
+
+
+latencies = LatencyRegistry()
@@ -0,0 +1,215 @@
+"""
+Request metrics in Prometheus text format
+
+Counters and histograms are plain integers and lists updated on the event
+loop thread, so recording a request takes no locks and a few dictionary
+lookups. Every worker process keeps its own series; Prometheus sums them
+across scrape targets.
+
+Time is split into upstream time (until the upstream's response headers,
+summed over all upstream calls a request made) and gateway overhead (time
+to the gateway's own response headers minus upstream time).
+"""
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Upper bounds in seconds; the +Inf bucket is implicit
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# Upstream seconds spent on behalf of the current request (set per request)
+upstream_seconds: ContextVar[Optional[List[float]]] = ContextVar("upstream_seconds", default=None)
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [
+        '{}="{}"'.format(name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels
+    ]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class Counter:
+    """Monotonic counter per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str]):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(tuple(zip(self.label_names, values)))} {_format_value(value)}"
+            for values, value in self._values.items()
+        ]
+
+
+class Gauge(Counter):
+    """Value that goes up and down per label set"""
+
+    kind = "gauge"
+
+    def dec(self, *label_values: str, amount: float = 1) -> None:
+        self._values[label_values] = self._values.get(label_values, 0) - amount
+
+
+class Histogram:
+    """Bucketed observations per label set (non-cumulative counts, summed on render)"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str], buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts..., +Inf count], sum
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        series = self._series.get(label_values)
+        if series is None:
+            series = ([0] * (len(self.buckets) + 1), [0.0])
+            self._series[label_values] = series
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1][0] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        for values, (counts, total) in self._series.items():
+            labels = tuple(zip(self.label_names, values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = 'le="{}"'.format(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total[0])}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Gateway metrics and their Prometheus rendering"""
+
+    def __init__(self):
+        self.requests = Counter(
+            "gateway_requests_total", "Requests handled by the gateway",
+            ("route", "upstream", "method", "status"),
+        )
+        self.in_flight = Gauge(
+            "gateway_requests_in_flight", "Requests currently being handled", (),
+        )
+        self.in_flight.inc(amount=0)
+        self.upstream_in_flight = Gauge(
+            "gateway_upstream_requests_in_flight", "Calls currently waiting on an upstream", ("upstream",),
+        )
+        self.retries = Counter(
+            "gateway_upstream_retries_total", "Extra upstream calls sent as retries or hedges",
+            ("upstream", "kind"),
+        )
+        self.request_duration = Histogram(
+            "gateway_request_duration_seconds", "Time until the response was fully sent",
+            ("route", "upstream", "status"),
+        )
+        self.overhead = Histogram(
+            "gateway_overhead_seconds", "Time to the gateway's response headers not spent waiting on upstreams",
+            ("route", "upstream", "status"),
+        )
+        self.upstream_duration = Histogram(
+            "gateway_upstream_duration_seconds", "Time until an upstream's response headers arrived",
+            ("route", "upstream", "status"),
+        )
+        self._metrics = (
+            self.requests, self.in_flight, self.upstream_in_flight, self.retries,
+            self.request_duration, self.overhead, self.upstream_duration,
+        )
+
+    def observe_upstream(self, route: str, upstream: str, status: str, seconds: float) -> None:
+        """Record one upstream call and charge it to the current request"""
+        self.upstream_duration.observe(seconds, route, upstream, status)
+        spent = upstream_seconds.get()
+        if spent is not None:
+            spent[0] += seconds
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    Times every HTTP request and records it when the response completes
+
+    Proxied requests are labelled with the matched route prefix and
+    upstream, which gateway_proxy stores in the request state; other
+    endpoints are labelled with their path template.
+    """
+
+    def __init__(self, app, registry: MetricsRegistry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        registry = self.registry
+        started = time.perf_counter()
+        spent = [0.0]
+        token = upstream_seconds.set(spent)
+        headers_at: Optional[float] = None
+        status_code = 500
+
+        async def send_wrapper(message: dict) -> None:
+            nonlocal headers_at, status_code
+            if message["type"] == "http.response.start":
+                headers_at = time.perf_counter()
+                status_code = message["status"]
+            await send(message)
+
+        registry.in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            upstream_seconds.reset(token)
+            registry.in_flight.dec()
+            finished = time.perf_counter()
+            route, upstream = self._labels(scope)
+            status = str(status_code)
+            registry.requests.inc(route, upstream, scope["method"], status)
+            registry.request_duration.observe(finished - started, route, upstream, status)
+            until_headers = (headers_at or finished) - started
+            registry.overhead.observe(max(0.0, until_headers - spent[0]), route, upstream, status)
+
+    @staticmethod
+    def _labels(scope) -> Tuple[str, str]:
+        state = scope.get("state") or {}
+        if "route" in state:
+            return state["route"], state.get("upstream", "none")
+        route = scope.get("route")
+        if route is not None and getattr(route, "path", None) and "{path:path}" not in route.path:
+            return route.path, "none"
+        return "unmatched", "none"
+
+
+metrics = MetricsRegistry()
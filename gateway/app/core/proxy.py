@@ -0,0 +1,195 @@
+"""
+Upstream forwarding helpers - buffered and streaming passthrough
+"""
+import hashlib
+from dataclasses import dataclass
+from typing import AsyncIterator, List, Mapping, Optional, Sequence, Tuple
+
+import httpx
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+from app.core.auth import GATEWAY_CLAIMS_HEADER
+from app.core.clients import upstream_clients
+from app.core.routing import RouteRule
+from app.core.upstream import send
+
+# Connection-scoped headers that must not be forwarded by a proxy (RFC 7230 section 6.1)
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailer",
+    "trailers",
+    "transfer-encoding",
+    "upgrade",
+}
+
+# Headers the gateway's own server sets on every response
+SERVER_HEADERS = {"date", "server"}
+
+# Identity of a request for caching and coalescing:
+# (method, path, sorted query, Accept-Encoding, auth subject)
+RequestKey = Tuple[str, str, Tuple[Tuple[str, str], ...], str, str]
+
+
+@dataclass
+class BufferedResponse:
+    """A fully read upstream response (raw body, forwardable headers)"""
+    status_code: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+
+    def header(self, name: str) -> Optional[str]:
+        """First value of a response header, or None"""
+        key = name.lower().encode("latin-1")
+        for header_name, value in self.headers:
+            if header_name == key:
+                return value.decode("latin-1")
+        return None
+
+    def to_response(self, extra_headers: Sequence[Tuple[bytes, bytes]] = ()) -> Response:
+        """Build the client response"""
+        response = Response(content=self.body, status_code=self.status_code)
+        response.raw_headers = list(self.headers) + list(extra_headers)
+        return response
+
+
+def filter_request_headers(headers: Mapping[str, str]) -> List[Tuple[str, str]]:
+    """Headers to send upstream: everything except Host, hop-by-hop and gateway-internal headers"""
+    return [
+        (key, value) for key, value in headers.items()
+        if key.lower() not in ("host", GATEWAY_CLAIMS_HEADER) and key.lower() not in HOP_BY_HOP_HEADERS
+    ]
+
+
+def filter_response_headers(response: httpx.Response) -> List[Tuple[bytes, bytes]]:
+    """Raw upstream response headers minus hop-by-hop ones (keeps repeated Set-Cookie)"""
+    excluded = HOP_BY_HOP_HEADERS | SERVER_HEADERS
+    return [
+        (key.lower(), value) for key, value in response.headers.raw
+        if key.decode("latin-1").lower() not in excluded
+    ]
+
+
+def auth_subject(request: Request) -> str:
+    """Identify the caller (verified user id, else digest of the Authorization header)"""
+    claims = getattr(request.state, "claims", None)
+    if claims is not None:
+        return f"user:{claims['sub']}"
+    authorization = request.headers.get("authorization")
+    if not authorization or getattr(request.state, "token_rejected", False):
+        return "anonymous"
+    return hashlib.sha256(authorization.encode("utf-8")).hexdigest()
+
+
+def request_key(request: Request, path: str, subject: str) -> RequestKey:
+    """
+    Key identifying equivalent requests
+
+    Accept-Encoding is part of the key because bodies are relayed raw, and
+    the auth subject keeps one caller's responses from reaching another.
+    """
+    return (
+        request.method,
+        path,
+        tuple(sorted(request.query_params.multi_items())),
+        request.headers.get("accept-encoding", ""),
+        subject,
+    )
+
+
+def request_has_body(request: Request) -> bool:
+    """True if the client announced a request body"""
+    return "content-length" in request.headers or "transfer-encoding" in request.headers
+
+
+async def _stream_request_body(request: Request) -> AsyncIterator[bytes]:
+    """Yield the client request body chunk by chunk"""
+    async for chunk in request.stream():
+        if chunk:
+            yield chunk
+
+
+def build_upstream_request(
+    rule: RouteRule,
+    request: Request,
+    path: str,
+    content=None,
+    headers: Optional[List[Tuple[str, str]]] = None
+) -> httpx.Request:
+    """
+    Build the upstream request for a client request matched by a rule
+
+    If no content is given the client body is piped through as a stream.
+    If no headers are given the filtered client headers are forwarded.
+    Claims verified at the edge are added as the signed internal header; a
+    bearer token rejected on a public route is not forwarded at all.
+    """
+    if content is None and request_has_body(request):
+        content = _stream_request_body(request)
+
+    if headers is None:
+        headers = filter_request_headers(request.headers)
+    if getattr(request.state, "token_rejected", False):
+        headers = [(key, value) for key, value in headers if key.lower() != "authorization"]
+    claims_header = getattr(request.state, "claims_header", None)
+    if claims_header:
+        headers = list(headers) + [(GATEWAY_CLAIMS_HEADER, claims_header)]
+
+    client = upstream_clients.get(rule.upstream)
+    return client.build_request(
+        method=request.method,
+        url=rule.upstream_path(path),
+        params=list(request.query_params.multi_items()),
+        headers=headers,
+        content=content,
+    )
+
+
+async def forward_streaming(rule: RouteRule, upstream_request: httpx.Request) -> Response:
+    """
+    Send a request upstream and pipe the response back chunk by chunk
+
+    The upstream body is relayed raw (still content-encoded), so memory per
+    request stays flat and the client gets its first byte as soon as the
+    upstream sends it. The upstream response is closed once the body is sent.
+    """
+    upstream_response = await send(rule, upstream_request)
+
+    response = StreamingResponse(
+        upstream_response.aiter_raw(),
+        status_code=upstream_response.status_code,
+        background=BackgroundTask(upstream_response.aclose),
+    )
+    response.raw_headers = filter_response_headers(upstream_response)
+    return response
+
+
+async def fetch_buffered(rule: RouteRule, upstream_request: httpx.Request) -> BufferedResponse:
+    """
+    Send a request upstream and read the whole response body
+
+    The raw (still content-encoded) bytes are kept so the forwarded
+    Content-Encoding and Content-Length headers stay accurate.
+    """
+    upstream_response = await send(rule, upstream_request)
+    try:
+        body = b"".join([chunk async for chunk in upstream_response.aiter_raw()])
+    finally:
+        await upstream_response.aclose()
+
+    return BufferedResponse(
+        status_code=upstream_response.status_code,
+        headers=filter_response_headers(upstream_response),
+        body=body,
+    )
+
+
+async def forward_buffered(rule: RouteRule, upstream_request: httpx.Request) -> Response:
+    """Send a request upstream and reply with the fully read response body"""
+    buffered = await fetch_buffered(rule, upstream_request)
+    return buffered.to_response()
@@ -0,0 +1,228 @@
+"""
+Token-bucket rate limiting and load shedding
+
+Buckets are keyed by route and client key (IP, auth subject or telegram_id)
+and live in process memory, or in a shared-memory table so every worker
+process of a multi-worker deployment draws from the same buckets.
+"""
+import fcntl
+import hashlib
+import json
+import math
+import os
+import struct
+import time
+from collections import OrderedDict
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, Sequence, Tuple
+
+from fastapi import Request
+
+from app.core.config import settings
+from app.core.proxy import auth_subject
+from app.core.routing import KEY_SUBJECT, KEY_TELEGRAM_ID, RateLimit
+
+
+def _refill(tokens: float, updated: float, now: float, rate: float, burst: int) -> float:
+    return min(float(burst), tokens + (now - updated) * rate)
+
+
+class MemoryBackend:
+    """Buckets in a process-local dictionary (bounded, least recently used dropped)"""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def take(self, key: str, rate: float, burst: int, now: float) -> float:
+        """
+        Take one token from a bucket
+
+        Returns:
+            0 if the token was granted, else seconds until one is available
+        """
+        tokens, updated = self._buckets.pop(key, (float(burst), now))
+        tokens = _refill(tokens, updated, now, rate, burst)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class SharedMemoryBackend:
+    """
+    Buckets in a fixed-size open-addressing table in POSIX shared memory
+
+    Each slot holds (key hash, tokens, last update). Access is serialised
+    across processes with an flock on a side file; the critical section is
+    a handful of slot reads and one write.
+    """
+
+    SLOT = struct.Struct("Qdd")
+    PROBES = 8
+
+    def __init__(self, name: str, slots: int):
+        self.slots = slots
+        size = self.SLOT.size * slots
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            self._shm = shared_memory.SharedMemory(name=name)
+        # Workers attach and detach independently; keep the tracker from
+        # unlinking the segment when any one of them exits
+        resource_tracker.unregister(self._shm._name, "shared_memory")
+        self._lock_fd = os.open(f"/tmp/{name}.lock", os.O_CREAT | os.O_RDWR, 0o600)
+
+    def take(self, key: str, rate: float, burst: int, now: float) -> float:
+        digest = int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little") or 1
+        start = digest % self.slots
+        buf = self._shm.buf
+
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            slot, tokens, updated = None, float(burst), now
+            stalest, stalest_time = None, math.inf
+            for i in range(self.PROBES):
+                index = (start + i) % self.slots
+                slot_hash, slot_tokens, slot_updated = self.SLOT.unpack_from(buf, index * self.SLOT.size)
+                if slot_hash == digest:
+                    slot, tokens, updated = index, slot_tokens, slot_updated
+                    break
+                if slot_hash == 0:
+                    slot = index
+                    break
+                if slot_updated < stalest_time:
+                    stalest, stalest_time = index, slot_updated
+            if slot is None:
+                slot = stalest  # Table region is full: recycle the stalest bucket
+
+            tokens = _refill(tokens, updated, now, rate, burst)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self.SLOT.pack_into(buf, slot * self.SLOT.size, digest, tokens, now)
+            return wait
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+
+class RateLimiter:
+    """Applies route rate limits to requests"""
+
+    def __init__(self):
+        self._backend = None
+        self.limited = 0
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            if settings.RATE_LIMIT_BACKEND == "shared":
+                self._backend = SharedMemoryBackend(settings.RATE_LIMIT_SHM_NAME, settings.RATE_LIMIT_SHM_SLOTS)
+            else:
+                self._backend = MemoryBackend(settings.RATE_LIMIT_MAX_KEYS)
+        return self._backend
+
+    def client_key(self, limit: RateLimit, request: Request) -> str:
+        """Identify the client; falls back to the IP when the key is absent"""
+        if limit.key == KEY_SUBJECT:
+            subject = auth_subject(request)
+            if subject != "anonymous":
+                return f"sub:{subject}"
+        elif limit.key == KEY_TELEGRAM_ID:
+            telegram_id = request.headers.get("x-telegram-id") or request.query_params.get("telegram_id")
+            if telegram_id:
+                return f"tg:{telegram_id}"
+        return f"ip:{client_ip(request)}"
+
+    def check(self, prefix: str, limit: RateLimit, request: Request) -> float:
+        """
+        Take a token for this request
+
+        Returns:
+            0 if allowed, else seconds the client should wait
+        """
+        key = f"{prefix}|{self.client_key(limit, request)}"
+        wait = self.backend.take(key, limit.rate, limit.burst, time.monotonic())
+        if wait:
+            self.limited += 1
+        return wait
+
+
+def client_ip(request: Request) -> str:
+    """Client address, honouring X-Forwarded-For only behind a trusted proxy"""
+    if settings.RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+class LoadShedder:
+    """In-flight request accounting for load shedding"""
+
+    def __init__(self, max_in_flight: int):
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.shed = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": self.in_flight,
+            "shed": self.shed,
+            "max_in_flight": self.max_in_flight,
+        }
+
+
+class LoadSheddingMiddleware:
+    """
+    Rejects API requests early once too many are in flight
+
+    Requests beyond SHED_MAX_IN_FLIGHT get an immediate 503 instead of
+    queueing behind work the gateway cannot finish in time. In-flight time
+    covers the whole response, including streamed bodies.
+    """
+
+    def __init__(self, app, shedder: "LoadShedder", path_prefix: str, exempt_paths: Sequence[str] = ()):
+        self.app = app
+        self.shedder = shedder
+        self.path_prefix = path_prefix
+        self.exempt_paths = tuple(exempt_paths)  # e.g. long-lived event streams
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or not path.startswith(self.path_prefix) or path in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        shedder = self.shedder
+        if shedder.max_in_flight and shedder.in_flight >= shedder.max_in_flight:
+            shedder.shed += 1
+            body = json.dumps({"detail": "Gateway overloaded, please retry"}).encode("utf-8")
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode("latin-1")),
+                    (b"retry-after", b"1"),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        shedder.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            shedder.in_flight -= 1
+
+
+load_shedder = LoadShedder(settings.SHED_MAX_IN_FLIGHT)
+rate_limiter = RateLimiter()
@@ -0,0 +1,88 @@
+"""
+Retry budgets and backoff for idempotent upstream calls
+
+Every original call deposits a fraction of a retry into its upstream's
+budget and every retry or hedged request withdraws a whole one, so extra
+load stays at roughly RETRY_BUDGET_RATIO of normal traffic. A small
+per-second reserve lets low-traffic upstreams still retry occasionally.
+"""
+import random
+import time
+from typing import Dict
+
+from app.core.config import settings
+
+# Retried calls must be safe to repeat; hedged calls must also be side-effect free
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+def backoff(attempt: int) -> float:
+    """Delay before retry number `attempt` (1-based): exponential with full jitter"""
+    ceiling = min(settings.RETRY_BACKOFF_MAX, settings.RETRY_BACKOFF_BASE * 2 ** (attempt - 1))
+    return random.uniform(0, ceiling)
+
+
+class RetryBudget:
+    """Retry allowance for one upstream"""
+
+    def __init__(self, ratio: float, min_per_second: float):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        # Earned balance is capped at what roughly the last 100 calls paid in
+        self.max_balance = max(1.0, ratio * 100)
+        self.balance = 0.0
+        self._reserve = max(1.0, min_per_second)
+        self._reserve_at = time.monotonic()
+        self.retries = 0
+        self.hedges = 0
+        self.exhausted = 0
+
+    def deposit(self) -> None:
+        """Credit one original call"""
+        self.balance = min(self.max_balance, self.balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        """Take one retry from the budget; False if none is left"""
+        now = time.monotonic()
+        self._reserve = min(
+            max(1.0, self.min_per_second),
+            self._reserve + (now - self._reserve_at) * self.min_per_second,
+        )
+        self._reserve_at = now
+        if self.balance >= 1:
+            self.balance -= 1
+            return True
+        if self._reserve >= 1:
+            self._reserve -= 1
+            return True
+        self.exhausted += 1
+        return False
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "balance": round(self.balance, 2),
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "exhausted": self.exhausted,
+        }
+
+
+class RetryBudgetRegistry:
+    """Lazily created retry budgets, one per upstream"""
+
+    def __init__(self):
+        self._budgets: Dict[str, RetryBudget] = {}
+
+    def get(self, upstream: str) -> RetryBudget:
+        budget = self._budgets.get(upstream)
+        if budget is None:
+            budget = RetryBudget(settings.RETRY_BUDGET_RATIO, settings.RETRY_BUDGET_MIN_PER_SECOND)
+            self._budgets[upstream] = budget
+        return budget
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        return {name: budget.stats() for name, budget in self._budgets.items()}
+
+
+retry_budgets = RetryBudgetRegistry()
@@ -0,0 +1,282 @@
+"""
+Declarative route table - compiled into a segment trie for O(path segments) lookups
+"""
+import json
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Default route table. Prefixes are relative to /api/v1, "{name}" matches any
+# single segment and a trailing "/*" is accepted for readability (every rule
+# already matches everything below its prefix). The most specific rule wins.
+# "cache_ttl" (seconds) enables the gateway response cache for GETs,
+# "coalesce" shares one upstream call between identical in-flight GETs and
+# "rate_limit" applies a token bucket per client (key: ip, sub or telegram_id),
+# "retries" retries idempotent calls on another replica, "hedge" sends a
+# duplicate GET to another replica when the first is slower than the route's p95
+# and "public" forwards requests with an invalid bearer token anonymously
+# instead of rejecting them (clients may send a stale token to login).
+DEFAULT_ROUTES: List[Dict[str, Any]] = [
+    # Auth service
+    {"prefix": "/auth", "upstream": "auth"},
+    {"prefix": "/auth/login", "upstream": "auth", "public": True, "rate_limit": {"rate": 1, "burst": 5, "key": "ip"}},
+    {"prefix": "/auth/signup", "upstream": "auth", "public": True, "rate_limit": {"rate": 0.2, "burst": 3, "key": "ip"}},
+    {"prefix": "/auth/verify-otp", "upstream": "auth", "public": True},
+    {"prefix": "/auth/refresh", "upstream": "auth", "public": True},
+    {"prefix": "/auth/request-password-reset", "upstream": "auth", "public": True},
+    {"prefix": "/auth/reset-password", "upstream": "auth", "public": True},
+    {"prefix": "/admin", "upstream": "auth"},
+    {"prefix": "/register", "upstream": "auth", "public": True},
+    {"prefix": "/link-telegram", "upstream": "auth", "public": True},
+    {"prefix": "/users", "upstream": "auth", "retries": 2, "hedge": True},
+    {"prefix": "/users/{user_id}/groups", "upstream": "auth", "cache_ttl": 30, "retries": 2, "hedge": True},
+    {"prefix": "/groups", "upstream": "auth", "cache_ttl": 30, "retries": 2, "hedge": True},
+    {"prefix": "/admin/stats", "upstream": "auth", "cache_ttl": 15},
+
+    # Notification service
+    {"prefix": "/send-email", "upstream": "notification", "timeout": 10.0},
+    {"prefix": "/send-sms", "upstream": "notification", "timeout": 10.0},
+    {"prefix": "/send-push", "upstream": "notification", "timeout": 10.0},
+
+    # Legacy monolith (main.py) - served without the /api/v1 prefix
+    {"prefix": "/expenses", "upstream": "legacy", "strip_prefix": True},
+    {"prefix": "/groups/{group_id}/wallet/*", "upstream": "legacy", "strip_prefix": True},
+    {"prefix": "/groups/{group_id}/wallet/balance", "upstream": "legacy", "strip_prefix": True, "cache_ttl": 10},
+    {
+        "prefix": "/balance-summary", "upstream": "legacy", "strip_prefix": True, "coalesce": True,
+        "rate_limit": {"rate": 2, "burst": 5, "key": "sub"},
+    },
+    {"prefix": "/categories", "upstream": "legacy", "strip_prefix": True, "cache_ttl": 300},
+    {"prefix": "/actions", "upstream": "legacy", "strip_prefix": True},
+    {"prefix": "/actions/pending", "upstream": "legacy", "strip_prefix": True, "coalesce": True},
+    {"prefix": "/debts", "upstream": "legacy", "strip_prefix": True},
+    {
+        "prefix": "/debts/history", "upstream": "legacy", "strip_prefix": True,
+        "rate_limit": {"rate": 2, "burst": 5, "key": "sub"},
+    },
+]
+
+
+KEY_IP = "ip"
+KEY_SUBJECT = "sub"
+KEY_TELEGRAM_ID = "telegram_id"
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Token bucket parameters for a route"""
+    rate: float  # Tokens added per second
+    burst: int  # Bucket capacity
+    key: str = KEY_IP  # What identifies a client: ip, sub or telegram_id
+
+    @classmethod
+    def from_dict(cls, spec: Dict[str, Any]) -> "RateLimit":
+        if not isinstance(spec, dict):
+            raise ValueError(f"Rate limit must be an object: {spec!r}")
+        key = spec.get("key", KEY_IP)
+        if key not in (KEY_IP, KEY_SUBJECT, KEY_TELEGRAM_ID):
+            raise ValueError(f"Unknown rate limit key: {key!r}")
+        try:
+            rate, burst = float(spec["rate"]), int(spec["burst"])
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Rate limit needs numeric 'rate' and 'burst': {spec}") from e
+        if rate <= 0 or burst < 1:
+            raise ValueError(f"Rate limit needs rate > 0 and burst >= 1: {spec}")
+        return cls(rate=rate, burst=burst, key=key)
+
+
+@dataclass(frozen=True)
+class RouteRule:
+    """A single routing rule"""
+    prefix: str
+    upstream: str
+    timeout: Optional[float] = None  # Seconds; None uses the upstream client default
+    strip_prefix: bool = False  # Forward without the /api/v1 prefix
+    cache_ttl: float = 0.0  # Seconds to cache GET responses; 0 disables caching
+    coalesce: bool = False  # Share one upstream call between identical in-flight GETs
+    rate_limit: Optional[RateLimit] = None
+    retries: int = 0  # Extra attempts for idempotent methods on failure
+    hedge: bool = False  # Duplicate slow GETs to a second replica
+    public: bool = False  # Forward invalid bearer tokens' requests anonymously instead of 401
+
+    @classmethod
+    def from_dict(cls, spec: Dict[str, Any]) -> "RouteRule":
+        """
+        Build a rule from its declarative form
+
+        Raises:
+            ValueError: If the spec is malformed or names an unknown upstream
+        """
+        if not isinstance(spec, dict):
+            raise ValueError(f"Route rule must be an object: {spec!r}")
+        if not isinstance(spec.get("prefix"), str) or not isinstance(spec.get("upstream"), str):
+            raise ValueError(f"Route rule needs string 'prefix' and 'upstream': {spec}")
+        if spec["upstream"] not in settings.UPSTREAMS:
+            raise ValueError(f"Unknown upstream '{spec['upstream']}' in route {spec['prefix']!r}")
+        try:
+            return cls(
+                prefix=spec["prefix"],
+                upstream=spec["upstream"],
+                timeout=float(spec["timeout"]) if spec.get("timeout") is not None else None,
+                strip_prefix=bool(spec.get("strip_prefix", False)),
+                cache_ttl=float(spec.get("cache_ttl", 0)),
+                coalesce=bool(spec.get("coalesce", False)),
+                rate_limit=RateLimit.from_dict(spec["rate_limit"]) if spec.get("rate_limit") else None,
+                retries=int(spec.get("retries", 0)),
+                hedge=bool(spec.get("hedge", False)),
+                public=bool(spec.get("public", False)),
+            )
+        except TypeError as e:
+            raise ValueError(f"Invalid option in route {spec['prefix']!r}: {e}") from e
+
+    def upstream_path(self, path: str) -> str:
+        """Path to request on the upstream for a path relative to /api/v1"""
+        if self.strip_prefix:
+            return f"/{path}"
+        return f"{settings.API_V1_PREFIX}/{path}"
+
+
+def _split(path: str) -> List[str]:
+    """Split a path into its non-empty segments"""
+    return [segment for segment in path.split("/") if segment]
+
+
+def _is_param(segment: str) -> bool:
+    return segment.startswith("{") and segment.endswith("}")
+
+
+@dataclass
+class _Node:
+    """Trie node - literal children, one parameter child and an optional rule"""
+    children: Dict[str, "_Node"] = field(default_factory=dict)
+    param: Optional["_Node"] = None
+    param_name: Optional[str] = None
+    rule: Optional[RouteRule] = None
+
+
+class RouteTrie:
+    """
+    Prefix trie over path segments
+
+    Lookups return the deepest rule along the path (longest prefix match).
+    A literal segment takes precedence over a parameter at the same position;
+    when the literal branch leads to no rule, the lookup backtracks and tries
+    the parameter branch instead.
+    """
+
+    def __init__(self, rules: List[RouteRule]):
+        self.rules = rules
+        self._root = _Node()
+        for rule in rules:
+            self._insert(rule)
+
+    def _insert(self, rule: RouteRule) -> None:
+        segments = _split(rule.prefix)
+        if segments and segments[-1] == "*":
+            segments = segments[:-1]
+        if not segments:
+            raise ValueError(f"Route prefix must not be empty: {rule.prefix!r}")
+
+        node = self._root
+        for segment in segments:
+            if _is_param(segment):
+                if node.param is None:
+                    node.param = _Node()
+                    node.param_name = segment[1:-1]
+                node = node.param
+            else:
+                node = node.children.setdefault(segment, _Node())
+
+        if node.rule is not None:
+            raise ValueError(f"Duplicate route prefix: {rule.prefix!r}")
+        node.rule = rule
+
+    def match(self, path: str) -> Tuple[Optional[RouteRule], Dict[str, str]]:
+        """
+        Find the most specific rule for a path relative to /api/v1
+
+        Returns:
+            (rule, path parameters) or (None, {}) if no rule matches
+        """
+        found = self._match(self._root, _split(path), 0, {})
+        return found if found is not None else (None, {})
+
+    def _match(
+        self,
+        node: _Node,
+        segments: List[str],
+        index: int,
+        params: Dict[str, str]
+    ) -> Optional[Tuple[RouteRule, Dict[str, str]]]:
+        """Deepest rule at or below node for segments[index:], literal branch first"""
+        if index < len(segments):
+            segment = segments[index]
+            child = node.children.get(segment)
+            if child is not None:
+                found = self._match(child, segments, index + 1, params)
+                if found is not None:
+                    return found
+            if node.param is not None:
+                found = self._match(node.param, segments, index + 1, {**params, node.param_name: segment})
+                if found is not None:
+                    return found
+
+        if node.rule is not None:
+            return node.rule, params
+        return None
+
+
+class RouteTable:
+    """
+    Holds the compiled route trie and allows it to be reloaded at runtime
+
+    Reloads compile a complete new trie and swap it in with a single
+    assignment, so in-flight lookups never see a half-built table.
+    """
+
+    def __init__(self):
+        self._trie = RouteTrie([])
+        self._lock = threading.Lock()
+
+    @property
+    def rules(self) -> List[RouteRule]:
+        return self._trie.rules
+
+    def _load_specs(self) -> List[Dict[str, Any]]:
+        """Read route specs from GATEWAY_ROUTES_FILE, falling back to the defaults"""
+        if not settings.GATEWAY_ROUTES_FILE:
+            return DEFAULT_ROUTES
+        with open(settings.GATEWAY_ROUTES_FILE, encoding="utf-8") as f:
+            data = json.load(f)
+        specs = data.get("routes") if isinstance(data, dict) else data
+        if not isinstance(specs, list):
+            raise ValueError("Route file must hold a list of routes or an object with a 'routes' list")
+        return specs
+
+    def load(self) -> int:
+        """
+        Compile the route table and swap it in
+
+        Returns:
+            Number of rules loaded
+
+        Raises:
+            ValueError, OSError: If the table cannot be read or compiled;
+                the previous table stays active
+        """
+        with self._lock:
+            rules = [RouteRule.from_dict(spec) for spec in self._load_specs()]
+            self._trie = RouteTrie(rules)
+        logger.info(f"Loaded {len(rules)} gateway routes")
+        return len(rules)
+
+    def match(self, path: str) -> Tuple[Optional[RouteRule], Dict[str, str]]:
+        return self._trie.match(path)
+
+
+route_table = RouteTable()
@@ -0,0 +1,250 @@
+"""
+Sending requests upstream - replica selection, circuit breaking, adaptive
+timeouts, retries and hedging
+"""
+import asyncio
+import time
+from typing import List, Optional, Set
+
+import httpx
+
+from app.core.balancer import Replica, ReplicaPool, balancer
+from app.core.breaker import FAILURE_STATUS_CODES, CircuitBreaker, breakers
+from app.core.clients import upstream_clients
+from app.core.config import settings
+from app.core.latency import latencies
+from app.core.metrics import metrics
+from app.core.retry import IDEMPOTENT_METHODS, SAFE_METHODS, RetryBudget, backoff, retry_budgets
+from app.core.routing import RouteRule
+
+
+class CircuitOpenError(Exception):
+    """The upstream's circuit breaker is open; the call was not attempted"""
+
+    def __init__(self, upstream: str, retry_after: int):
+        self.upstream = upstream
+        self.retry_after = retry_after
+        super().__init__(f"Circuit open for upstream '{upstream}'")
+
+
+async def send(rule: RouteRule, upstream_request: httpx.Request) -> httpx.Response:
+    """
+    Send a request upstream and return the response with its body unread
+
+    The request URL is relative; it is addressed to the replica picked by the
+    balancer. The upstream's circuit breaker is consulted first and updated
+    with the outcome: httpx.RequestError (including timeouts) and 502/503/504
+    count as failures. The timeout is the route's adaptive budget.
+
+    Routes with retries or hedging enabled get them for idempotent methods
+    whose body can be replayed.
+
+    Raises:
+        CircuitOpenError: If the breaker rejects the call
+        httpx.RequestError: If the upstream cannot be reached in time
+    """
+    breaker = breakers.get(rule.upstream)
+    if not breaker.allow():
+        raise CircuitOpenError(rule.upstream, breaker.retry_after())
+
+    budget = rule.timeout or settings.UPSTREAM_TIMEOUT
+    timeout = latencies.timeout_for(rule.prefix, budget)
+    upstream_request.extensions["timeout"] = httpx.Timeout(
+        timeout, connect=min(timeout, settings.UPSTREAM_CONNECT_TIMEOUT)
+    ).as_dict()
+
+    pool = balancer.pool(rule.upstream)
+    replayable = isinstance(upstream_request.stream, httpx.ByteStream)
+    if (rule.retries or rule.hedge) and replayable and upstream_request.method in IDEMPOTENT_METHODS:
+        return await _send_with_retries(rule, upstream_request, pool, breaker)
+    return await _attempt(rule, upstream_request, pool, pool.pick(), breaker)
+
+
+def _clone(upstream_request: httpx.Request, relative: httpx.URL) -> httpx.Request:
+    """Fresh copy of a request with a replayable body, addressed by relative URL"""
+    return httpx.Request(
+        upstream_request.method,
+        relative,
+        headers=upstream_request.headers.copy(),
+        stream=upstream_request.stream,
+        extensions=dict(upstream_request.extensions),
+    )
+
+
+async def _send_with_retries(
+    rule: RouteRule,
+    upstream_request: httpx.Request,
+    pool: ReplicaPool,
+    breaker: CircuitBreaker
+) -> httpx.Response:
+    """
+    Send with the route's retry and hedging policy
+
+    Connection errors, timeouts and 502/503/504 are retried on another
+    replica after a jittered backoff, up to rule.retries times. Each retry
+    needs a token from the upstream's retry budget and, once the backoff has
+    elapsed, the breaker's consent.
+    """
+    budget = retry_budgets.get(rule.upstream)
+    budget.deposit()
+    relative = upstream_request.url
+    hedge = rule.hedge and upstream_request.method in SAFE_METHODS
+    tried: List[Replica] = []
+    attempt = 0
+
+    while True:
+        replica = pool.pick(exclude=tried)
+        tried.append(replica)
+        try:
+            if hedge:
+                response = await _hedged(rule, upstream_request, relative, pool, replica, tried, breaker, budget)
+            else:
+                response = await _attempt(rule, _clone(upstream_request, relative), pool, replica, breaker)
+        except (httpx.ConnectError, httpx.TimeoutException):
+            if attempt >= rule.retries or not budget.withdraw() or not await _backoff_then_allow(attempt, breaker):
+                raise
+        else:
+            if (
+                response.status_code not in FAILURE_STATUS_CODES
+                or attempt >= rule.retries
+                or not budget.withdraw()
+            ):
+                return response
+            try:
+                allowed = await _backoff_then_allow(attempt, breaker)
+            except BaseException:
+                await response.aclose()
+                raise
+            if not allowed:
+                return response
+            await response.aclose()
+
+        attempt += 1
+        budget.retries += 1
+        metrics.retries.inc(rule.upstream, "retry")
+
+
+async def _backoff_then_allow(attempt: int, breaker: CircuitBreaker) -> bool:
+    """
+    Wait out the backoff before retry number attempt + 1, then ask the breaker
+
+    The breaker is asked last: a half-open probe slot taken before the sleep
+    would never be given back if the request were cancelled during it.
+    """
+    await asyncio.sleep(backoff(attempt + 1))
+    return breaker.allow()
+
+
+async def _hedged(
+    rule: RouteRule,
+    upstream_request: httpx.Request,
+    relative: httpx.URL,
+    pool: ReplicaPool,
+    primary: Replica,
+    tried: List[Replica],
+    breaker: CircuitBreaker,
+    budget: RetryBudget
+) -> httpx.Response:
+    """
+    Send to one replica and, if it has not answered by the route's p95,
+    send a duplicate to another; the first good response wins and the other
+    call is cancelled
+    """
+    tasks = [asyncio.ensure_future(_attempt(rule, _clone(upstream_request, relative), pool, primary, breaker))]
+    winner: Optional[httpx.Response] = None
+    try:
+        p95 = latencies.get(rule.prefix).percentile(95)
+        if p95 is not None:
+            done, _ = await asyncio.wait(tasks, timeout=p95)
+            if not done:
+                replica = pool.pick(exclude=tried)
+                if replica not in tried and budget.withdraw() and breaker.allow():
+                    tried.append(replica)
+                    budget.hedges += 1
+                    metrics.retries.inc(rule.upstream, "hedge")
+                    tasks.append(asyncio.ensure_future(
+                        _attempt(rule, _clone(upstream_request, relative), pool, replica, breaker)
+                    ))
+
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None and task.result().status_code not in FAILURE_STATUS_CODES:
+                    winner = task.result()
+                    return winner
+
+        # No attempt succeeded: surface the primary's outcome
+        winner = tasks[0].result()
+        return winner
+    finally:
+        for task in tasks:
+            if not task.done():
+                # The call may still produce a response before it sees the cancellation
+                task.cancel()
+                task.add_done_callback(_close_abandoned)
+            elif not task.cancelled() and task.exception() is None and task.result() is not winner:
+                await task.result().aclose()
+
+
+# Closes of abandoned hedge responses in flight (referenced until they finish)
+_closing: Set["asyncio.Task[None]"] = set()
+
+
+def _close_abandoned(task: "asyncio.Future[httpx.Response]") -> None:
+    """Done-callback of a cancelled hedge attempt: close the response it returned anyway"""
+    if task.cancelled() or task.exception() is not None:
+        return
+    closing = asyncio.ensure_future(task.result().aclose())
+    _closing.add(closing)
+    closing.add_done_callback(_closing.discard)
+
+
+async def _attempt(
+    rule: RouteRule,
+    upstream_request: httpx.Request,
+    pool: ReplicaPool,
+    replica: Replica,
+    breaker: CircuitBreaker
+) -> httpx.Response:
+    """One call to one replica; the breaker must already have allowed it"""
+    upstream_request.url = replica.absolute_url(upstream_request.url)
+    upstream_request.headers["host"] = upstream_request.url.netloc.decode("ascii")
+
+    client = upstream_clients.get(rule.upstream)
+    started = time.perf_counter()
+    replica.outstanding += 1
+    metrics.upstream_in_flight.inc(rule.upstream)
+    outcome = "error"
+    try:
+        response = await client.send(upstream_request, stream=True)
+        outcome = str(response.status_code)
+    except httpx.ConnectError:
+        # Passive health signal: the replica refused or dropped the connection
+        pool.record_health(replica, False)
+        breaker.record_failure()
+        raise
+    except httpx.TimeoutException:
+        # Timed-out calls still count as samples so the budget can grow back
+        outcome = "timeout"
+        latencies.get(rule.prefix).record(time.perf_counter() - started)
+        breaker.record_failure()
+        raise
+    except httpx.RequestError:
+        breaker.record_failure()
+        raise
+    except BaseException:
+        outcome = "cancelled"
+        breaker.release()
+        raise
+    finally:
+        replica.outstanding -= 1
+        metrics.upstream_in_flight.dec(rule.upstream)
+        metrics.observe_upstream(rule.prefix, rule.upstream, outcome, time.perf_counter() - started)
+
+    latencies.get(rule.prefix).record(time.perf_counter() - started)
+    if response.status_code in FAILURE_STATUS_CODES:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return response
@@ -1,22 +1,63 @@
 """
 API Gateway - Main entry point for all microservices
 """
-from fastapi import FastAPI, Request, Response
+import json
+import math
+from contextlib import asynccontextmanager
+from typing import Optional, Set
+
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 import httpx
-import os
-from pathlib import Path
-from dotenv import load_dotenv
 
-# Load .env from project root (2 levels up from this file)
-env_path = Path(__file__).parent.parent.parent / ".env"
-load_dotenv(dotenv_path=env_path)
+from app.core.config import settings
+from app.core.auth import InvalidTokenError, token_verifier
+from app.core.balancer import balancer
+from app.core.batch import BatchError, build_sub_request, collect_response, run_batch
+from app.core.breaker import breakers
+from app.core.cache import response_cache, serve_cached
+from app.core.clients import upstream_clients
+from app.core.coalesce import serve_coalesced, single_flight
+from app.core.compression import CompressionMiddleware
+from app.core.events import EVENT_TYPES, event_bus, event_stream, group_channel, user_channel
+from app.core.proxy import build_upstream_request, forward_buffered, forward_streaming
+from app.core.health import HEALTHY, deep_health
+from app.core.latency import latencies
+from app.core.metrics import MetricsMiddleware, metrics
+from app.core.ratelimit import LoadSheddingMiddleware, load_shedder, rate_limiter
+from app.core.retry import retry_budgets
+from app.core.routing import route_table
+from app.core.upstream import CircuitOpenError
+from app.schemas.batch import BatchItem, BatchRequest, BatchResponse
+from app.schemas.events import EventPublish
+
+# Service URLs (defaults for local development)
+AUTH_SERVICE_URL = settings.AUTH_SERVICE_URL
+NOTIFICATION_SERVICE_URL = settings.NOTIFICATION_SERVICE_URL
+LEGACY_SERVICE_URL = settings.LEGACY_SERVICE_URL
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Compile the route table, open the pooled upstream clients and start health checks"""
+    route_table.load()
+    await upstream_clients.start(settings.UPSTREAMS)
+    balancer.start(settings.UPSTREAMS)
+    deep_health.start()
+    try:
+        yield
+    finally:
+        await deep_health.close()
+        await balancer.close()
+        await upstream_clients.close()
+
 
 app = FastAPI(
-    title="API Gateway",
-    version="1.0.0",
-    description="API Gateway for Money Management Microservices"
+    title=settings.APP_NAME,
+    version=settings.VERSION,
+    description="API Gateway for Money Management Microservices",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -26,11 +67,24 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Keyset pagination cursor of GET /users and /groups
+    expose_headers=["X-Next-Cursor"],
 )
 
-# Service URLs (defaults for local development)
-AUTH_SERVICE_URL = os.getenv("AUTH_SERVICE_URL", "http://localhost:8001")
-NOTIFICATION_SERVICE_URL = os.getenv("NOTIFICATION_SERVICE_URL", "http://localhost:8002")
+# Compress JSON/text responses the upstreams sent uncompressed
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MIN_SIZE)
+
+# Load shedding runs before any routing work (event streams are long-lived, not load)
+app.add_middleware(
+    LoadSheddingMiddleware,
+    shedder=load_shedder,
+    path_prefix=settings.API_V1_PREFIX,
+    exempt_paths=[f"{settings.API_V1_PREFIX}/events"]
+)
+
+# Outermost, so shed and rejected requests are measured too
+app.add_middleware(MetricsMiddleware, registry=metrics)
 
 
 @app.get("/")
@@ -38,11 +92,12 @@ def root():
     """Root endpoint"""
     return {
         "service": "API Gateway",
-        "version": "1.0.0",
+        "version": settings.VERSION,
         "status": "running",
         "services": {
             "auth": AUTH_SERVICE_URL,
-            "notification": NOTIFICATION_SERVICE_URL
+            "notification": NOTIFICATION_SERVICE_URL,
+            "legacy": LEGACY_SERVICE_URL
         }
     }
 
@@ -53,46 +108,264 @@ def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/health/deep")
+def deep_health_check():
+    """Aggregated upstream, database and broker health from the last background probe"""
+    snapshot = deep_health.snapshot()
+    return JSONResponse(
+        status_code=200 if snapshot["status"] == HEALTHY else 503,
+        content=snapshot
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Request counters and latency histograms in Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+def require_gateway_admin(x_gateway_admin_token: str = Header(default="")):
+    """Guard for gateway management endpoints"""
+    if not settings.GATEWAY_ADMIN_TOKEN or x_gateway_admin_token != settings.GATEWAY_ADMIN_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Gateway admin token required"
+        )
+
+
+def require_internal_token(x_gateway_internal_token: str = Header(default="")):
+    """Guard for service-to-gateway endpoints"""
+    if not settings.GATEWAY_INTERNAL_TOKEN or x_gateway_internal_token != settings.GATEWAY_INTERNAL_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Gateway internal token required"
+        )
+
+
+@app.post("/gateway/routes/reload", dependencies=[Depends(require_gateway_admin)])
+def reload_routes():
+    """Recompile the route table without restarting the gateway"""
+    try:
+        count = route_table.load()
+    except (OSError, ValueError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Route table not reloaded: {str(e)}"
+        )
+    return {"message": "Route table reloaded", "routes": count}
+
+
+@app.get("/gateway/cache/stats", dependencies=[Depends(require_gateway_admin)])
+def cache_stats():
+    """Response cache hit/miss counters and size"""
+    return response_cache.stats()
+
+
+@app.get("/gateway/coalesce/stats", dependencies=[Depends(require_gateway_admin)])
+def coalesce_stats():
+    """Single-flight counters: calls led upstream and calls that shared a result"""
+    return single_flight.stats()
+
+
+@app.get("/gateway/auth/stats", dependencies=[Depends(require_gateway_admin)])
+def auth_stats():
+    """Edge token verification cache counters"""
+    return token_verifier.stats()
+
+
+@app.get("/gateway/limits", dependencies=[Depends(require_gateway_admin)])
+def limit_stats():
+    """Rate limiting and load shedding counters"""
+    return {
+        "rate_limited": rate_limiter.limited,
+        "load_shedding": load_shedder.stats()
+    }
+
+
+@app.get("/gateway/events/stats", dependencies=[Depends(require_gateway_admin)])
+def event_stats():
+    """Open event-stream subscriptions and published event count"""
+    return event_bus.stats()
+
+
+@app.post("/internal/events", dependencies=[Depends(require_internal_token)])
+def publish_event(event: EventPublish):
+    """Publish an event to users' and groups' event streams (called by services)"""
+    if event.type not in EVENT_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Unknown event type: {event.type}"
+        )
+    delivered = 0
+    for user_id in event.user_ids:
+        delivered += event_bus.publish(event.type, user_channel(user_id), event.data)
+    for group_id in event.group_ids:
+        delivered += event_bus.publish(event.type, group_channel(group_id), event.data)
+    return {"delivered": delivered}
+
+
+@app.get("/gateway/upstreams", dependencies=[Depends(require_gateway_admin)])
+def upstream_stats():
+    """Replica health, circuit breaker states, retry budgets and observed latency per route"""
+    return {
+        "replicas": balancer.stats(),
+        "breakers": breakers.stats(),
+        "retry_budgets": retry_budgets.stats(),
+        "latency": latencies.stats()
+    }
+
+
+# Registered before the catch-all proxy route so it is matched first
+@app.post("/api/v1/batch", response_model=BatchResponse)
+async def batch(payload: BatchRequest, request: Request):
+    """Run several API calls concurrently and return all results in one response"""
+    try:
+        results = await run_batch(payload.requests, request, gateway_proxy)
+    except BatchError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return BatchResponse(responses=results)
+
+
+async def member_group_ids(request: Request, user_id: str) -> Set[str]:
+    """
+    Ids of the groups a user belongs to, via the (cached) auth service route
+
+    Raises:
+        HTTPException: If the auth service cannot answer
+    """
+    path, groups_request = build_sub_request(request, BatchItem(id="groups", path=f"users/{user_id}/groups"))
+    response = await gateway_proxy(path, groups_request)
+    status_code, _, body = await collect_response(response, groups_request)
+    if status_code != 200:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Group membership unavailable"
+        )
+    return {str(group["id"]) for group in json.loads(body)}
+
+
+# Registered before the catch-all proxy route so it is matched first
+@app.get("/api/v1/events")
+async def events(request: Request, groups: str = "", last_event_id: Optional[str] = Header(default=None)):
+    """
+    Server-Sent Events stream of the caller's events
+
+    Always includes the caller's own channel; `groups` (comma-separated ids)
+    adds group channels the caller is a member of. Reconnecting clients send
+    Last-Event-ID to receive buffered events they missed.
+    """
+    try:
+        claims = token_verifier.authenticate(request)
+    except InvalidTokenError as e:
+        claims = None
+        detail = str(e)
+    else:
+        detail = "Not authenticated"
+    if claims is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=detail,
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+
+    group_ids = {group_id.strip() for group_id in groups.split(",") if group_id.strip()}
+    if group_ids:
+        denied = group_ids - await member_group_ids(request, claims["sub"])
+        if denied:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"Not a member of group(s): {', '.join(sorted(denied))}"
+            )
+
+    channels = [user_channel(claims["sub"])] + [group_channel(group_id) for group_id in sorted(group_ids)]
+    resume_from = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    subscription = event_bus.subscribe(channels, last_event_id=resume_from)
+    return StreamingResponse(
+        event_stream(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 # Proxy auth service routes
 @app.api_route("/api/v1/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
 async def gateway_proxy(path: str, request: Request):
     """Main gateway proxy - routes requests to appropriate services"""
     
-    # Determine which service to route to based on path
-    if any(x in path for x in ["auth", "admin", "register", "link-telegram", "users", "groups"]):
-        target_url = f"{AUTH_SERVICE_URL}/api/v1/{path}"
-    elif any(x in path for x in ["send-email", "send-sms", "send-push", "notification"]):
-        target_url = f"{NOTIFICATION_SERVICE_URL}/api/v1/{path}"
-    else:
-        # Handle main.py routes from original monolith
-        # For now, return not found
+    # Determine which service to route to from the compiled route table
+    rule, _ = route_table.match(path)
+    if rule is None:
         return JSONResponse(
             status_code=404,
-            content={"detail": f"Route not found: /api/v1/{path}. Service routes: auth, admin, users, groups, notification"}
+            content={"detail": f"Route not found: /api/v1/{path}"}
         )
     
-    # Get request body
-    try:
-        body = await request.body()
-    except:
-        body = b""
+    request.state.route = rule.prefix
+    request.state.upstream = rule.upstream
     
-    # Forward the request
-    try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.request(
-                method=request.method,
-                url=target_url,
-                params=dict(request.query_params),
-                headers={k: v for k, v in request.headers.items() if k.lower() != 'host'},
-                content=body
+    # Verify bearer tokens at the edge; invalid ones never reach an upstream
+    if settings.JWT_VERIFY_ENABLED:
+        try:
+            token_verifier.authenticate(request)
+        except InvalidTokenError as e:
+            if rule.public:
+                # Login, signup and the like must work with a stale token:
+                # forward them without it rather than rejecting them
+                request.state.token_rejected = True
+            else:
+                return JSONResponse(
+                    status_code=401,
+                    content={"detail": str(e)},
+                    headers={"WWW-Authenticate": "Bearer"}
+                )
+    
+    # Per-route token bucket for this client
+    if rule.rate_limit is not None and settings.RATE_LIMIT_ENABLED:
+        wait = rate_limiter.check(rule.prefix, rule.rate_limit, request)
+        if wait:
+            return JSONResponse(
+                status_code=429,
+                content={"detail": "Too many requests"},
+                headers={"Retry-After": str(max(1, math.ceil(wait)))}
             )
-        
-        return Response(
-            content=response.content,
-            status_code=response.status_code,
-            headers=dict(response.headers),
-            media_type=response.headers.get("content-type")
+    
+    # Forward the request over the upstream's pooled keep-alive client
+    try:
+        if request.method == "GET" and rule.cache_ttl and settings.CACHE_ENABLED:
+            return await serve_cached(rule, request, path)
+
+        if request.method == "GET" and rule.coalesce and settings.COALESCE_ENABLED:
+            return await serve_coalesced(rule, request, path)
+
+        if request.method != "GET":
+            # Writes may change anything the upstream serves
+            response_cache.invalidate_upstream(rule.upstream)
+
+        if settings.PROXY_STREAMING:
+            # Pipe request and response bodies chunk by chunk in both directions
+            upstream_request = build_upstream_request(rule, request, path)
+            return await forward_streaming(rule, upstream_request)
+
+        # Buffered mode: read the whole request body before forwarding
+        try:
+            body = await request.body()
+        except Exception:
+            body = b""
+        upstream_request = build_upstream_request(rule, request, path, content=body)
+        return await forward_buffered(rule, upstream_request)
+    except CircuitOpenError as e:
+        return JSONResponse(
+            status_code=503,
+            content={"detail": f"Service unavailable: {str(e)}"},
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except httpx.TimeoutException as e:
+        return JSONResponse(
+            status_code=504,
+            content={"detail": f"Upstream timed out: {str(e) or type(e).__name__}"}
         )
     except httpx.RequestError as e:
         return JSONResponse(
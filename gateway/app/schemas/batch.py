@@ -0,0 +1,34 @@
+"""
+Batch request Pydantic schemas
+"""
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
+
+
+class BatchItem(BaseModel):
+    """One sub-request of a batch"""
+    id: str = Field(..., min_length=1, max_length=64)
+    method: str = Field("GET", pattern="^(GET|POST|PUT|DELETE|PATCH)$")
+    path: str = Field(..., min_length=1)  # Relative to /api/v1, query string allowed
+    headers: Dict[str, str] = Field(default_factory=dict)
+    body: Optional[Any] = None  # Sent as JSON
+    depends_on: List[str] = Field(default_factory=list)  # Ids that must complete first
+
+
+class BatchRequest(BaseModel):
+    """Batch of sub-requests executed concurrently by the gateway"""
+    requests: List[BatchItem] = Field(..., min_length=1)
+
+
+class BatchItemResult(BaseModel):
+    """Result of one sub-request"""
+    id: str
+    status: int
+    headers: Dict[str, str]
+    body: Optional[Any] = None
+    body_encoding: Optional[str] = None  # "base64" for non-text bodies
+
+
+class BatchResponse(BaseModel):
+    """Results in the order the sub-requests were given"""
+    responses: List[BatchItemResult]
@@ -0,0 +1,13 @@
+"""
+Event publishing Pydantic schemas
+"""
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List
+
+
+class EventPublish(BaseModel):
+    """An event for the SSE push channel, addressed to users and/or groups"""
+    type: str = Field(..., min_length=1, max_length=64, pattern="^[a-z_]+(\\.[a-z_]+)*$")
+    user_ids: List[int] = Field(default_factory=list)
+    group_ids: List[int] = Field(default_factory=list)
+    data: Dict[str, Any] = Field(default_factory=dict)
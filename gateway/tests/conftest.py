@@ -0,0 +1,137 @@
+"""
+Shared fixtures for the gateway tests
+
+Every upstream is replaced by one in-process stub (an httpx MockTransport),
+so requests run through the real routing, caching, breaker and proxy code
+without any network. Gateway-wide singletons are reset between tests.
+"""
+import inspect
+import time
+from typing import Callable, List
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from jose import jwt
+
+from app.main import app
+from app.core.auth import token_verifier
+from app.core.breaker import breakers
+from app.core.cache import response_cache
+from app.core.clients import upstream_clients
+from app.core.coalesce import single_flight
+from app.core.config import settings
+from app.core.events import event_bus
+from app.core.health import deep_health
+from app.core.latency import latencies
+from app.core.metrics import metrics
+from app.core.ratelimit import load_shedder, rate_limiter
+from app.core.retry import retry_budgets
+
+ADMIN_TOKEN = "test-admin-token"
+INTERNAL_TOKEN = "test-internal-token"
+
+UPSTREAMS = {
+    "auth": ["http://auth-1"],
+    "notification": ["http://notification-1"],
+    "legacy": ["http://legacy-1"],
+}
+
+
+class StubUpstream:
+    """Stands in for every upstream replica: records requests and answers them with `handler`"""
+
+    def __init__(self):
+        self.requests: List[httpx.Request] = []
+        self.handler: Callable = self.echo
+
+    @staticmethod
+    def echo(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"host": request.url.host, "path": request.url.path})
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        response = self.handler(request)
+        if inspect.isawaitable(response):
+            response = await response
+        # Responses built from content are already read; hand the proxy an
+        # unread stream, as a real transport would
+        body = b"".join(response.stream)
+        return httpx.Response(response.status_code, headers=response.headers, stream=httpx.ByteStream(body))
+
+    def calls(self, host: str = None) -> int:
+        """Requests received (by one replica host, or in total)"""
+        return sum(1 for request in self.requests if host is None or request.url.host == host)
+
+
+def make_token(sub: str = "1", token_type: str = "access", expires_in: int = 900, secret: str = None) -> str:
+    """An auth service style JWT"""
+    claims = {"sub": sub, "type": token_type, "exp": int(time.time()) + expires_in}
+    return jwt.encode(claims, secret or settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+
+@pytest.fixture(autouse=True)
+def gateway_settings(monkeypatch):
+    """Deterministic settings: no background probes, no backoff, known tokens"""
+    for name, value in {
+        "UPSTREAMS": UPSTREAMS,
+        "GATEWAY_ROUTES_FILE": "",
+        "GATEWAY_ADMIN_TOKEN": ADMIN_TOKEN,
+        "GATEWAY_INTERNAL_TOKEN": INTERNAL_TOKEN,
+        "SECRET_KEY": "test-secret-key",
+        "GATEWAY_CLAIMS_SECRET": "test-claims-secret",
+        "JWT_VERIFY_ENABLED": True,
+        "RATE_LIMIT_ENABLED": True,
+        "RATE_LIMIT_BACKEND": "memory",
+        "CACHE_ENABLED": True,
+        "COALESCE_ENABLED": True,
+        "PROXY_STREAMING": True,
+        "HEALTH_CHECK_INTERVAL": 0,
+        "DEEP_HEALTH_INTERVAL": 0,
+        "BREAKER_WINDOW": 10,
+        "BREAKER_MIN_CALLS": 4,
+        "BREAKER_FAILURE_RATE": 0.5,
+        "BREAKER_OPEN_SECONDS": 30,
+        "BREAKER_HALF_OPEN_PROBES": 1,
+        "RETRY_BACKOFF_BASE": 0.0,
+        "RETRY_BUDGET_MIN_PER_SECOND": 1,
+        "ADAPTIVE_TIMEOUTS": True,
+        "ADAPTIVE_TIMEOUT_MIN_SAMPLES": 50,
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+
+
+@pytest.fixture(autouse=True)
+def reset_gateway_state(gateway_settings):
+    """Fresh caches, breakers, budgets and counters for every test"""
+    response_cache.__init__(settings.CACHE_MAX_BYTES, settings.CACHE_MAX_ENTRY_BYTES)
+    single_flight.__init__()
+    breakers.__init__()
+    retry_budgets.__init__()
+    latencies.__init__()
+    token_verifier.__init__(settings.JWT_CACHE_SIZE)
+    rate_limiter.__init__()
+    load_shedder.__init__(0)
+    event_bus.__init__(settings.EVENTS_REPLAY_SIZE, settings.EVENTS_MAX_CHANNELS, settings.EVENTS_MAX_QUEUED)
+    deep_health.__init__()
+    metrics.__init__()
+    yield
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    stub = StubUpstream()
+    monkeypatch.setattr(upstream_clients, "transport", httpx.MockTransport(stub))
+    return stub
+
+
+@pytest.fixture
+def client(upstream):
+    """Test client with the gateway started (route table, clients, balancer)"""
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def admin_headers():
+    return {"X-Gateway-Admin-Token": ADMIN_TOKEN}
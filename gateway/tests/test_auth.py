@@ -0,0 +1,101 @@
+"""
+Tests for edge JWT verification and the signed X-Gateway-Claims header
+"""
+import base64
+import hashlib
+import hmac
+import json
+
+from app.core.auth import GATEWAY_CLAIMS_HEADER, token_verifier
+from app.core.config import settings
+from tests.conftest import make_token
+
+
+def decode_claims_header(value):
+    """Check the header's signature and return its payload"""
+    encoded, _, signature = value.partition(".")
+    expected = hmac.new(settings.GATEWAY_CLAIMS_SECRET.encode(), encoded.encode(), hashlib.sha256).digest()
+    assert base64.urlsafe_b64decode(signature + "=" * (-len(signature) % 4)) == expected
+    return json.loads(base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)))
+
+
+class TestEdgeVerification:
+    """Test rejecting bad tokens before any upstream hop"""
+
+    def test_invalid_token_is_401(self, client, upstream):
+        response = client.get("/api/v1/auth/me", headers={"Authorization": "Bearer not-a-jwt"})
+        assert response.status_code == 401
+        assert response.headers["www-authenticate"] == "Bearer"
+        assert upstream.calls() == 0
+
+    def test_token_signed_with_another_key_is_401(self, client, upstream):
+        token = make_token(secret="someone-elses-key")
+        assert client.get("/api/v1/auth/me", headers={"Authorization": f"Bearer {token}"}).status_code == 401
+
+    def test_expired_token_is_401(self, client, upstream):
+        token = make_token(expires_in=-60)
+        assert client.get("/api/v1/auth/me", headers={"Authorization": f"Bearer {token}"}).status_code == 401
+
+    def test_refresh_token_is_not_an_access_token(self, client, upstream):
+        token = make_token(token_type="refresh")
+        assert client.get("/api/v1/auth/me", headers={"Authorization": f"Bearer {token}"}).status_code == 401
+
+    def test_anonymous_requests_pass_through(self, client, upstream):
+        assert client.get("/api/v1/auth/me").status_code == 200
+
+    def test_verified_tokens_are_cached(self, client, upstream):
+        headers = {"Authorization": f"Bearer {make_token()}"}
+        client.get("/api/v1/auth/me", headers=headers)
+        client.get("/api/v1/auth/me", headers=headers)
+        assert token_verifier.stats()["misses"] == 1
+        assert token_verifier.stats()["hits"] == 1
+
+
+class TestPublicRoutes:
+    """Test login and friends with a stale token"""
+
+    def test_expired_token_on_login_is_forwarded_anonymously(self, client, upstream):
+        token = make_token("42", expires_in=-60)
+        response = client.post("/api/v1/auth/login", json={}, headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200
+        sent = upstream.requests[-1].headers
+        assert "authorization" not in sent
+        assert GATEWAY_CLAIMS_HEADER not in sent
+
+    def test_valid_token_on_a_public_route_is_still_verified(self, client, upstream):
+        client.post("/api/v1/auth/refresh", json={}, headers={"Authorization": f"Bearer {make_token('42')}"})
+        sent = upstream.requests[-1].headers
+        assert sent["authorization"].startswith("Bearer ")
+        assert decode_claims_header(sent[GATEWAY_CLAIMS_HEADER])["sub"] == "42"
+
+    def test_expired_token_elsewhere_under_auth_is_401(self, client, upstream):
+        token = make_token(expires_in=-60)
+        assert client.post("/api/v1/auth/logout", headers={"Authorization": f"Bearer {token}"}).status_code == 401
+        assert upstream.calls() == 0
+
+
+class TestClaimsHeader:
+    """Test forwarding verified claims"""
+
+    def test_verified_claims_are_signed_and_bound_to_the_token(self, client, upstream):
+        token = make_token("42")
+        client.get("/api/v1/auth/me", headers={"Authorization": f"Bearer {token}"})
+        payload = decode_claims_header(upstream.requests[-1].headers[GATEWAY_CLAIMS_HEADER])
+        assert payload["sub"] == "42"
+        assert payload["tkn"] == hashlib.sha256(token.encode()).hexdigest()
+
+    def test_forged_claims_from_anonymous_clients_are_stripped(self, client, upstream):
+        client.get("/api/v1/auth/me", headers={GATEWAY_CLAIMS_HEADER: "forged.claims"})
+        assert GATEWAY_CLAIMS_HEADER not in upstream.requests[-1].headers
+
+    def test_forged_claims_are_replaced_by_the_gateways_own(self, client, upstream):
+        token = make_token("42")
+        client.get("/api/v1/auth/me", headers={"Authorization": f"Bearer {token}", GATEWAY_CLAIMS_HEADER: "forged.claims"})
+        values = upstream.requests[-1].headers.get_list(GATEWAY_CLAIMS_HEADER)
+        assert len(values) == 1
+        assert decode_claims_header(values[0])["sub"] == "42"
+
+    def test_no_header_without_a_claims_secret(self, client, upstream, monkeypatch):
+        monkeypatch.setattr(settings, "GATEWAY_CLAIMS_SECRET", "")
+        client.get("/api/v1/auth/me", headers={"Authorization": f"Bearer {make_token()}"})
+        assert GATEWAY_CLAIMS_HEADER not in upstream.requests[-1].headers
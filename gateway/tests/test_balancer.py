@@ -0,0 +1,88 @@
+"""
+Tests for replica selection and passive/active health
+"""
+import httpx
+import pytest
+
+from app.core.balancer import LEAST_OUTSTANDING, POWER_OF_TWO, ReplicaPool, balancer
+from app.core.config import settings
+
+URLS = ["http://r1", "http://r2", "http://r3"]
+
+
+class TestReplicaPool:
+    """Test replica picking"""
+
+    def test_least_outstanding(self):
+        pool = ReplicaPool("auth", URLS, LEAST_OUTSTANDING)
+        pool.replicas[0].outstanding = 2
+        pool.replicas[1].outstanding = 0
+        pool.replicas[2].outstanding = 1
+        assert pool.pick().url == "http://r2"
+
+    def test_power_of_two_choices_avoids_the_busiest(self):
+        pool = ReplicaPool("auth", URLS[:2], POWER_OF_TWO)
+        pool.replicas[0].outstanding = 5
+        assert all(pool.pick().url == "http://r2" for _ in range(20))
+
+    def test_excluded_replicas_are_skipped(self):
+        pool = ReplicaPool("auth", URLS, LEAST_OUTSTANDING)
+        assert pool.pick(exclude=pool.replicas[:2]).url == "http://r3"
+
+    def test_unhealthy_replicas_are_skipped(self):
+        pool = ReplicaPool("auth", URLS[:2], LEAST_OUTSTANDING)
+        pool.replicas[0].healthy = False
+        assert pool.pick().url == "http://r2"
+
+    def test_all_unhealthy_falls_back_to_every_replica(self):
+        pool = ReplicaPool("auth", URLS[:2], LEAST_OUTSTANDING)
+        for replica in pool.replicas:
+            replica.healthy = False
+        assert pool.pick().url in URLS[:2]
+
+    def test_needs_a_replica(self):
+        with pytest.raises(ValueError):
+            ReplicaPool("auth", [], LEAST_OUTSTANDING)
+
+
+class TestReplicaHealth:
+    """Test ejection after consecutive failures and readmission after successes"""
+
+    def test_ejected_then_readmitted(self, monkeypatch):
+        monkeypatch.setattr(settings, "HEALTH_CHECK_UNHEALTHY_THRESHOLD", 2)
+        monkeypatch.setattr(settings, "HEALTH_CHECK_HEALTHY_THRESHOLD", 2)
+        pool = ReplicaPool("auth", URLS[:1], LEAST_OUTSTANDING)
+        replica = pool.replicas[0]
+        pool.record_health(replica, False)
+        assert replica.healthy
+        pool.record_health(replica, False)
+        assert not replica.healthy
+        pool.record_health(replica, True)
+        assert not replica.healthy
+        pool.record_health(replica, True)
+        assert replica.healthy
+
+
+class TestBalancedRequests:
+    """Test replica selection through the gateway"""
+
+    @pytest.fixture
+    def client(self, upstream, monkeypatch):
+        from fastapi.testclient import TestClient
+        from app.main import app
+        monkeypatch.setattr(settings, "UPSTREAMS", {**settings.UPSTREAMS, "auth": ["http://auth-1", "http://auth-2"]})
+        monkeypatch.setattr(settings, "HEALTH_CHECK_UNHEALTHY_THRESHOLD", 1)
+        with TestClient(app) as test_client:
+            yield test_client
+
+    def test_refused_connections_eject_a_replica(self, client, upstream):
+        def refuse_first(request):
+            if request.url.host == "auth-1":
+                raise httpx.ConnectError("connection refused", request=request)
+            return upstream.echo(request)
+        upstream.handler = refuse_first
+        for _ in range(10):
+            client.post("/api/v1/auth/logout")
+        replicas = {replica["url"]: replica for replica in balancer.stats()["auth"]}
+        assert replicas["http://auth-1"]["healthy"] is False
+        assert upstream.calls("auth-1") == 1
@@ -0,0 +1,89 @@
+"""
+Tests for POST /api/v1/batch
+"""
+import httpx
+
+from app.core.config import settings
+
+BATCH = "/api/v1/batch"
+
+
+def by_id(response):
+    return {result["id"]: result for result in response.json()["responses"]}
+
+
+class TestBatch:
+    """Test running several calls in one round trip"""
+
+    def test_results_in_request_order(self, client, upstream):
+        response = client.post(BATCH, json={"requests": [
+            {"id": "me", "path": "auth/me"},
+            {"id": "debts", "path": "debts/history?user_id=3"},
+        ]})
+        assert response.status_code == 200
+        results = response.json()["responses"]
+        assert [result["id"] for result in results] == ["me", "debts"]
+        assert results[0]["body"] == {"host": "auth-1", "path": "/api/v1/auth/me"}
+        assert results[1]["body"] == {"host": "legacy-1", "path": "/debts/history"}
+        assert upstream.calls("legacy-1") == 1
+
+    def test_sub_requests_carry_body_and_method(self, client, upstream):
+        upstream.handler = lambda request: httpx.Response(
+            201, content=request.content, headers={"content-type": "application/json"}
+        )
+        response = client.post(BATCH, json={"requests": [
+            {"id": "new", "method": "POST", "path": "expenses", "body": {"total_amount": 12}},
+        ]})
+        result = by_id(response)["new"]
+        assert result["status"] == 201
+        assert result["body"] == {"total_amount": 12}
+
+    def test_failed_dependency_answers_424_without_sending(self, client, upstream):
+        def fail_expenses(request):
+            if request.url.path == "/expenses":
+                return httpx.Response(400, json={"detail": "bad"})
+            return upstream.echo(request)
+        upstream.handler = fail_expenses
+
+        response = client.post(BATCH, json={"requests": [
+            {"id": "create", "method": "POST", "path": "expenses", "body": {}},
+            {"id": "after", "path": "debts/history", "depends_on": ["create"]},
+        ]})
+        results = by_id(response)
+        assert results["create"]["status"] == 400
+        assert results["after"]["status"] == 424
+        assert "create" in results["after"]["body"]["detail"]
+        assert [request.url.path for request in upstream.requests] == ["/expenses"]
+
+    def test_dependencies_run_first(self, client, upstream):
+        response = client.post(BATCH, json={"requests": [
+            {"id": "second", "path": "debts/history", "depends_on": ["first"]},
+            {"id": "first", "path": "auth/me"},
+        ]})
+        assert response.status_code == 200
+        assert [request.url.path for request in upstream.requests] == ["/api/v1/auth/me", "/debts/history"]
+
+    def test_cycle_is_rejected(self, client, upstream):
+        response = client.post(BATCH, json={"requests": [
+            {"id": "a", "path": "auth/me", "depends_on": ["b"]},
+            {"id": "b", "path": "auth/me", "depends_on": ["a"]},
+        ]})
+        assert response.status_code == 400
+        assert "cycle" in response.json()["detail"].lower()
+        assert upstream.calls() == 0
+
+    def test_unknown_dependency_and_duplicate_ids_are_rejected(self, client):
+        unknown = client.post(BATCH, json={"requests": [{"id": "a", "path": "auth/me", "depends_on": ["x"]}]})
+        duplicate = client.post(BATCH, json={"requests": [{"id": "a", "path": "auth/me"}, {"id": "a", "path": "auth/me"}]})
+        assert unknown.status_code == 400
+        assert duplicate.status_code == 400
+
+    def test_nested_batches_and_oversized_batches_are_rejected(self, client, monkeypatch):
+        nested = client.post(BATCH, json={"requests": [{"id": "a", "method": "POST", "path": "batch"}]})
+        assert nested.status_code == 400
+        monkeypatch.setattr(settings, "BATCH_MAX_REQUESTS", 1)
+        oversized = client.post(BATCH, json={"requests": [{"id": "a", "path": "auth/me"}, {"id": "b", "path": "auth/me"}]})
+        assert oversized.status_code == 400
+
+    def test_unmatched_sub_request_is_404(self, client):
+        assert by_id(client.post(BATCH, json={"requests": [{"id": "a", "path": "nope"}]}))["a"]["status"] == 404
@@ -0,0 +1,159 @@
+"""
+Tests for per-upstream circuit breakers and adaptive timeouts
+"""
+import httpx
+
+from app.core.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, breakers
+from app.core.config import settings
+from app.core.latency import LatencyTracker, latencies
+
+
+def make_breaker(**overrides):
+    options = dict(name="auth", window=10, min_calls=4, failure_rate=0.5, open_seconds=30, half_open_probes=1)
+    options.update(overrides)
+    return CircuitBreaker(**options)
+
+
+def trip(breaker):
+    for _ in range(breaker.min_calls):
+        assert breaker.allow()
+        breaker.record_failure()
+
+
+class TestCircuitBreaker:
+    """Test the closed -> open -> half-open -> closed cycle"""
+
+    def test_opens_at_the_failure_rate(self):
+        breaker = make_breaker()
+        for _ in range(2):
+            breaker.allow()
+            breaker.record_success()
+        for _ in range(2):
+            breaker.allow()
+            breaker.record_failure()
+        assert breaker.state == OPEN
+        assert not breaker.allow()
+        assert breaker.stats()["rejected"] == 1
+
+    def test_needs_min_calls_before_opening(self):
+        breaker = make_breaker()
+        for _ in range(3):
+            breaker.allow()
+            breaker.record_failure()
+        assert breaker.state == CLOSED
+
+    def test_half_open_after_the_open_period(self):
+        breaker = make_breaker(open_seconds=0)
+        trip(breaker)
+        assert breaker.allow()
+        assert breaker.state == HALF_OPEN
+        # Only one probe at a time
+        assert not breaker.allow()
+
+    def test_successful_probe_closes(self):
+        breaker = make_breaker(open_seconds=0)
+        trip(breaker)
+        assert breaker.allow()
+        breaker.record_success()
+        assert breaker.state == CLOSED
+        assert breaker.allow()
+
+    def test_failed_probe_reopens(self):
+        breaker = make_breaker(open_seconds=0)
+        trip(breaker)
+        assert breaker.allow()
+        breaker.open_seconds = 30
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        assert not breaker.allow()
+
+    def test_released_probe_frees_its_slot(self):
+        breaker = make_breaker(open_seconds=0)
+        trip(breaker)
+        assert breaker.allow()
+        breaker.release()
+        assert breaker.state == HALF_OPEN
+        assert breaker.allow()
+
+    def test_late_outcomes_while_open_do_not_extend_the_open_period(self, monkeypatch):
+        now = [100.0]
+        monkeypatch.setattr("app.core.breaker.time.monotonic", lambda: now[0])
+        breaker = make_breaker(open_seconds=30)
+        in_flight = breaker.min_calls
+        for _ in range(in_flight):
+            assert breaker.allow()
+        trip(breaker)
+        # Calls allowed before the trip finish during the open period
+        now[0] += 20
+        for _ in range(in_flight):
+            breaker.record_failure()
+        breaker.record_success()
+        assert breaker.stats()["window_calls"] == 0
+        now[0] += 10
+        assert breaker.allow()
+        assert breaker.state == HALF_OPEN
+
+    def test_retry_after_counts_down_the_open_period(self):
+        breaker = make_breaker(open_seconds=30)
+        trip(breaker)
+        assert 29 <= breaker.retry_after() <= 30
+
+
+class TestBreakerInGateway:
+    """Test fail-fast responses once an upstream's breaker opens"""
+
+    def test_open_breaker_fails_fast_with_retry_after(self, client, upstream):
+        upstream.handler = lambda request: httpx.Response(503, json={})
+        for _ in range(settings.BREAKER_MIN_CALLS):
+            assert client.post("/api/v1/auth/logout").status_code == 503
+        calls = upstream.calls()
+
+        response = client.post("/api/v1/auth/logout")
+        assert response.status_code == 503
+        assert int(response.headers["retry-after"]) > 0
+        assert upstream.calls() == calls
+        assert breakers.get("auth").state == OPEN
+
+    def test_other_upstreams_are_unaffected(self, client, upstream):
+        upstream.handler = lambda request: httpx.Response(503, json={})
+        for _ in range(settings.BREAKER_MIN_CALLS):
+            client.post("/api/v1/auth/logout")
+        upstream.handler = upstream.echo
+        assert client.post("/api/v1/expenses", json={}).status_code == 200
+
+    def test_client_errors_do_not_count_as_failures(self, client, upstream):
+        upstream.handler = lambda request: httpx.Response(404, json={})
+        for _ in range(settings.BREAKER_MIN_CALLS * 2):
+            client.post("/api/v1/auth/logout")
+        assert breakers.get("auth").state == CLOSED
+
+
+class TestAdaptiveTimeouts:
+    """Test per-route timeouts derived from observed latency"""
+
+    def test_route_budget_until_enough_samples(self):
+        for _ in range(settings.ADAPTIVE_TIMEOUT_MIN_SAMPLES - 1):
+            latencies.get("/users").record(0.5)
+        assert latencies.timeout_for("/users", 30.0) == 30.0
+
+    def test_p99_times_multiplier(self, monkeypatch):
+        monkeypatch.setattr(settings, "ADAPTIVE_TIMEOUT_MULTIPLIER", 3.0)
+        monkeypatch.setattr(settings, "ADAPTIVE_TIMEOUT_MIN", 0.1)
+        for _ in range(settings.ADAPTIVE_TIMEOUT_MIN_SAMPLES):
+            latencies.get("/users").record(0.5)
+        assert latencies.timeout_for("/users", 30.0) == 1.5
+
+    def test_clamped_to_minimum_and_budget(self, monkeypatch):
+        monkeypatch.setattr(settings, "ADAPTIVE_TIMEOUT_MIN", 1.0)
+        for _ in range(settings.ADAPTIVE_TIMEOUT_MIN_SAMPLES):
+            latencies.get("/fast").record(0.01)
+            latencies.get("/slow").record(20.0)
+        assert latencies.timeout_for("/fast", 30.0) == 1.0
+        assert latencies.timeout_for("/slow", 30.0) == 30.0
+
+    def test_percentiles(self, monkeypatch):
+        tracker = LatencyTracker(window=100)
+        for i in range(1, 101):
+            tracker.record(i / 100)
+        assert tracker.percentile(50) == 0.51
+        assert tracker.percentile(99) == 0.99
@@ -0,0 +1,150 @@
+"""
+Tests for the response cache of GET routes with a cache_ttl
+"""
+import time
+
+import httpx
+
+from app.core.cache import etag_matches, parse_cache_control, response_cache
+from tests.conftest import make_token
+
+CACHED = "/api/v1/categories"
+
+
+class TestCacheHelpers:
+    """Test header parsing"""
+
+    def test_parse_cache_control(self):
+        assert parse_cache_control('max-age=60, No-Store, private="x"') == {
+            "max-age": "60", "no-store": None, "private": "x"
+        }
+        assert parse_cache_control(None) == {}
+
+    def test_etag_matches_weakly(self):
+        assert etag_matches('W/"abc"', '"abc"')
+        assert etag_matches('"x", "abc"', 'W/"abc"')
+        assert etag_matches("*", '"abc"')
+        assert not etag_matches('"other"', '"abc"')
+        assert not etag_matches(None, '"abc"')
+
+
+class TestResponseCache:
+    """Test HIT/MISS, conditional requests and invalidation"""
+
+    def test_second_get_is_a_hit(self, client, upstream):
+        first = client.get(CACHED)
+        second = client.get(CACHED)
+        assert first.headers["x-cache"] == "MISS"
+        assert second.headers["x-cache"] == "HIT"
+        assert second.json() == first.json()
+        assert upstream.calls() == 1
+        assert response_cache.stats()["hits"] == 1
+
+    def test_query_string_is_part_of_the_key(self, client, upstream):
+        client.get(CACHED)
+        assert client.get(f"{CACHED}?page=2").headers["x-cache"] == "MISS"
+        assert upstream.calls() == 2
+
+    def test_callers_do_not_share_entries(self, client, upstream):
+        client.get(CACHED, headers={"Authorization": f"Bearer {make_token('1')}"})
+        response = client.get(CACHED, headers={"Authorization": f"Bearer {make_token('2')}"})
+        assert response.headers["x-cache"] == "MISS"
+        assert upstream.calls() == 2
+
+    def test_if_none_match_gets_304(self, client, upstream):
+        etag = client.get(CACHED).headers["etag"]
+        response = client.get(CACHED, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+        assert upstream.calls() == 1
+
+    def test_conditional_headers_are_not_forwarded(self, client, upstream):
+        client.get(CACHED, headers={"If-None-Match": '"client"'})
+        assert "if-none-match" not in upstream.requests[-1].headers
+
+    def test_write_invalidates_the_upstream(self, client, upstream):
+        client.get(CACHED)
+        client.post("/api/v1/expenses", json={})
+        assert client.get(CACHED).headers["x-cache"] == "MISS"
+        assert upstream.calls() == 3
+
+    def test_write_to_another_upstream_keeps_entries(self, client, upstream):
+        client.get(CACHED)
+        client.post("/api/v1/auth/logout")
+        assert client.get(CACHED).headers["x-cache"] == "HIT"
+
+    def test_no_store_is_not_cached(self, client, upstream):
+        upstream.handler = lambda request: httpx.Response(200, json={}, headers={"cache-control": "no-store"})
+        client.get(CACHED)
+        assert client.get(CACHED).headers["x-cache"] == "MISS"
+        assert upstream.calls() == 2
+
+    def test_errors_are_not_cached(self, client, upstream):
+        upstream.handler = lambda request: httpx.Response(404, json={})
+        client.get(CACHED)
+        client.get(CACHED)
+        assert upstream.calls() == 2
+
+    def test_max_age_caps_the_route_ttl(self, client, upstream):
+        upstream.handler = lambda request: httpx.Response(200, json={}, headers={"cache-control": "max-age=5"})
+        client.get(CACHED)
+        entry = next(iter(response_cache._entries.values()))
+        assert entry.expires_at - time.monotonic() <= 5
+
+    def test_stale_entry_is_revalidated(self, client, upstream):
+        upstream.handler = lambda request: httpx.Response(200, json={"v": 1}, headers={"etag": '"v1"'})
+        client.get(CACHED)
+        for entry in response_cache._entries.values():
+            entry.expires_at = 0
+
+        def not_modified(request):
+            assert request.headers["if-none-match"] == '"v1"'
+            return httpx.Response(304, headers={"etag": '"v1"'})
+        upstream.handler = not_modified
+        response = client.get(CACHED)
+        assert response.status_code == 200
+        assert response.json() == {"v": 1}
+        assert response_cache.stats()["revalidations"] == 1
+        assert client.get(CACHED).headers["x-cache"] == "HIT"
+
+    def test_revalidation_honours_the_304_max_age(self, client, upstream):
+        upstream.handler = lambda request: httpx.Response(200, json={"v": 1}, headers={"etag": '"v1"'})
+        client.get(CACHED)
+        for entry in response_cache._entries.values():
+            entry.expires_at = 0
+
+        upstream.handler = lambda request: httpx.Response(
+            304, headers={"etag": '"v1"', "cache-control": "max-age=2"}
+        )
+        response = client.get(CACHED)
+        assert response.json() == {"v": 1}
+        assert response.headers["cache-control"] == "max-age=2"
+        entry = next(iter(response_cache._entries.values()))
+        assert 0 < entry.expires_at - time.monotonic() <= 2
+        assert client.get(CACHED).headers["cache-control"] == "max-age=2"
+
+    def test_revalidation_with_no_store_drops_the_entry(self, client, upstream):
+        upstream.handler = lambda request: httpx.Response(200, json={"v": 1}, headers={"etag": '"v1"'})
+        client.get(CACHED)
+        for entry in response_cache._entries.values():
+            entry.expires_at = 0
+
+        upstream.handler = lambda request: httpx.Response(304, headers={"etag": '"v1"', "cache-control": "no-store"})
+        response = client.get(CACHED)
+        assert response.status_code == 200
+        assert response.json() == {"v": 1}
+        assert response_cache.stats()["entries"] == 0
+        assert client.get(CACHED).headers["x-cache"] == "MISS"
+        assert upstream.calls() == 3
+
+    def test_byte_budget_evicts_least_recently_used(self, client, upstream, monkeypatch):
+        client.get(CACHED)
+        entry_size = next(iter(response_cache._entries.values())).size
+        monkeypatch.setattr(response_cache, "max_bytes", entry_size * 2)
+        client.get(f"{CACHED}?page=2")
+        client.get(CACHED)  # Touch the first entry
+        client.get(f"{CACHED}?page=3")
+        assert response_cache.stats()["evictions"] == 1
+        assert client.get(CACHED).headers["x-cache"] == "HIT"
+        assert client.get(f"{CACHED}?page=2").headers["x-cache"] == "MISS"
@@ -0,0 +1,83 @@
+"""
+Tests for single-flight coalescing of identical in-flight GETs
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from app.core.coalesce import SingleFlight, single_flight
+
+
+class TestSingleFlight:
+    """Test sharing one call between concurrent callers"""
+
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+
+        async def scenario():
+            return await asyncio.gather(*(flight.do("key", fetch) for _ in range(5)))
+
+        assert asyncio.run(scenario()) == ["result"] * 5
+        assert len(calls) == 1
+        assert flight.stats() == {"in_flight": 0, "leaders": 1, "shared": 4}
+
+    def test_exceptions_reach_every_caller(self):
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream down")
+
+        async def scenario():
+            return await asyncio.gather(flight.do("key", fail), flight.do("key", fail), return_exceptions=True)
+
+        results = asyncio.run(scenario())
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+    def test_cancelled_leader_does_not_cancel_followers(self):
+        flight = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.02)
+            return "result"
+
+        async def scenario():
+            leader = asyncio.ensure_future(flight.do("key", fetch))
+            follower = asyncio.ensure_future(flight.do("key", fetch))
+            await asyncio.sleep(0)
+            leader.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await leader
+            return await follower
+
+        assert asyncio.run(scenario()) == "result"
+
+    def test_sequential_calls_are_not_shared(self):
+        flight = SingleFlight()
+
+        async def fetch():
+            return "result"
+
+        async def scenario():
+            await flight.do("key", fetch)
+            await flight.do("key", fetch)
+
+        asyncio.run(scenario())
+        assert flight.stats()["leaders"] == 2
+
+
+class TestCoalescedRoute:
+    """Test a coalesce route through the gateway"""
+
+    def test_coalesce_route_is_forwarded(self, client, upstream):
+        upstream.handler = lambda request: httpx.Response(200, json=[{"id": 1}])
+        response = client.get("/api/v1/actions/pending?user_id=1")
+        assert response.json() == [{"id": 1}]
+        assert single_flight.stats()["leaders"] == 1
@@ -0,0 +1,68 @@
+"""
+Tests for Accept-Encoding negotiation and response compression
+"""
+import gzip
+
+import httpx
+
+from app.core import compression
+from app.core.compression import negotiate_encoding
+
+LARGE = [{"id": i, "description": "Groceries for the week"} for i in range(200)]
+
+
+class TestNegotiation:
+    """Test choosing a content coding"""
+
+    def test_q_values_decide(self):
+        assert negotiate_encoding("gzip;q=1.0, identity;q=0.5") == "gzip"
+        assert negotiate_encoding("gzip;q=0") is None
+
+    def test_unknown_codings_are_ignored(self):
+        assert negotiate_encoding("deflate, compress") is None
+
+    def test_wildcard(self):
+        assert negotiate_encoding("*") in compression.ENCODERS
+
+    def test_server_preference_breaks_ties(self, monkeypatch):
+        monkeypatch.setattr(compression, "ENCODERS", {"br": object, "gzip": object})
+        assert negotiate_encoding("gzip, br") == "br"
+        assert negotiate_encoding("gzip, br;q=0.5") == "gzip"
+
+
+class TestCompressedResponses:
+    """Test the middleware on proxied responses"""
+
+    def test_large_json_is_gzipped(self, client, upstream):
+        upstream.handler = lambda request: httpx.Response(200, json=LARGE, headers={"etag": '"v1"'})
+        response = client.get("/api/v1/debts/history", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert "accept-encoding" in response.headers["vary"].lower()
+        assert response.headers["etag"] == 'W/"v1"'
+        assert response.json() == LARGE
+
+    def test_small_bodies_are_sent_as_is(self, client, upstream):
+        upstream.handler = lambda request: httpx.Response(200, json={"ok": True})
+        response = client.get("/api/v1/debts/history", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in response.headers
+
+    def test_no_accept_encoding_no_compression(self, client, upstream):
+        upstream.handler = lambda request: httpx.Response(200, json=LARGE)
+        response = client.get("/api/v1/debts/history", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in response.headers
+
+    def test_upstream_encoded_bodies_pass_through(self, client, upstream):
+        body = gzip.compress(b'{"already": "compressed"}' * 100)
+        upstream.handler = lambda request: httpx.Response(
+            200, content=body, headers={"content-type": "application/json", "content-encoding": "gzip"}
+        )
+        response = client.get("/api/v1/debts/history", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["content-length"] == str(len(body))
+
+    def test_binary_types_are_not_compressed(self, client, upstream):
+        upstream.handler = lambda request: httpx.Response(
+            200, content=b"\x89PNG" * 1000, headers={"content-type": "image/png"}
+        )
+        response = client.get("/api/v1/debts/history", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in response.headers
@@ -0,0 +1,208 @@
+"""
+Tests for the Server-Sent Events push channel and service event publishing
+"""
+import asyncio
+import json
+
+import httpx
+
+from app.core.events import (
+    ACTION_CONFIRMED, PENDING_ACTION_CREATED, VOTE_CAST, EventBus, group_channel, user_channel
+)
+from app.main import app
+from tests.conftest import INTERNAL_TOKEN, make_token
+
+GROUP_ID = 5
+MEMBER, OUTSIDER = "1", "2"
+
+
+def memberships(request):
+    """Auth service stub: user 1 is in group 5, user 2 in no group"""
+    if request.url.path == f"/api/v1/users/{MEMBER}/groups":
+        return httpx.Response(200, json=[{"id": GROUP_ID, "name": "Flat"}])
+    return httpx.Response(200, json=[])
+
+
+class EventStream:
+    """A GET /api/v1/events request driven directly against the ASGI app"""
+
+    def __init__(self, user_id, groups=""):
+        self.user_id = user_id
+        self.groups = groups
+        self.status = None
+        self._started = asyncio.Event()
+        self._chunks = asyncio.Queue()
+        self._task = None
+
+    async def open(self):
+        async def receive():
+            # The request has no body; afterwards the client never disconnects
+            if not hasattr(receive, "sent"):
+                receive.sent = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await asyncio.Event().wait()
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                self.status = message["status"]
+                self._started.set()
+            elif message["type"] == "http.response.body":
+                self._chunks.put_nowait(message.get("body", b""))
+
+        token = make_token(self.user_id)
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": "/api/v1/events",
+            "raw_path": b"/api/v1/events",
+            "query_string": f"groups={self.groups}".encode(),
+            "root_path": "",
+            "headers": [(b"host", b"testserver"), (b"authorization", f"Bearer {token}".encode())],
+            "client": ("127.0.0.1", 50000),
+            "server": ("testserver", 80),
+        }
+        self._task = asyncio.create_task(app(scope, receive, send))
+        await asyncio.wait_for(self._started.wait(), timeout=2)
+        if self.status == 200:
+            await self.read()  # The retry: preamble, sent once subscribed
+        return self
+
+    async def read(self, timeout=1.0):
+        return await asyncio.wait_for(self._chunks.get(), timeout=timeout)
+
+    async def next_event(self, timeout=1.0):
+        """The next event as (type, payload), or None if none arrives in time"""
+        try:
+            chunk = await self.read(timeout)
+        except asyncio.TimeoutError:
+            return None
+        fields = dict(line.split(": ", 1) for line in chunk.decode().splitlines() if ": " in line)
+        return fields["event"], json.loads(fields["data"])
+
+    async def close(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+async def publish(payload, token=INTERNAL_TOKEN):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver") as client:
+        return await client.post("/internal/events", json=payload, headers={"X-Gateway-Internal-Token": token})
+
+
+class TestEventBus:
+    """Test channel delivery and replay"""
+
+    def test_only_subscribed_channels_receive(self):
+        async def scenario():
+            bus = EventBus(replay_size=10, max_channels=10, max_queued=10)
+            member = bus.subscribe([user_channel(1), group_channel(5)])
+            outsider = bus.subscribe([user_channel(2)])
+            assert bus.publish(VOTE_CAST, group_channel(5), {}) == 1
+            assert member.queue.qsize() == 1
+            assert outsider.queue.qsize() == 0
+        asyncio.run(scenario())
+
+    def test_reconnect_replays_missed_events(self):
+        async def scenario():
+            bus = EventBus(replay_size=10, max_channels=10, max_queued=10)
+            bus.publish(PENDING_ACTION_CREATED, group_channel(5), {"n": 1})
+            bus.publish(PENDING_ACTION_CREATED, group_channel(5), {"n": 2})
+            subscription = bus.subscribe([group_channel(5)], last_event_id=1)
+            assert subscription.queue.get_nowait().data == {"n": 2}
+            assert subscription.queue.empty()
+        asyncio.run(scenario())
+
+    def test_slow_subscribers_drop_their_oldest_events(self):
+        async def scenario():
+            bus = EventBus(replay_size=10, max_channels=10, max_queued=1)
+            subscription = bus.subscribe([group_channel(5)])
+            bus.publish(VOTE_CAST, group_channel(5), {"n": 1})
+            bus.publish(VOTE_CAST, group_channel(5), {"n": 2})
+            assert subscription.dropped == 1
+            assert subscription.queue.get_nowait().data == {"n": 2}
+        asyncio.run(scenario())
+
+
+class TestPublishEndpoint:
+    """Test POST /internal/events"""
+
+    def test_requires_internal_token(self, client):
+        response = client.post("/internal/events", json={"type": ACTION_CONFIRMED, "group_ids": [GROUP_ID]})
+        assert response.status_code == 403
+        response = client.post(
+            "/internal/events",
+            json={"type": ACTION_CONFIRMED, "group_ids": [GROUP_ID]},
+            headers={"X-Gateway-Internal-Token": "wrong"}
+        )
+        assert response.status_code == 403
+
+    def test_unknown_event_types_are_rejected(self, client):
+        response = client.post(
+            "/internal/events",
+            json={"type": "expense.deleted", "group_ids": [GROUP_ID]},
+            headers={"X-Gateway-Internal-Token": INTERNAL_TOKEN}
+        )
+        assert response.status_code == 422
+
+
+class TestEventStream:
+    """Test GET /api/v1/events end to end"""
+
+    def test_group_event_reaches_member_but_not_outsider(self, client, upstream):
+        upstream.handler = memberships
+
+        async def scenario():
+            member = await EventStream(MEMBER, groups=str(GROUP_ID)).open()
+            outsider = await EventStream(OUTSIDER).open()
+            try:
+                response = await publish({
+                    "type": PENDING_ACTION_CREATED,
+                    "group_ids": [GROUP_ID],
+                    "data": {"action_id": 9},
+                })
+                assert response.json() == {"delivered": 1}
+                assert await member.next_event() == (
+                    PENDING_ACTION_CREATED, {"channel": group_channel(GROUP_ID), "data": {"action_id": 9}}
+                )
+                assert await outsider.next_event(timeout=0.2) is None
+            finally:
+                await member.close()
+                await outsider.close()
+
+        client.portal.call(scenario)
+
+    def test_outsider_cannot_subscribe_to_the_group(self, client, upstream):
+        upstream.handler = memberships
+
+        async def scenario():
+            outsider = await EventStream(OUTSIDER, groups=str(GROUP_ID)).open()
+            await outsider.close()
+            return outsider.status
+
+        assert client.portal.call(scenario) == 403
+
+    def test_user_events_reach_only_that_user(self, client, upstream):
+        upstream.handler = memberships
+
+        async def scenario():
+            member = await EventStream(MEMBER).open()
+            outsider = await EventStream(OUTSIDER).open()
+            try:
+                await publish({"type": ACTION_CONFIRMED, "user_ids": [int(MEMBER)], "data": {"action_id": 9}})
+                event_type, payload = await member.next_event()
+                assert (event_type, payload["channel"]) == (ACTION_CONFIRMED, user_channel(MEMBER))
+                assert await outsider.next_event(timeout=0.2) is None
+            finally:
+                await member.close()
+                await outsider.close()
+
+        client.portal.call(scenario)
+
+    def test_anonymous_stream_is_401(self, client):
+        assert client.get("/api/v1/events").status_code == 401
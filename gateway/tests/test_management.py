@@ -0,0 +1,31 @@
+"""
+Tests for the gateway management endpoints
+"""
+import pytest
+
+from app.core.config import settings
+
+STATS_ENDPOINTS = [
+    "/gateway/cache/stats",
+    "/gateway/coalesce/stats",
+    "/gateway/auth/stats",
+    "/gateway/limits",
+    "/gateway/events/stats",
+    "/gateway/upstreams",
+]
+
+
+@pytest.mark.parametrize("path", STATS_ENDPOINTS)
+class TestManagementEndpoints:
+    """Test that internal state is only shown to gateway admins"""
+
+    def test_requires_admin_token(self, client, path):
+        assert client.get(path).status_code == 403
+        assert client.get(path, headers={"X-Gateway-Admin-Token": "wrong"}).status_code == 403
+
+    def test_admin_token_is_accepted(self, client, admin_headers, path):
+        assert client.get(path, headers=admin_headers).status_code == 200
+
+    def test_closed_without_a_configured_token(self, client, monkeypatch, path):
+        monkeypatch.setattr(settings, "GATEWAY_ADMIN_TOKEN", "")
+        assert client.get(path, headers={"X-Gateway-Admin-Token": ""}).status_code == 403
@@ -0,0 +1,58 @@
+"""
+Tests for /metrics and the aggregated /health/deep
+"""
+import httpx
+
+from app.core.config import settings
+from app.core.health import deep_health
+
+
+class TestMetrics:
+    """Test the Prometheus exposition"""
+
+    def test_proxied_requests_are_counted_by_route(self, client, upstream):
+        client.get("/api/v1/auth/me")
+        client.get("/api/v1/auth/me")
+        body = client.get("/metrics").text
+        assert 'gateway_requests_total{route="/auth",upstream="auth",method="GET",status="200"} 2' in body
+        assert 'gateway_upstream_duration_seconds_count{route="/auth",upstream="auth",status="200"} 2' in body
+        assert "# TYPE gateway_request_duration_seconds histogram" in body
+
+    def test_unmatched_and_rejected_requests_are_counted(self, client, upstream):
+        client.get("/api/v1/nowhere")
+        body = client.get("/metrics").text
+        assert 'gateway_requests_total{route="unmatched",upstream="none",method="GET",status="404"} 1' in body
+
+    def test_content_type(self, client):
+        assert client.get("/metrics").headers["content-type"].startswith("text/plain; version=0.0.4")
+
+
+class TestDeepHealth:
+    """Test the background-probed health snapshot"""
+
+    def test_starting_until_the_first_probe(self, client):
+        response = client.get("/health/deep")
+        assert response.status_code == 503
+        assert response.json()["status"] == "starting"
+
+    def test_healthy_after_a_probe(self, client, upstream, monkeypatch):
+        # Set after startup so no background loop runs; only freshness uses it
+        monkeypatch.setattr(settings, "DEEP_HEALTH_INTERVAL", 60)
+        upstream.handler = lambda request: httpx.Response(
+            200, json={"status": "healthy", "components": {"database": {"status": "healthy"}}}
+        )
+        client.portal.call(deep_health.probe)
+        response = client.get("/health/deep")
+        assert response.status_code == 200
+        assert response.json()["services"]["auth"]["components"] == {"database": {"status": "healthy"}}
+
+    def test_unhealthy_replica_makes_the_gateway_unhealthy(self, client, upstream):
+        def database_down(request):
+            if request.url.host == "auth-1":
+                return httpx.Response(503, json={"status": "unhealthy"})
+            return httpx.Response(200, json={"status": "healthy"})
+        upstream.handler = database_down
+        client.portal.call(deep_health.probe)
+        response = client.get("/health/deep")
+        assert response.status_code == 503
+        assert response.json()["services"]["auth"]["status"] == "unhealthy"
@@ -0,0 +1,113 @@
+"""
+Tests for forwarding through the pooled upstream clients
+"""
+import gzip
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.core.clients import upstream_clients
+from app.core.config import settings
+
+
+class TestForwarding:
+    """Test request and response passthrough"""
+
+    def test_request_body_is_forwarded(self, client, upstream):
+        upstream.handler = lambda request: httpx.Response(201, content=request.content)
+        response = client.post("/api/v1/users", json={"name": "Sara"})
+        assert response.status_code == 201
+        assert response.json() == {"name": "Sara"}
+
+    def test_streamed_request_body_is_forwarded(self, client, upstream):
+        upstream.handler = lambda request: httpx.Response(201, content=request.content)
+        chunks = iter([b'{"name": ', b'"Sara"}'])
+        response = client.post("/api/v1/users", content=chunks, headers={"content-type": "application/json"})
+        assert response.json() == {"name": "Sara"}
+        assert "content-length" not in upstream.requests[-1].headers
+
+    def test_buffered_mode_forwards_the_same_body(self, client, upstream, monkeypatch):
+        monkeypatch.setattr(settings, "PROXY_STREAMING", False)
+        upstream.handler = lambda request: httpx.Response(201, content=request.content)
+        response = client.post("/api/v1/users", json={"name": "Sara"})
+        assert response.json() == {"name": "Sara"}
+
+    def test_path_and_query_are_forwarded(self, client, upstream):
+        client.get("/api/v1/users/7/groups?limit=5")
+        sent = upstream.requests[-1]
+        assert sent.url.path == "/api/v1/users/7/groups"
+        assert sent.url.params["limit"] == "5"
+
+    def test_hop_by_hop_headers_are_dropped(self, client, upstream):
+        upstream.handler = lambda request: httpx.Response(
+            200, json={}, headers={"keep-alive": "timeout=5", "x-upstream": "yes"}
+        )
+        response = client.get("/api/v1/users", headers={"te": "trailers", "x-client": "yes"})
+        sent = upstream.requests[-1].headers
+        assert sent["x-client"] == "yes"
+        assert "te" not in sent
+        assert response.headers["x-upstream"] == "yes"
+        assert "keep-alive" not in response.headers
+
+    def test_repeated_set_cookie_headers_survive(self, client, upstream):
+        upstream.handler = lambda request: httpx.Response(
+            200, json={}, headers=[("set-cookie", "a=1"), ("set-cookie", "b=2")]
+        )
+        response = client.get("/api/v1/users")
+        assert response.headers.get_list("set-cookie") == ["a=1", "b=2"]
+
+    @pytest.mark.parametrize("streaming", [True, False])
+    def test_content_encoded_body_is_relayed_raw(self, client, upstream, monkeypatch, streaming):
+        monkeypatch.setattr(settings, "PROXY_STREAMING", streaming)
+        body = gzip.compress(b'{"users": []}')
+        upstream.handler = lambda request: httpx.Response(
+            200, content=body, headers={"content-type": "application/json", "content-encoding": "gzip"}
+        )
+        response = client.get("/api/v1/users")
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.json() == {"users": []}
+
+    def test_unreachable_upstream_is_503(self, client, upstream):
+        def refuse(request):
+            raise httpx.ConnectError("connection refused", request=request)
+        upstream.handler = refuse
+        response = client.post("/api/v1/users", json={})
+        assert response.status_code == 503
+
+    def test_upstream_timeout_is_504(self, client, upstream):
+        def stall(request):
+            raise httpx.ReadTimeout("timed out", request=request)
+        upstream.handler = stall
+        response = client.post("/api/v1/users", json={})
+        assert response.status_code == 504
+
+
+class TestUpstreamClients:
+    """Test the pooled clients' lifetime"""
+
+    def test_one_client_per_upstream_is_reused(self, client, upstream):
+        auth_client = upstream_clients.get("auth")
+        client.get("/api/v1/users")
+        client.get("/api/v1/auth/me")
+        assert upstream_clients.get("auth") is auth_client
+        assert upstream_clients.get("notification") is not auth_client
+        assert upstream.calls() == 2
+
+    def test_clients_are_closed_at_shutdown(self, upstream):
+        with TestClient(app):
+            auth_client = upstream_clients.get("auth")
+        assert auth_client.is_closed
+        with pytest.raises(RuntimeError):
+            upstream_clients.get("auth")
+
+
+class TestCors:
+    """Test cross-origin access to upstream headers"""
+
+    def test_pagination_cursor_is_exposed(self, client, upstream):
+        upstream.handler = lambda request: httpx.Response(200, json=[], headers={"x-next-cursor": "abc"})
+        response = client.get("/api/v1/users", headers={"Origin": "http://localhost:5173"})
+        assert response.headers["x-next-cursor"] == "abc"
+        assert "x-next-cursor" in response.headers["access-control-expose-headers"].lower()
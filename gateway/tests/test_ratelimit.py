@@ -0,0 +1,75 @@
+"""
+Tests for token-bucket rate limits and load shedding
+"""
+from app.core.ratelimit import MemoryBackend, load_shedder, rate_limiter
+from tests.conftest import make_token
+
+LOGIN = "/api/v1/auth/login"  # rate 1/s, burst 5, keyed by IP
+
+
+class TestMemoryBackend:
+    """Test the token bucket"""
+
+    def test_burst_then_wait(self):
+        backend = MemoryBackend(max_keys=10)
+        assert [backend.take("k", rate=2, burst=2, now=0.0) for _ in range(2)] == [0.0, 0.0]
+        assert backend.take("k", rate=2, burst=2, now=0.0) == 0.5
+
+    def test_tokens_refill_over_time(self):
+        backend = MemoryBackend(max_keys=10)
+        backend.take("k", rate=1, burst=1, now=0.0)
+        assert backend.take("k", rate=1, burst=1, now=0.5) > 0
+        assert backend.take("k", rate=1, burst=1, now=2.0) == 0.0
+
+    def test_least_recently_used_keys_are_dropped(self):
+        backend = MemoryBackend(max_keys=2)
+        for key in ("a", "b", "c"):
+            backend.take(key, rate=1, burst=1, now=0.0)
+        # "a" was forgotten, so it starts with a full bucket again
+        assert backend.take("a", rate=1, burst=1, now=0.0) == 0.0
+        assert backend.take("c", rate=1, burst=1, now=0.0) > 0
+
+
+class TestRateLimitedRoutes:
+    """Test 429 responses"""
+
+    def test_burst_exceeded_gets_429_with_retry_after(self, client, upstream):
+        for _ in range(5):
+            assert client.post(LOGIN, json={}).status_code == 200
+        response = client.post(LOGIN, json={})
+        assert response.status_code == 429
+        assert int(response.headers["retry-after"]) >= 1
+        assert upstream.calls() == 5
+        assert rate_limiter.limited == 1
+
+    def test_limits_are_per_route(self, client, upstream):
+        for _ in range(6):
+            client.post(LOGIN, json={})
+        assert client.post("/api/v1/auth/refresh", json={}).status_code == 200
+
+    def test_subject_keyed_limits_are_per_user(self, client, upstream):
+        # /balance-summary: rate 2/s, burst 5, keyed by auth subject
+        first = {"Authorization": f"Bearer {make_token('1')}"}
+        second = {"Authorization": f"Bearer {make_token('2')}"}
+        for _ in range(5):
+            client.get("/api/v1/balance-summary", headers=first)
+        assert client.get("/api/v1/balance-summary", headers=first).status_code == 429
+        assert client.get("/api/v1/balance-summary", headers=second).status_code == 200
+
+
+class TestLoadShedding:
+    """Test early 503s beyond SHED_MAX_IN_FLIGHT"""
+
+    def test_overloaded_gateway_sheds_api_requests(self, client, upstream, monkeypatch):
+        monkeypatch.setattr(load_shedder, "max_in_flight", 1)
+        monkeypatch.setattr(load_shedder, "in_flight", 1)
+        response = client.get("/api/v1/auth/me")
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
+        assert upstream.calls() == 0
+        assert load_shedder.stats()["shed"] == 1
+
+    def test_non_api_paths_are_never_shed(self, client, monkeypatch):
+        monkeypatch.setattr(load_shedder, "max_in_flight", 1)
+        monkeypatch.setattr(load_shedder, "in_flight", 1)
+        assert client.get("/health").status_code == 200
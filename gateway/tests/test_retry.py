@@ -0,0 +1,163 @@
+"""
+Tests for retries and hedged requests within the retry budget
+"""
+import asyncio
+from unittest.mock import patch
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.core.balancer import LEAST_OUTSTANDING
+from app.core.breaker import breakers
+from app.core.config import settings
+from app.core.latency import latencies
+from app.core.retry import RetryBudget, retry_budgets
+from app.core.routing import route_table
+from app.core.upstream import send
+
+RETRIED = "/api/v1/users/7"  # Route /users: retries=2, hedge
+
+
+@pytest.fixture
+def client(upstream, monkeypatch):
+    """Gateway with two auth replicas, picked in order (auth-1 first)"""
+    monkeypatch.setattr(settings, "UPSTREAMS", {**settings.UPSTREAMS, "auth": ["http://auth-1", "http://auth-2"]})
+    monkeypatch.setattr(settings, "LB_STRATEGY", LEAST_OUTSTANDING)
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def first_replica_unavailable(request):
+    if request.url.host == "auth-1":
+        return httpx.Response(503, json={})
+    return httpx.Response(200, json={"host": request.url.host})
+
+
+class TestRetryBudget:
+    """Test the retry allowance"""
+
+    def test_deposits_fund_retries(self):
+        budget = RetryBudget(ratio=0.5, min_per_second=0)
+        assert budget.withdraw()  # The initial reserve
+        budget.deposit()
+        assert not budget.withdraw()
+        budget.deposit()
+        assert budget.withdraw()
+        assert budget.stats()["exhausted"] == 1
+
+    def test_reserve_allows_occasional_retries(self):
+        budget = RetryBudget(ratio=0.0, min_per_second=1)
+        assert budget.withdraw()
+        assert not budget.withdraw()
+
+
+class TestRetries:
+    """Test retrying idempotent calls on another replica"""
+
+    def test_failed_get_is_retried_on_the_other_replica(self, client, upstream):
+        upstream.handler = first_replica_unavailable
+        response = client.get(RETRIED)
+        assert response.status_code == 200
+        assert response.json() == {"host": "auth-2"}
+        assert retry_budgets.get("auth").retries == 1
+
+    def test_connection_errors_are_retried(self, client, upstream):
+        def refuse_first(request):
+            if request.url.host == "auth-1":
+                raise httpx.ConnectError("connection refused", request=request)
+            return httpx.Response(200, json={})
+        upstream.handler = refuse_first
+        assert client.get(RETRIED).status_code == 200
+
+    def test_post_is_not_retried(self, client, upstream):
+        upstream.handler = first_replica_unavailable
+        response = client.post("/api/v1/users/7", json={})
+        assert response.status_code == 503
+        assert upstream.calls() == 1
+
+    def test_exhausted_budget_returns_the_failure(self, client, upstream, monkeypatch):
+        monkeypatch.setattr(RetryBudget, "withdraw", lambda self: False)
+        upstream.handler = first_replica_unavailable
+        assert client.get(RETRIED).status_code == 503
+        assert upstream.calls() == 1
+
+    def test_routes_without_retries_are_sent_once(self, client, upstream):
+        upstream.handler = first_replica_unavailable
+        assert client.get("/api/v1/auth/me").status_code == 503
+        assert upstream.calls() == 1
+
+
+class TestHedging:
+    """Test duplicate GETs sent when the first replica is slower than the route's p95"""
+
+    def test_slow_replica_is_hedged(self, client, upstream):
+        for _ in range(settings.ADAPTIVE_TIMEOUT_MIN_SAMPLES):
+            latencies.get("/users").record(0.01)
+
+        async def slow_first(request):
+            if request.url.host == "auth-1":
+                await asyncio.sleep(1)
+            return httpx.Response(200, json={"host": request.url.host})
+        upstream.handler = slow_first
+
+        response = client.get(RETRIED)
+        assert response.json() == {"host": "auth-2"}
+        assert retry_budgets.get("auth").hedges == 1
+
+    def test_losing_response_that_arrives_while_cancelled_is_closed(self, client, upstream):
+        for _ in range(settings.ADAPTIVE_TIMEOUT_MIN_SAMPLES):
+            latencies.get("/users").record(0.01)
+        late = httpx.Response(200, stream=httpx.ByteStream(b"{}"))
+
+        async def attempt(rule, upstream_request, pool, replica, breaker):
+            if replica.url == "http://auth-1":
+                try:
+                    await asyncio.sleep(1)
+                except asyncio.CancelledError:
+                    # The response came back just as the hedge won
+                    return late
+            return httpx.Response(200, json={"host": "auth-2"})
+
+        async def scenario():
+            with patch("app.core.upstream._attempt", attempt):
+                response = await send(route_table.match("users/7")[0], httpx.Request("GET", "/api/v1/users/7"))
+            await asyncio.sleep(0.05)
+            return response
+
+        assert client.portal.call(scenario).json() == {"host": "auth-2"}
+        assert late.is_closed
+
+    def test_no_hedge_without_latency_history(self, client, upstream):
+        client.get(RETRIED)
+        assert upstream.calls() == 1
+        assert retry_budgets.get("auth").hedges == 0
+
+
+class TestRetryCancellation:
+    """Test cancelling a request while it waits to retry"""
+
+    def test_cancel_during_backoff_leaves_the_probe_slot_free(self, client, upstream, monkeypatch):
+        # The breaker half-opens as soon as it opens, so the retry would be its probe
+        monkeypatch.setattr(settings, "BREAKER_OPEN_SECONDS", 0)
+        monkeypatch.setattr(settings, "RETRY_BACKOFF_BASE", 60)
+        monkeypatch.setattr("app.core.retry.random.uniform", lambda low, high: high)
+        upstream.handler = lambda request: httpx.Response(503, json={})
+        rule, _ = route_table.match("/users/7")
+        breaker = breakers.get("auth")
+        for _ in range(settings.BREAKER_MIN_CALLS):
+            breaker.record_failure()
+
+        async def cancel_while_waiting():
+            task = asyncio.create_task(send(rule, httpx.Request("GET", "/api/v1/users/7")))
+            while upstream.calls() == 0:
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        client.portal.call(cancel_while_waiting)
+        assert upstream.calls() == 1
+        assert breaker.allow()
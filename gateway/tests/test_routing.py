@@ -0,0 +1,179 @@
+"""
+Tests for the route table: trie precedence, path rewriting and reloads
+"""
+import json
+
+import pytest
+
+from app.core.config import settings
+from app.core.routing import RouteRule, RouteTrie, route_table
+
+
+def make_trie(*prefixes):
+    return RouteTrie([RouteRule(prefix=prefix, upstream="auth") for prefix in prefixes])
+
+
+class TestRouteTrie:
+    """Test longest-prefix matching over path segments"""
+
+    def test_longest_prefix_wins(self):
+        trie = make_trie("/auth", "/auth/login")
+        assert trie.match("auth/login")[0].prefix == "/auth/login"
+        assert trie.match("auth/login/extra")[0].prefix == "/auth/login"
+        assert trie.match("auth/refresh")[0].prefix == "/auth"
+
+    def test_literal_segment_preferred_over_parameter(self):
+        trie = make_trie("/groups/{group_id}", "/groups/mine")
+        assert trie.match("groups/mine")[0].prefix == "/groups/mine"
+        rule, params = trie.match("groups/42")
+        assert rule.prefix == "/groups/{group_id}"
+        assert params == {"group_id": "42"}
+
+    def test_dead_end_literal_falls_back_to_parameter(self):
+        trie = make_trie("/groups/mine/archive", "/groups/{group_id}/members")
+        rule, params = trie.match("groups/mine/members")
+        assert rule.prefix == "/groups/{group_id}/members"
+        assert params == {"group_id": "mine"}
+        assert trie.match("groups/mine/archive")[0].prefix == "/groups/mine/archive"
+
+    def test_literal_branch_rule_wins_over_deeper_parameter_rule(self):
+        trie = make_trie("/groups/mine", "/groups/{group_id}/members")
+        assert trie.match("groups/mine/members")[0].prefix == "/groups/mine"
+
+    def test_parameters_are_captured(self):
+        rule, params = make_trie("/users/{user_id}/groups").match("users/7/groups")
+        assert rule.prefix == "/users/{user_id}/groups"
+        assert params == {"user_id": "7"}
+
+    def test_trailing_wildcard_is_the_prefix_itself(self):
+        trie = make_trie("/groups/{group_id}/wallet/*")
+        assert trie.match("groups/3/wallet")[0] is not None
+        assert trie.match("groups/3/wallet/deposit")[0] is not None
+
+    def test_no_match(self):
+        trie = make_trie("/auth")
+        assert trie.match("unknown/path") == (None, {})
+        assert trie.match("") == (None, {})
+
+    def test_segment_boundaries_are_respected(self):
+        assert make_trie("/auth").match("authentication")[0] is None
+
+    def test_duplicate_prefix_is_rejected(self):
+        with pytest.raises(ValueError):
+            make_trie("/auth", "/auth/")
+
+    def test_unknown_upstream_is_rejected(self):
+        with pytest.raises(ValueError):
+            RouteRule.from_dict({"prefix": "/x", "upstream": "nowhere"})
+
+    @pytest.mark.parametrize("spec", [
+        "/x",
+        {"prefix": ["/x"], "upstream": "auth"},
+        {"prefix": "/x", "upstream": ["auth"]},
+        {"prefix": "/x", "upstream": "auth", "cache_ttl": [30]},
+        {"prefix": "/x", "upstream": "auth", "rate_limit": "fast"},
+        {"prefix": "/x", "upstream": "auth", "rate_limit": {"rate": 1}},
+        {"prefix": "/x", "upstream": "auth", "rate_limit": {"rate": None, "burst": 1}},
+    ])
+    def test_malformed_specs_raise_value_error(self, spec):
+        with pytest.raises(ValueError):
+            RouteRule.from_dict(spec)
+
+
+class TestDefaultRoutes:
+    """Test the built-in table's precedence"""
+
+    def test_wallet_balance_goes_to_legacy(self):
+        route_table.load()
+        rule, params = route_table.match("groups/5/wallet/balance")
+        assert (rule.upstream, rule.prefix) == ("legacy", "/groups/{group_id}/wallet/balance")
+        assert params == {"group_id": "5"}
+
+    def test_group_listing_goes_to_auth(self):
+        route_table.load()
+        assert route_table.match("groups/5")[0].upstream == "auth"
+        assert route_table.match("groups")[0].upstream == "auth"
+
+    def test_notification_routes_match_the_service(self):
+        route_table.load()
+        for path in ("send-email", "send-sms", "send-push"):
+            assert route_table.match(path)[0].upstream == "notification"
+        assert route_table.match("send-telegram")[0] is None
+        assert route_table.match("notifications")[0] is None
+
+    def test_rule_options_are_compiled(self):
+        route_table.load()
+        assert route_table.match("send-email")[0].timeout == 10.0
+        assert route_table.match("expenses/3")[0].strip_prefix
+        assert not route_table.match("auth/login")[0].strip_prefix
+        assert route_table.match("categories")[0].cache_ttl == 300
+        assert route_table.match("balance-summary")[0].coalesce
+        assert route_table.match("auth/login")[0].rate_limit.burst == 5
+        assert route_table.match("auth/refresh")[0].rate_limit is None
+        assert route_table.match("users/7")[0].retries == 2
+        assert route_table.match("users/7")[0].hedge
+        assert route_table.match("auth/request-password-reset")[0].public
+        assert not route_table.match("auth/me")[0].public
+
+
+class TestProxyRouting:
+    """Test how matched requests are forwarded"""
+
+    def test_unmatched_path_is_404(self, client, upstream):
+        response = client.get("/api/v1/nothing-here")
+        assert response.status_code == 404
+        assert upstream.calls() == 0
+
+    def test_auth_routes_keep_the_api_prefix(self, client, upstream):
+        response = client.get("/api/v1/auth/me")
+        assert response.json() == {"host": "auth-1", "path": "/api/v1/auth/me"}
+
+    def test_legacy_routes_strip_the_api_prefix(self, client, upstream):
+        response = client.get("/api/v1/debts/history")
+        assert response.json() == {"host": "legacy-1", "path": "/debts/history"}
+
+    def test_query_string_is_forwarded(self, client, upstream):
+        client.get("/api/v1/actions/pending?user_id=3")
+        assert upstream.requests[-1].url.params["user_id"] == "3"
+
+
+class TestRouteReload:
+    """Test POST /gateway/routes/reload"""
+
+    def test_reload_requires_admin_token(self, client):
+        assert client.post("/gateway/routes/reload").status_code == 403
+
+    def test_reload_from_file(self, client, admin_headers, tmp_path, monkeypatch):
+        routes = tmp_path / "routes.json"
+        routes.write_text(json.dumps([{"prefix": "/only", "upstream": "auth"}]))
+        monkeypatch.setattr(settings, "GATEWAY_ROUTES_FILE", str(routes))
+
+        response = client.post("/gateway/routes/reload", headers=admin_headers)
+        assert response.json() == {"message": "Route table reloaded", "routes": 1}
+        assert client.get("/api/v1/auth/me").status_code == 404
+        assert client.get("/api/v1/only/this").status_code == 200
+
+    def test_invalid_file_keeps_previous_table(self, client, admin_headers, tmp_path, monkeypatch):
+        routes = tmp_path / "routes.json"
+        routes.write_text(json.dumps([{"prefix": "/x", "upstream": "nowhere"}]))
+        monkeypatch.setattr(settings, "GATEWAY_ROUTES_FILE", str(routes))
+
+        response = client.post("/gateway/routes/reload", headers=admin_headers)
+        assert response.status_code == 400
+        assert client.get("/api/v1/auth/me").status_code == 200
+
+    @pytest.mark.parametrize("content", [
+        {"routes": {"prefix": "/x", "upstream": "auth"}},
+        {"rules": []},
+        "routes",
+        [["/x", "auth"]],
+        [{"prefix": "/x", "upstream": "auth", "timeout": {"seconds": 5}}],
+    ])
+    def test_wrongly_typed_file_is_400(self, client, admin_headers, tmp_path, monkeypatch, content):
+        routes = tmp_path / "routes.json"
+        routes.write_text(json.dumps(content))
+        monkeypatch.setattr(settings, "GATEWAY_ROUTES_FILE", str(routes))
+
+        response = client.post("/gateway/routes/reload", headers=admin_headers)
+        assert response.status_code == 400
+        assert client.get("/api/v1/auth/me").status_code == 200
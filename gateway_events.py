@@ -0,0 +1,40 @@
+# gateway_events.py
+import os
+import httpx
+
+# The API gateway fans published events out to its /api/v1/events streams
+API_GATEWAY_URL = os.getenv("API_GATEWAY_URL", "http://localhost:8000")
+GATEWAY_INTERNAL_TOKEN = os.getenv("GATEWAY_INTERNAL_TOKEN", "")
+PUBLISH_TIMEOUT = 2.0
+
+# Event types the gateway accepts (see gateway/app/core/events.py)
+PENDING_ACTION_CREATED = "pending_action.created"
+VOTE_CAST = "vote.cast"
+ACTION_CONFIRMED = "action.confirmed"
+ACTION_REJECTED = "action.rejected"
+WALLET_TRANSACTION = "wallet.transaction"
+
+def publish_event(event_type: str, user_ids=(), group_ids=(), data: dict = None):
+    """
+    Pushes an event to the live streams of users and groups through the gateway.
+    Best effort: a gateway that is down or unconfigured never fails the caller.
+
+    User and group ids are this app's users.id/groups.id. The gateway matches
+    them against auth service token subjects and memberships, which holds
+    because both apps share the users, groups and group_members tables (see
+    TestSharedLegacyIds in the auth service tests).
+    """
+    if not GATEWAY_INTERNAL_TOKEN:
+        return
+
+    payload = {"type": event_type, "user_ids": list(user_ids), "group_ids": list(group_ids), "data": data or {}}
+    try:
+        response = httpx.post(
+            f"{API_GATEWAY_URL.rstrip('/')}/internal/events",
+            json=payload,
+            headers={"X-Gateway-Internal-Token": GATEWAY_INTERNAL_TOKEN},
+            timeout=PUBLISH_TIMEOUT,
+        )
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        print(f"Failed to publish {event_type} event. Error: {e}")
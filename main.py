@@ -15,7 +15,9 @@ from pydantic import BaseModel, ConfigDict
 from models import WalletTransactionType, ActionType, ActionStatus
 # Make sure notifications.py exists and is correctly configured
 from notifications import send_telegram_message
+from gateway_events import publish_event, PENDING_ACTION_CREATED, VOTE_CAST, ACTION_CONFIRMED, ACTION_REJECTED, WALLET_TRANSACTION
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 # --- Create all database tables ---
 models.Base.metadata.create_all(bind=engine)
@@ -181,6 +183,21 @@ def _process_action_vote(action_id: int, db: Session):
     elif rejections / total_voters >= 0.5:
         action.status = ActionStatus.REJECTED
     db.commit()
+    if action.status != ActionStatus.PENDING: _publish_action_outcome(action)
+
+def _publish_action_outcome(action: models.PendingAction):
+    event_type = ACTION_CONFIRMED if action.status == ActionStatus.CONFIRMED else ACTION_REJECTED
+    outcome = {"action_id": action.id, "action_type": action.action_type.value, "status": action.status.value, "group_id": action.group_id}
+    publish_event(event_type, user_ids=[vote.voter_id for vote in action.votes], group_ids=[action.group_id], data=outcome)
+    if action.status == ActionStatus.CONFIRMED and action.action_type == ActionType.WALLET_DEPOSIT:
+        details = json.loads(action.details)
+        publish_event(WALLET_TRANSACTION, group_ids=[action.group_id], data=_wallet_event(action.group_id, details['user_id'], WalletTransactionType.DEPOSIT, details['amount']))
+
+def _wallet_event(group_id: int, user_id: int, tx_type: WalletTransactionType, amount: float) -> dict:
+    return {"group_id": group_id, "user_id": user_id, "type": tx_type.value, "amount": amount}
+
+def _pending_action_event(action: models.PendingAction, details: dict) -> dict:
+    return {"action_id": action.id, "action_type": action.action_type.value, "group_id": action.group_id, "initiator_id": action.initiator_id, "details": details}
 
 def format_debt_response(debt: models.Debt) -> DebtResponse:
     return DebtResponse(id=debt.id, total_amount=debt.total_amount, remaining_amount=calculate_remaining_amount(debt), is_settled=debt.is_settled, expense_id=debt.expense_id, debtor=debt.debtor, creditor=debt.creditor, payments=debt.payments)
@@ -287,6 +304,8 @@ def cast_vote(action_id: int, vote_data: VoteRequest, background_tasks: Backgrou
     if vote_record.vote is not None: raise HTTPException(status_code=400, detail="You have already voted.")
     vote_record.vote = vote_data.approve
     db.commit()
+    vote_event = {"action_id": action_id, "voter_id": vote_data.voter_id, "approve": vote_data.approve}
+    background_tasks.add_task(publish_event, VOTE_CAST, group_ids=[vote_record.action.group_id], data=vote_event)
     background_tasks.add_task(_process_action_vote, action_id, db)
     db.refresh(vote_record.action)
     action = vote_record.action
@@ -314,6 +333,8 @@ def request_new_expense(expense: ExpenseRequest, background_tasks: BackgroundTas
     for voter_id in expense.participant_ids:
         db.add(models.ActionVote(action_id=pending_action.id, voter_id=voter_id, vote=(True if voter_id == expense.paid_by_user_id else None)))
     db.commit(); db.refresh(pending_action)
+    voter_ids = [user.id for user in voter_users]
+    background_tasks.add_task(publish_event, PENDING_ACTION_CREATED, user_ids=voter_ids, group_ids=[expense.group_id], data=_pending_action_event(pending_action, expense.dict()))
     background_tasks.add_task(_process_action_vote, pending_action.id, db)
     db.refresh(pending_action)
     pending_action.details = json.loads(pending_action.details)
@@ -330,7 +351,9 @@ def request_wallet_deposit(group_id: int, deposit: WalletDepositRequest, backgro
         details['group_id'] = group_id
         _execute_confirmed_deposit(details, db)
         db.commit()
-        raise HTTPException(status_code=200, detail="Deposit auto-confirmed as you are the only member.")
+        background_tasks.add_task(publish_event, WALLET_TRANSACTION, group_ids=[group_id], data=_wallet_event(group_id, deposit.user_id, WalletTransactionType.DEPOSIT, deposit.amount))
+        # Returned rather than raised so the background event still goes out
+        return JSONResponse(status_code=200, content={"detail": "Deposit auto-confirmed as you are the only member."})
     deposit_details = deposit.dict()
     deposit_details['group_id'] = group_id
     action_details = json.dumps(deposit_details)
@@ -339,6 +362,8 @@ def request_wallet_deposit(group_id: int, deposit: WalletDepositRequest, backgro
     for member in group.members:
         db.add(models.ActionVote(action_id=pending_action.id, voter_id=member.id, vote=(True if member.id == deposit.user_id else None)))
     db.commit(); db.refresh(pending_action)
+    voter_ids = [member.id for member in voter_users]
+    background_tasks.add_task(publish_event, PENDING_ACTION_CREATED, user_ids=voter_ids, group_ids=[group_id], data=_pending_action_event(pending_action, deposit_details))
     background_tasks.add_task(_process_action_vote, pending_action.id, db)
     db.refresh(pending_action)
     pending_action.details = json.loads(pending_action.details)
@@ -361,7 +386,7 @@ def get_wallet_balance(group_id: int, db: Session = Depends(get_db)):
     return WalletBalanceResponse(group_id=group_id, total_wallet_balance=total_balance, member_balances=member_balances_response)
 
 @app.post("/groups/{group_id}/wallet/withdraw", response_model=WalletBalanceResponse, tags=["Group Wallet"])
-def withdraw_from_wallet(group_id: int, withdrawal: WalletWithdrawalRequest, db: Session = Depends(get_db)):
+def withdraw_from_wallet(group_id: int, withdrawal: WalletWithdrawalRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     user = db.query(models.User).filter(models.User.id == withdrawal.user_id).first()
     if not user or not security.verify_password(withdrawal.password, user.hashed_password): raise HTTPException(status_code=401, detail="Invalid user or password")
     user_balance = get_user_wallet_balance(user_id=withdrawal.user_id, group_id=group_id, db=db)
@@ -369,10 +394,11 @@ def withdraw_from_wallet(group_id: int, withdrawal: WalletWithdrawalRequest, db:
     if withdrawal.amount <= 0: raise HTTPException(status_code=400, detail="Withdrawal amount must be positive.")
     wallet_tx = models.WalletTransaction(amount=-withdrawal.amount, type=WalletTransactionType.WITHDRAWAL, description="User withdrawal", group_id=group_id, user_id=withdrawal.user_id, status=ActionStatus.CONFIRMED)
     db.add(wallet_tx); db.commit()
+    background_tasks.add_task(publish_event, WALLET_TRANSACTION, group_ids=[group_id], data=_wallet_event(group_id, withdrawal.user_id, WalletTransactionType.WITHDRAWAL, -withdrawal.amount))
     return get_wallet_balance(group_id=group_id, db=db)
 
 @app.post("/groups/{group_id}/wallet/settle-debts", response_model=SettlementSummaryResponse, tags=["Group Wallet"])
-def settle_group_debts_from_wallet(group_id: int, request: SettleDebtsRequest, db: Session = Depends(get_db)):
+def settle_group_debts_from_wallet(group_id: int, request: SettleDebtsRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     group = db.query(models.Group).options(joinedload(models.Group.members)).filter(models.Group.id == group_id).first()
     if not group: raise HTTPException(status_code=404, detail="Group not found")
     target_user_ids = [request.user_id] if request.user_id else [m.id for m in group.members]
@@ -393,6 +419,10 @@ def settle_group_debts_from_wallet(group_id: int, request: SettleDebtsRequest, d
         else:
             settlement_logs.append(SettlementLog(debt_id=debt.id, amount_settled=0, status="Insufficient Funds"))
     db.commit()
+    settled = [log for log in settlement_logs if log.amount_settled > 0]
+    if settled:
+        settlement_event = {"group_id": group_id, "type": WalletTransactionType.SETTLEMENT.value, "debt_ids": [log.debt_id for log in settled], "amount": round(sum(log.amount_settled for log in settled), 2)}
+        background_tasks.add_task(publish_event, WALLET_TRANSACTION, group_ids=[group_id], data=settlement_event)
     return SettlementSummaryResponse(message="Wallet settlement process completed.", settlements=settlement_logs)
 
 # --- Comprehensive Balance Summary Endpoint (Corrected) ---
@@ -1,33 +1,39 @@
 """
 Dependency functions for API routes - Enhanced with JWT authentication
 """
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from typing import Optional
 
 from app.db.session import get_db
 from app.db.models.user import User, UserRole
-from app.core.security import verify_token
+from app.core.principals import Principal, principal_cache
+from app.core.security import GATEWAY_CLAIMS_HEADER, verify_gateway_claims, verify_token
 
 # HTTP Bearer token security scheme
 security = HTTPBearer()
 
 
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
+def _authenticated_user_id(request: Request, credentials: HTTPAuthorizationCredentials) -> int:
     """
-    Get current authenticated user from JWT token
+    Verify the bearer token and return the user ID it was issued to
+    
+    Claims already verified by the API gateway are used when its signed
+    header accompanies the token; otherwise the token is decoded here.
     
     Raises:
-        HTTPException: If token is invalid or user not found
+        HTTPException: If token is invalid
     """
     token = credentials.credentials
     
     # Verify token
-    payload = verify_token(token, token_type="access")
+    payload = None
+    claims_header = request.headers.get(GATEWAY_CLAIMS_HEADER)
+    if claims_header:
+        payload = verify_gateway_claims(claims_header, token)
+    if payload is None:
+        payload = verify_token(token, token_type="access")
     if not payload:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -46,39 +52,99 @@ def get_current_user(
     
     # Convert user ID to integer
     try:
-        user_id = int(user_id_str)
+        return int(user_id_str)
     except (ValueError, TypeError):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid user ID in token",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+
+def _check_account_status(account) -> None:
+    """
+    Reject inactive and banned accounts (a User or a Principal)
     
-    # Get user from database
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-    
+    Raises:
+        HTTPException: If the account may not be used
+    """
     # Check if user is active
-    if not user.is_active:
+    if not account.is_active:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="User account is not active"
         )
     
     # Check if user is banned
-    if user.is_banned:
+    if account.is_banned:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="User account has been banned"
         )
+
+
+def get_current_user(
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+) -> User:
+    """
+    Get current authenticated user from JWT token
+    
+    Loads the full user row; routes that only need the caller's identity
+    and role should depend on get_current_principal instead.
+    
+    Raises:
+        HTTPException: If token is invalid or user not found
+    """
+    user_id = _authenticated_user_id(request, credentials)
+    
+    # Get user from database
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        principal_cache.invalidate(user_id)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    
+    # The row is loaded anyway, so refresh the cached principal
+    principal_cache.put(Principal.from_user(user))
+    _check_account_status(user)
     
     return user
 
 
+def get_current_principal(
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+) -> Principal:
+    """
+    Get the current authenticated user's principal (id, role, status)
+    
+    Served from the principal cache, so most requests skip the user lookup.
+    
+    Raises:
+        HTTPException: If token is invalid or user not found
+    """
+    user_id = _authenticated_user_id(request, credentials)
+    
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        user = db.query(User).filter(User.id == user_id).first()
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
+            )
+        principal = Principal.from_user(user)
+        principal_cache.put(principal)
+    
+    _check_account_status(principal)
+    return principal
+
+
 def get_current_active_user(
     current_user: User = Depends(get_current_user)
 ) -> User:
@@ -89,10 +155,10 @@ def get_current_active_user(
 
 
 def get_current_admin_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: Principal = Depends(get_current_principal)
+) -> Principal:
     """
-    Get current user and verify admin role
+    Get current user's principal and verify admin role
     
     Raises:
         HTTPException: If user is not an admin
@@ -106,6 +172,7 @@ def get_current_admin_user(
 
 
 def get_optional_current_user(
+    request: Request,
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
     db: Session = Depends(get_db)
 ) -> Optional[User]:
@@ -117,6 +184,6 @@ def get_optional_current_user(
         return None
     
     try:
-        return get_current_user(credentials, db)
+        return get_current_user(request, credentials, db)
     except HTTPException:
         return None
@@ -4,19 +4,25 @@ Endpoints: /admin/users, /admin/users/{id}, /admin/config
 """
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, func
 from typing import List
+from datetime import datetime
 
 from app.db.session import get_db
-from app.db.models.user import User, SystemConfig, UserSession
+from app.db.models.user import User, SystemConfig, UserSession, OTPCode, group_members_table
+from app.db.counters import read_stats
+from app.db.search import search_users
 from app.schemas.user import (
     User as UserSchema, UserUpdate, UserListFilter, UserListResponse,
     SendNotificationRequest, SystemConfigUpdate, SystemConfigResponse,
-    MessageResponse
+    MessageResponse, BulkAction, BulkUserRequest, BulkUserResponse, BulkUserResult,
+    OTPMethod
 )
 from app.api.v1.dependencies import get_current_admin_user
-from app.core.security import get_password_hash
-import httpx
+from app.core.notifications import OutgoingMessage, admin_outbox, notification_client
+from app.core.pagination import count_cache, keyset_page
+from app.core.principals import Principal, principal_cache
+from app.core.system_config import system_config
+from app.core.security import get_password_hash, evict_cached_user_tokens
 from app.core.config import settings
 
 router = APIRouter()
@@ -34,25 +40,22 @@ async def list_users(
     is_banned: bool = None,
     skip: int = 0,
     limit: int = 50,
-    current_admin: User = Depends(get_current_admin_user),
+    cursor: str = None,
+    include_total: bool = True,
+    fuzzy: bool = False,
+    current_admin: Principal = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
     """
     List all users with filters and pagination
+    
+    Pass next_cursor/prev_cursor from a response as `cursor` to page
+    through the list; `skip` only applies without a cursor. Search results
+    are ordered by relevance and paged with `skip` (no cursors).
     """
     query = db.query(User)
     
     # Apply filters
-    if search:
-        search_pattern = f"%{search}%"
-        query = query.filter(
-            or_(
-                User.username.ilike(search_pattern),
-                User.name.ilike(search_pattern),
-                User.email.ilike(search_pattern)
-            )
-        )
-    
     if role:
         query = query.filter(User.role == role)
     
@@ -62,24 +65,39 @@ async def list_users(
     if is_banned is not None:
         query = query.filter(User.is_banned == is_banned)
     
-    # Get total count
-    total = query.count()
-    
     # Apply pagination
-    users = query.offset(skip).limit(limit).all()
+    if search:
+        query = search_users(query, db, search, fuzzy)
+        users = query.offset(skip).limit(limit).all()
+        next_cursor = prev_cursor = None
+    else:
+        try:
+            users, next_cursor, prev_cursor = keyset_page(query, User.id, limit, cursor, skip)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+    
+    # Get total count
+    total = None
+    if include_total:
+        total = count_cache.get_or_compute(("users", search, fuzzy, role, is_active, is_banned), query.count)
     
     return UserListResponse(
         users=[UserSchema.model_validate(u) for u in users],
         total=total,
         skip=skip,
-        limit=limit
+        limit=limit,
+        next_cursor=next_cursor,
+        prev_cursor=prev_cursor
     )
 
 
 @router.get("/users/{user_id}", response_model=UserSchema)
 async def get_user(
     user_id: int,
-    current_admin: User = Depends(get_current_admin_user),
+    current_admin: Principal = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -99,7 +117,7 @@ async def get_user(
 async def update_user(
     user_id: int,
     user_update: UserUpdate,
-    current_admin: User = Depends(get_current_admin_user),
+    current_admin: Principal = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -156,6 +174,10 @@ async def update_user(
     
     db.commit()
     db.refresh(user)
+    principal_cache.invalidate(user_id)
+    count_cache.clear()
+    if user.is_banned or not user.is_active:
+        evict_cached_user_tokens(user_id)
     
     return UserSchema.model_validate(user)
 
@@ -163,7 +185,7 @@ async def update_user(
 @router.post("/users/{user_id}/ban", response_model=MessageResponse)
 async def ban_user(
     user_id: int,
-    current_admin: User = Depends(get_current_admin_user),
+    current_admin: Principal = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -184,11 +206,13 @@ async def ban_user(
         )
     
     user.is_banned = True
-    db.commit()
     
     # Terminate all user sessions
     db.query(UserSession).filter(UserSession.user_id == user_id).delete()
     db.commit()
+    principal_cache.invalidate(user_id)
+    count_cache.clear()
+    evict_cached_user_tokens(user_id)
     
     return MessageResponse(message=f"User {user.username} has been banned successfully")
 
@@ -196,7 +220,7 @@ async def ban_user(
 @router.post("/users/{user_id}/unban", response_model=MessageResponse)
 async def unban_user(
     user_id: int,
-    current_admin: User = Depends(get_current_admin_user),
+    current_admin: Principal = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -211,6 +235,8 @@ async def unban_user(
     
     user.is_banned = False
     db.commit()
+    principal_cache.invalidate(user_id)
+    count_cache.clear()
     
     return MessageResponse(message=f"User {user.username} has been unbanned successfully")
 
@@ -218,7 +244,7 @@ async def unban_user(
 @router.delete("/users/{user_id}", response_model=MessageResponse)
 async def delete_user(
     user_id: int,
-    current_admin: User = Depends(get_current_admin_user),
+    current_admin: Principal = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -241,6 +267,9 @@ async def delete_user(
     username = user.username
     db.delete(user)
     db.commit()
+    principal_cache.invalidate(user_id)
+    count_cache.clear()
+    evict_cached_user_tokens(user_id)
     
     return MessageResponse(message=f"User {username} has been deleted successfully")
 
@@ -249,7 +278,7 @@ async def delete_user(
 async def send_user_notification(
     user_id: int,
     request: SendNotificationRequest,
-    current_admin: User = Depends(get_current_admin_user),
+    current_admin: Principal = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -262,61 +291,199 @@ async def send_user_notification(
             detail="User not found"
         )
     
-    try:
-        async with httpx.AsyncClient() as client:
-            if request.method == "telegram":
-                if not user.telegram_id:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail="User has no Telegram account linked"
-                    )
-                await client.post(
-                    f"{settings.NOTIFICATION_SERVICE_URL}/api/v1/send-telegram",
-                    json={"chat_id": str(user.telegram_id), "message": request.message}
-                )
-            elif request.method == "email":
-                await client.post(
-                    f"{settings.NOTIFICATION_SERVICE_URL}/api/v1/send-email",
-                    json={
-                        "to_email": user.email,
-                        "subject": request.subject or "Notification from Admin",
-                        "body": request.message
-                    }
-                )
-    except Exception as e:
+    if request.method == OTPMethod.TELEGRAM and not user.telegram_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="User has no Telegram account linked"
+        )
+    if request.method == OTPMethod.DISABLED:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Notification method is disabled"
+        )
+    
+    # Sent over the shared pooled client
+    results = await notification_client.deliver(OutgoingMessage(
+        email=user.email if request.method == OTPMethod.EMAIL else None,
+        telegram_id=user.telegram_id if request.method == OTPMethod.TELEGRAM else None,
+        subject=request.subject or "Notification from Admin",
+        body=request.message
+    ))
+    if not any(results.values()):
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to send notification: {str(e)}"
+            detail="Failed to send notification"
         )
     
     return MessageResponse(message="Notification sent successfully")
 
 
+# Bulk actions that set a flag: action -> (column, value)
+BULK_FLAG_UPDATES = {
+    BulkAction.BAN: ("is_banned", True),
+    BulkAction.UNBAN: ("is_banned", False),
+    BulkAction.ACTIVATE: ("is_active", True),
+    BulkAction.DEACTIVATE: ("is_active", False),
+}
+
+# Actions that lock users out: never applied to the calling admin, and
+# they evict the users' cached tokens
+BULK_LOCK_OUT = {BulkAction.BAN, BulkAction.DEACTIVATE, BulkAction.DELETE}
+
+
+@router.post("/users/bulk", response_model=BulkUserResponse)
+async def bulk_user_action(
+    request: BulkUserRequest,
+    current_admin: Principal = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Ban, unban, activate, deactivate, delete or notify many users at once
+    
+    Users are selected by `user_ids` or by `filter`. Changes run as
+    set-based UPDATE/DELETE statements in a single transaction;
+    notifications are queued for background delivery.
+    """
+    if (request.user_ids is None) == (request.filter is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide either user_ids or filter"
+        )
+    if request.action == BulkAction.NOTIFY and (request.method is None or not request.message):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Notify requires method and message"
+        )
+    
+    # Resolve targets with a single query
+    query = db.query(User)
+    if request.user_ids is not None:
+        requested = list(dict.fromkeys(request.user_ids))
+        query = query.filter(User.id.in_(requested))
+    else:
+        criteria = request.filter
+        if criteria.role:
+            query = query.filter(User.role == criteria.role)
+        if criteria.is_active is not None:
+            query = query.filter(User.is_active == criteria.is_active)
+        if criteria.is_banned is not None:
+            query = query.filter(User.is_banned == criteria.is_banned)
+        if criteria.search:
+            query = search_users(query, db, criteria.search)
+        requested = None
+    
+    # Explicit id lists are capped by the request schema; filters are capped here
+    rows = query.with_entities(
+        User.id, User.is_active, User.is_banned, User.email, User.telegram_id
+    ).limit(settings.BULK_MAX_USERS + 1).all()
+    if len(rows) > settings.BULK_MAX_USERS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A bulk operation may affect at most {settings.BULK_MAX_USERS} users"
+        )
+    found = {row.id: row for row in rows}
+    
+    results = {}
+    if requested is not None:
+        for user_id in requested:
+            if user_id not in found:
+                results[user_id] = BulkUserResult(user_id=user_id, status="not_found")
+    
+    targets = []
+    for row in rows:
+        if row.id == current_admin.id and request.action in BULK_LOCK_OUT:
+            results[row.id] = BulkUserResult(user_id=row.id, status="skipped", detail="Cannot apply to yourself")
+        elif request.action in BULK_FLAG_UPDATES:
+            column, value = BULK_FLAG_UPDATES[request.action]
+            if getattr(row, column) == value:
+                results[row.id] = BulkUserResult(user_id=row.id, status="unchanged")
+            else:
+                targets.append(row)
+        elif request.action == BulkAction.NOTIFY and request.method == OTPMethod.TELEGRAM and not row.telegram_id:
+            results[row.id] = BulkUserResult(user_id=row.id, status="skipped", detail="No Telegram account linked")
+        elif request.action == BulkAction.NOTIFY and request.method == OTPMethod.DISABLED:
+            results[row.id] = BulkUserResult(user_id=row.id, status="skipped", detail="Notification method is disabled")
+        else:
+            targets.append(row)
+    target_ids = [row.id for row in targets]
+    
+    if request.action == BulkAction.NOTIFY:
+        messages = [
+            OutgoingMessage(
+                email=row.email if request.method == OTPMethod.EMAIL else None,
+                telegram_id=row.telegram_id if request.method == OTPMethod.TELEGRAM else None,
+                subject=request.subject or "Notification from Admin",
+                body=request.message
+            )
+            for row in targets
+        ]
+        queued = admin_outbox.enqueue_many(messages)
+        for index, user_id in enumerate(target_ids):
+            if index < queued:
+                results[user_id] = BulkUserResult(user_id=user_id, status="queued")
+            else:
+                results[user_id] = BulkUserResult(user_id=user_id, status="failed", detail="Notification queue is full")
+        affected = queued
+    else:
+        if target_ids:
+            if request.action == BulkAction.DELETE:
+                # Bulk deletes skip ORM cascades, so remove dependent rows first
+                db.query(UserSession).filter(UserSession.user_id.in_(target_ids)).delete(synchronize_session=False)
+                db.query(OTPCode).filter(OTPCode.user_id.in_(target_ids)).delete(synchronize_session=False)
+                db.execute(group_members_table.delete().where(group_members_table.c.user_id.in_(target_ids)))
+                db.query(User).filter(User.id.in_(target_ids)).delete(synchronize_session=False)
+            else:
+                column, value = BULK_FLAG_UPDATES[request.action]
+                db.query(User).filter(User.id.in_(target_ids)).update(
+                    {column: value, "updated_at": datetime.utcnow()}, synchronize_session=False
+                )
+                if request.action == BulkAction.BAN:
+                    db.query(UserSession).filter(UserSession.user_id.in_(target_ids)).delete(synchronize_session=False)
+            db.commit()
+        
+        status_label = "deleted" if request.action == BulkAction.DELETE else "updated"
+        for user_id in target_ids:
+            results[user_id] = BulkUserResult(user_id=user_id, status=status_label)
+            principal_cache.invalidate(user_id)
+            if request.action in BULK_LOCK_OUT:
+                evict_cached_user_tokens(user_id)
+        if target_ids:
+            count_cache.clear()
+        affected = len(target_ids)
+    
+    order = requested if requested is not None else [row.id for row in rows]
+    return BulkUserResponse(
+        action=request.action,
+        matched=len(rows),
+        affected=affected,
+        results=[results[user_id] for user_id in order]
+    )
+
+
 # ============================================================================
 # SYSTEM CONFIGURATION
 # ============================================================================
 
 @router.get("/config/otp", response_model=SystemConfigResponse)
 async def get_otp_config(
-    current_admin: User = Depends(get_current_admin_user),
+    current_admin: Principal = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
     """
     Get OTP configuration
     """
-    otp_method_config = db.query(SystemConfig).filter(SystemConfig.key == "otp_method").first()
-    otp_expiry_config = db.query(SystemConfig).filter(SystemConfig.key == "otp_expiry_minutes").first()
+    current = system_config.get(db)
     
     return SystemConfigResponse(
-        otp_method=otp_method_config.value if otp_method_config else "disabled",
-        otp_expiry_minutes=int(otp_expiry_config.value) if otp_expiry_config else 5
+        otp_method=current.otp_method or "disabled",
+        otp_expiry_minutes=current.otp_expiry_minutes or 5
     )
 
 
 @router.put("/config/otp", response_model=MessageResponse)
 async def update_otp_config(
     config: SystemConfigUpdate,
-    current_admin: User = Depends(get_current_admin_user),
+    current_admin: Principal = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -345,27 +512,19 @@ async def update_otp_config(
         ))
     
     db.commit()
+    system_config.load(db)
     
     return MessageResponse(message="OTP configuration updated successfully")
 
 
 @router.get("/stats", response_model=dict)
 async def get_system_stats(
-    current_admin: User = Depends(get_current_admin_user),
+    current_admin: Principal = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
     """
-    Get system statistics
+    Get system statistics (read from the maintained counters)
     """
-    total_users = db.query(func.count(User.id)).scalar()
-    active_users = db.query(func.count(User.id)).filter(User.is_active == True).scalar()
-    banned_users = db.query(func.count(User.id)).filter(User.is_banned == True).scalar()
-    admin_users = db.query(func.count(User.id)).filter(User.role == "admin").scalar()
-    
-    return {
-        "total_users": total_users,
-        "active_users": active_users,
-        "banned_users": banned_users,
-        "admin_users": admin_users,
-        "inactive_users": total_users - active_users
-    }
+    stats = read_stats(db, datetime.utcnow().date())
+    stats["inactive_users"] = stats["total_users"] - stats["active_users"]
+    return stats
@@ -8,21 +8,25 @@ from sqlalchemy.orm import Session
 from sqlalchemy import or_
 from datetime import datetime, timedelta
 from typing import Optional
-import httpx
 
 from app.db.session import get_db
-from app.db.models.user import User, OTPCode, UserSession, SystemConfig, UserRole
+from app.db.models.user import User, OTPCode, UserSession, UserRole
 from app.schemas.user import (
     SignupRequest, LoginRequest, TokenResponse, VerifyOTPRequest,
     RequestPasswordResetRequest, ResetPasswordRequest, ChangePasswordRequest,
     DeleteAccountRequest, User as UserSchema, MessageResponse
 )
 from app.core.security import (
-    verify_password, get_password_hash, create_access_token,
-    create_refresh_token, verify_token, generate_otp_code
+    verify_password_async, get_password_hash_async, create_access_token,
+    create_refresh_token, verify_token, generate_otp_code,
+    evict_cached_token, evict_cached_user_tokens
 )
 from app.core.config import settings
-from app.api.v1.dependencies import get_current_user
+from app.core.notifications import OutgoingMessage, notification_client, otp_outbox
+from app.core.pagination import count_cache
+from app.core.principals import Principal, principal_cache
+from app.core.system_config import system_config
+from app.api.v1.dependencies import get_current_principal, get_current_user
 
 router = APIRouter()
 
@@ -39,11 +43,11 @@ async def send_otp_notification(
 ) -> dict:
     """
     Send OTP via BOTH Email AND Telegram (dual-channel delivery)
-    Returns: dict with success status for each channel
+    Returns: dict with success status for each channel ("queued" when
+    handed to the outbox instead)
     """
     # Get OTP method from system config
-    config = db.query(SystemConfig).filter(SystemConfig.key == "otp_method").first()
-    otp_method = config.value if config else "email"  # Default to email
+    otp_method = system_config.get(db).otp_method or "email"  # Default to email
     
     if otp_method == "disabled":
         # OTP is disabled, auto-activate for dev
@@ -60,40 +64,23 @@ async def send_otp_notification(
         message = f"Your verification code is: {otp_code}\n\nValid for {settings.OTP_EXPIRY_MINUTES} minutes."
         subject = "Verification Code"
     
-    results = {"email": False, "telegram": False}
+    outgoing = OutgoingMessage(
+        email=user.email,
+        telegram_id=user.telegram_id,
+        subject=subject,
+        body=message
+    )
+    
+    # Fire-and-forget: the outbox delivers in the background
+    if settings.OTP_DELIVERY_MODE == "outbox" and otp_outbox.enqueue(outgoing):
+        return {"email": False, "telegram": False, "queued": True}
     
+    # Email and Telegram are sent concurrently; success if at least one channel worked
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            # Always try to send via Email
-            try:
-                email_response = await client.post(
-                    f"{settings.NOTIFICATION_SERVICE_URL}/api/v1/send-email",
-                    json={"to_email": user.email, "subject": subject, "body": message}
-                )
-                results["email"] = email_response.status_code == 200
-                if results["email"]:
-                    print(f"✅ OTP sent via Email to {user.email}")
-            except Exception as e:
-                print(f"❌ Failed to send OTP via Email: {e}")
-            
-            # Also try to send via Telegram if telegram_id is available
-            if user.telegram_id:
-                try:
-                    telegram_response = await client.post(
-                        f"{settings.NOTIFICATION_SERVICE_URL}/api/v1/send-telegram",
-                        json={"chat_id": str(user.telegram_id), "message": message}
-                    )
-                    results["telegram"] = telegram_response.status_code == 200
-                    if results["telegram"]:
-                        print(f"✅ OTP sent via Telegram to {user.telegram_id}")
-                except Exception as e:
-                    print(f"❌ Failed to send OTP via Telegram: {e}")
-            
-            # Success if at least one channel worked
-            return results
+        return await notification_client.deliver(outgoing)
     except Exception as e:
         print(f"❌ Critical error sending OTP notification: {e}")
-        return results
+        return {"email": False, "telegram": False}
 
 
 def create_otp_code(user_id: int, purpose: str, db: Session) -> str:
@@ -176,6 +163,7 @@ def invalidate_user_sessions(user_id: int, db: Session, except_token: Optional[s
         query = query.filter(UserSession.refresh_token != except_token)
     query.delete()
     db.commit()
+    evict_cached_user_tokens(user_id)
 
 
 # ============================================================================
@@ -216,7 +204,7 @@ async def signup(
             )
     
     # Create user
-    hashed_password = get_password_hash(request.password)
+    hashed_password = await get_password_hash_async(request.password)
     user = User(
         username=request.username,
         name=request.name,
@@ -230,6 +218,7 @@ async def signup(
     db.add(user)
     db.commit()
     db.refresh(user)
+    count_cache.clear()
     
     # Generate and send OTP
     otp_code = create_otp_code(user.id, "signup", db)
@@ -244,6 +233,9 @@ async def signup(
     
     if channels_sent:
         message = f"Registration successful! Verification code sent to your {' and '.join(channels_sent)}."
+    elif delivery_status.get("queued"):
+        channels_sent.append("queued")
+        message = "Registration successful! A verification code is on its way to your email/Telegram."
     else:
         message = "Registration successful! Please check your email for verification code."
     
@@ -279,6 +271,8 @@ async def verify_otp(
     # Activate user
     user.is_active = True
     db.commit()
+    principal_cache.invalidate(user.id)
+    count_cache.clear()
     
     return MessageResponse(message="Account activated successfully! You can now login.")
 
@@ -309,7 +303,7 @@ async def login(
         )
     
     # Verify password
-    if not verify_password(request.password, user.hashed_password):
+    if not await verify_password_async(request.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username/email or password"
@@ -444,7 +438,7 @@ async def reset_password(
         )
     
     # Update password
-    user.hashed_password = get_password_hash(request.new_password)
+    user.hashed_password = await get_password_hash_async(request.new_password)
     db.commit()
     
     # Invalidate all sessions
@@ -456,21 +450,35 @@ async def reset_password(
 @router.post("/change-password", response_model=MessageResponse)
 async def change_password(
     request: ChangePasswordRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """
     Change password (authenticated user)
+    
+    The caller is authenticated from the principal cache; only the password
+    hash is read from the database.
     """
+    hashed_password = db.query(User.hashed_password).filter(User.id == current_user.id).scalar()
+    if hashed_password is None:
+        principal_cache.invalidate(current_user.id)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    
     # Verify old password
-    if not verify_password(request.old_password, current_user.hashed_password):
+    if not await verify_password_async(request.old_password, hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Incorrect current password"
         )
     
     # Update password
-    current_user.hashed_password = get_password_hash(request.new_password)
+    new_hash = await get_password_hash_async(request.new_password)
+    db.query(User).filter(User.id == current_user.id).update(
+        {User.hashed_password: new_hash}, synchronize_session=False
+    )
     db.commit()
     
     # Invalidate other sessions (keep current one)
@@ -490,7 +498,7 @@ async def delete_account(
     Delete user account permanently
     """
     # Verify password
-    if not verify_password(request.password, current_user.hashed_password):
+    if not await verify_password_async(request.password, current_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Incorrect password"
@@ -508,8 +516,12 @@ async def delete_account(
         pass  # Don't fail if notification fails
     
     # Delete user (cascade will delete sessions, OTPs, etc.)
+    user_id = current_user.id
     db.delete(current_user)
     db.commit()
+    principal_cache.invalidate(user_id)
+    count_cache.clear()
+    evict_cached_user_tokens(user_id)
     
     return MessageResponse(message="Account deleted successfully. We're sorry to see you go!")
 
@@ -517,14 +529,22 @@ async def delete_account(
 @router.post("/logout", response_model=MessageResponse)
 async def logout(
     refresh_token: str,
+    http_request: Request,
     db: Session = Depends(get_db)
 ):
     """
     Logout user - invalidate session
+    
+    The access token sent in the Authorization header, if any, is dropped
+    from the decoded-token cache too; it stays valid until it expires.
     """
     session = db.query(UserSession).filter(UserSession.refresh_token == refresh_token).first()
     if session:
         db.delete(session)
         db.commit()
+    evict_cached_token(refresh_token)
+    scheme, _, access_token = http_request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and access_token:
+        evict_cached_token(access_token.strip())
     
     return MessageResponse(message="Logged out successfully!")
@@ -1,12 +1,14 @@
 """
 User management endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func
-from typing import List
+from typing import List, Optional
 import math
 
+from app.core.pagination import count_cache, keyset_page
+from app.core.principals import principal_cache
 from app.db.session import get_db
 from app.db.models.user import User, Group
 from app.schemas.user import User as UserSchema, Group as GroupSchema, GroupCreate, MessageResponse
@@ -14,15 +16,27 @@ from app.schemas.user import User as UserSchema, Group as GroupSchema, GroupCrea
 router = APIRouter()
 
 
+def _page(query, column, response: Response, limit: int, cursor: Optional[str], skip: int) -> list:
+    """Keyset-paginate a legacy listing; the next page's cursor goes in X-Next-Cursor"""
+    try:
+        rows, next_cursor, _ = keyset_page(query, column, limit, cursor, skip)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
+
+
 @router.get("/users", response_model=List[UserSchema])
 def get_users(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Get list of users"""
-    users = db.query(User).offset(skip).limit(limit).all()
-    return users
+    """Get list of users (pass X-Next-Cursor back as `cursor` for the next page)"""
+    return _page(db.query(User), User.id, response, limit, cursor, skip)
 
 
 @router.get("/users/by-name/{username}", response_model=UserSchema)
@@ -63,6 +77,8 @@ def delete_user(user_id: int, db: Session = Depends(get_db)):
     
     db.delete(user)
     db.commit()
+    principal_cache.invalidate(user_id)
+    count_cache.clear()
     
     return {"message": f"User '{user.name}' has been deleted."}
 
@@ -80,13 +96,14 @@ def create_group(group: GroupCreate, db: Session = Depends(get_db)):
 
 @router.get("/groups", response_model=List[GroupSchema])
 def get_groups(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Get list of groups"""
-    groups = db.query(Group).offset(skip).limit(limit).all()
-    return groups
+    """Get list of groups (pass X-Next-Cursor back as `cursor` for the next page)"""
+    return _page(db.query(Group), Group.id, response, limit, cursor, skip)
 
 
 @router.get("/users/{user_id}/groups", response_model=List[GroupSchema])
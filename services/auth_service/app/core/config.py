@@ -24,6 +24,29 @@ class Settings:
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
     REFRESH_TOKEN_EXPIRE_DAYS: int = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+    # Shared with the API gateway; claims it verified are trusted only when set
+    GATEWAY_CLAIMS_SECRET: str = os.getenv("GATEWAY_CLAIMS_SECRET", "")
+    
+    # Decoded-token cache (entries live until the token's exp)
+    TOKEN_CACHE_SIZE: int = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+    
+    # Password hashing pool (bcrypt runs off the event loop)
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+    PASSWORD_HASH_MAX_QUEUE: int = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+    
+    # Authenticated-user cache (also bounds how long other workers see a stale role/ban)
+    PRINCIPAL_CACHE_TTL: int = int(os.getenv("PRINCIPAL_CACHE_TTL", "30"))
+    PRINCIPAL_CACHE_SIZE: int = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+    
+    # How often each worker checks system_config for changes made elsewhere (0 disables)
+    SYSTEM_CONFIG_POLL_INTERVAL: float = float(os.getenv("SYSTEM_CONFIG_POLL_INTERVAL", "5"))
+    
+    # Admin list totals are reused for this many seconds (0 recomputes every page)
+    COUNT_CACHE_TTL: int = int(os.getenv("COUNT_CACHE_TTL", "30"))
+    
+    # Pruning of expired sessions and used/expired OTP codes (interval 0 disables)
+    REAPER_INTERVAL: float = float(os.getenv("REAPER_INTERVAL", "3600"))
+    REAPER_BATCH_SIZE: int = int(os.getenv("REAPER_BATCH_SIZE", "500"))
     
     # OTP Settings
     OTP_EXPIRY_MINUTES: int = int(os.getenv("OTP_EXPIRY_MINUTES", "5"))
@@ -34,6 +57,15 @@ class Settings:
     
     # External Services
     NOTIFICATION_SERVICE_URL: str = os.getenv("NOTIFICATION_SERVICE_URL", "http://localhost:8002")
+    NOTIFICATION_TIMEOUT: float = float(os.getenv("NOTIFICATION_TIMEOUT", "10"))
+    NOTIFICATION_MAX_CONNECTIONS: int = int(os.getenv("NOTIFICATION_MAX_CONNECTIONS", "20"))
+    # "sync" waits for OTP delivery; "outbox" queues it and responds immediately
+    OTP_DELIVERY_MODE: str = os.getenv("OTP_DELIVERY_MODE", "sync").lower()
+    OTP_OUTBOX_MAX_QUEUED: int = int(os.getenv("OTP_OUTBOX_MAX_QUEUED", "1000"))
+    ADMIN_OUTBOX_MAX_QUEUED: int = int(os.getenv("ADMIN_OUTBOX_MAX_QUEUED", "5000"))
+    
+    # Most users one bulk admin operation may touch
+    BULK_MAX_USERS: int = int(os.getenv("BULK_MAX_USERS", "1000"))
 
 
 settings = Settings()
@@ -0,0 +1,198 @@
+"""
+Notification service client and outboxes
+
+One pooled httpx client per event loop is shared by all requests, and a
+message's email and Telegram deliveries run concurrently over it.
+
+With OTP_DELIVERY_MODE=outbox, OTP messages are queued in an in-process
+outbox instead and delivered by a background task, so signup and password
+reset respond without waiting on the notification service. Bulk admin
+notifications always go through a second outbox. Queued messages are not
+persisted; if the process stops first, the user can request a new code.
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import httpx
+
+from .config import settings
+
+
+@dataclass(frozen=True)
+class OutgoingMessage:
+    """A message for one user, sent by email and/or Telegram (whichever is set)"""
+    email: Optional[str]
+    telegram_id: Optional[int]
+    subject: str
+    body: str
+
+
+class NotificationClient:
+    """Long-lived client for the notification service"""
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Connections belong to the loop that opened them
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._discard()
+            self._client = httpx.AsyncClient(
+                base_url=settings.NOTIFICATION_SERVICE_URL,
+                timeout=settings.NOTIFICATION_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=settings.NOTIFICATION_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.NOTIFICATION_MAX_CONNECTIONS,
+                ),
+            )
+            self._loop = loop
+        return self._client
+
+    def _discard(self) -> None:
+        """
+        Close the client of a previous event loop on that loop
+
+        A loop that no longer runs cannot close anything; its connections
+        are released when the client is collected.
+        """
+        old_client, old_loop = self._client, self._loop
+        self._client = None
+        self._loop = None
+        if old_client is not None and old_loop.is_running() and not old_loop.is_closed():
+            asyncio.run_coroutine_threadsafe(old_client.aclose(), old_loop)
+
+    async def send_email(self, to_email: str, subject: str, body: str) -> bool:
+        try:
+            response = await self.client.post(
+                "/api/v1/send-email",
+                json={"to_email": to_email, "subject": subject, "body": body}
+            )
+        except Exception as e:
+            print(f"❌ Failed to send via Email: {e}")
+            return False
+        if response.status_code == 200:
+            print(f"✅ Sent via Email to {to_email}")
+            return True
+        return False
+
+    async def send_telegram(self, chat_id: int, message: str) -> bool:
+        try:
+            response = await self.client.post(
+                "/api/v1/send-telegram",
+                json={"chat_id": str(chat_id), "message": message}
+            )
+        except Exception as e:
+            print(f"❌ Failed to send via Telegram: {e}")
+            return False
+        if response.status_code == 200:
+            print(f"✅ Sent via Telegram to {chat_id}")
+            return True
+        return False
+
+    async def deliver(self, message: OutgoingMessage) -> Dict[str, bool]:
+        """
+        Send a message over its channels at once
+
+        Returns:
+            dict with success status for each channel
+        """
+        channels = {}
+        if message.email:
+            channels["email"] = self.send_email(message.email, message.subject, message.body)
+        if message.telegram_id:
+            channels["telegram"] = self.send_telegram(message.telegram_id, message.body)
+        results = dict(zip(channels, await asyncio.gather(*channels.values())))
+        return {"email": results.get("email", False), "telegram": results.get("telegram", False)}
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._loop = None
+
+
+class Outbox:
+    """Bounded queue of messages delivered in the background"""
+
+    def __init__(self, client: NotificationClient, max_queued: int):
+        self.notifier = client
+        self.max_queued = max_queued
+        self._queue: Optional["asyncio.Queue[OutgoingMessage]"] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.queued = 0
+        self.delivered = 0
+        self.failed = 0
+
+    def enqueue(self, message: OutgoingMessage) -> bool:
+        """
+        Queue a message, starting the delivery task if needed
+
+        Returns:
+            False if the outbox is full (the caller should send it directly)
+        """
+        return self.enqueue_many([message]) == 1
+
+    def enqueue_many(self, messages: List[OutgoingMessage]) -> int:
+        """
+        Queue messages in order until the outbox is full
+
+        Returns:
+            How many were queued (the first n of messages)
+        """
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._worker.get_loop() is not loop:
+            self._queue = asyncio.Queue(maxsize=self.max_queued)
+            self._worker = loop.create_task(self._run(self._queue))
+        accepted = 0
+        for message in messages:
+            try:
+                self._queue.put_nowait(message)
+            except asyncio.QueueFull:
+                break
+            accepted += 1
+        self.queued += accepted
+        return accepted
+
+    async def _run(self, queue: "asyncio.Queue[OutgoingMessage]") -> None:
+        while True:
+            message = await queue.get()
+            try:
+                results = await self.notifier.deliver(message)
+            except Exception as e:
+                print(f"❌ Critical error sending notification: {e}")
+                results = {}
+            if any(results.values()):
+                self.delivered += 1
+            else:
+                self.failed += 1
+            queue.task_done()
+
+    async def close(self, timeout: float = 5.0) -> None:
+        """Give queued messages a moment to go out, then stop"""
+        if self._worker is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        worker, self._worker = self._worker, None
+        worker.cancel()
+        await asyncio.gather(worker, return_exceptions=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "queued": self.queued,
+            "delivered": self.delivered,
+            "failed": self.failed,
+        }
+
+
+notification_client = NotificationClient()
+otp_outbox = Outbox(notification_client, settings.OTP_OUTBOX_MAX_QUEUED)
+# Admin notifications get their own queue so bulk sends cannot crowd out OTPs
+admin_outbox = Outbox(notification_client, settings.ADMIN_OUTBOX_MAX_QUEUED)
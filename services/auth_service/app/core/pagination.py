@@ -0,0 +1,116 @@
+"""
+Keyset (cursor) pagination and cached list totals
+
+Pages are read with `WHERE id > :last ORDER BY id LIMIT n` instead of
+OFFSET, so deep pages cost the same as the first one. Cursors are opaque
+base64url tokens naming the boundary id and the direction to read in.
+"""
+import base64
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Optional, Tuple
+
+from .config import settings
+
+NEXT = "next"
+PREV = "prev"
+
+
+def encode_cursor(key: int, direction: str = NEXT) -> str:
+    payload = json.dumps({"k": key, "d": direction}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, str]:
+    """
+    Decode a cursor into its boundary id and direction
+
+    Raises:
+        ValueError: If the cursor was not produced by encode_cursor
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        key, direction = payload["k"], payload["d"]
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(key, int) or direction not in (NEXT, PREV):
+        raise ValueError("Invalid cursor")
+    return key, direction
+
+
+def keyset_page(query, column, limit: int, cursor: Optional[str] = None, skip: int = 0) -> Tuple[List[Any], Optional[str], Optional[str]]:
+    """
+    Read one page of a query ordered by a unique integer column
+
+    Without a cursor the page starts at `skip` (kept for existing callers);
+    with one, it continues after or before the cursor's boundary.
+
+    Returns:
+        The rows, the cursor of the next page and the cursor of the
+        previous page (None where there is no such page)
+
+    Raises:
+        ValueError: If the cursor is invalid
+    """
+    if cursor:
+        key, direction = decode_cursor(cursor)
+    else:
+        key, direction = None, NEXT
+
+    if direction == PREV:
+        rows = query.filter(column < key).order_by(column.desc()).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = list(reversed(rows[:limit]))
+        has_next, has_prev = True, has_more
+    else:
+        if key is not None:
+            query = query.filter(column > key)
+        query = query.order_by(column)
+        if key is None and skip:
+            query = query.offset(skip)
+        rows = query.limit(limit + 1).all()
+        has_next = len(rows) > limit
+        rows = rows[:limit]
+        has_prev = key is not None or skip > 0
+
+    if not rows:
+        return rows, None, None
+    key_name = column.key
+    next_cursor = encode_cursor(getattr(rows[-1], key_name), NEXT) if has_next else None
+    prev_cursor = encode_cursor(getattr(rows[0], key_name), PREV) if has_prev else None
+    return rows, next_cursor, prev_cursor
+
+
+class CountCache:
+    """Totals of filtered list queries, reused for COUNT_CACHE_TTL seconds"""
+
+    def __init__(self, ttl: float, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[int, float]]" = OrderedDict()
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], int]) -> int:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                return entry[0]
+        total = compute()
+        if self.ttl > 0:
+            with self._lock:
+                self._entries[key] = (total, now + self.ttl)
+                self._entries.move_to_end(key)
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return total
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+count_cache = CountCache(settings.COUNT_CACHE_TTL)
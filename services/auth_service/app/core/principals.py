@@ -0,0 +1,93 @@
+"""
+Authenticated-user (principal) cache
+
+Authenticated requests only need a user's id, role and account status, so
+those are cached per user id for PRINCIPAL_CACHE_TTL seconds instead of
+loading the user row on every request. Routes that change a user's role or
+status invalidate its entry; other workers pick the change up within the TTL.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from .config import settings
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The parts of a user that authorization needs"""
+    id: int
+    username: str
+    role: str
+    is_active: bool
+    is_banned: bool
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        role = user.role.value if hasattr(user.role, "value") else str(user.role)
+        return cls(
+            id=user.id,
+            username=user.username,
+            role=role,
+            is_active=bool(user.is_active),
+            is_banned=bool(user.is_banned)
+        )
+
+
+class PrincipalCache:
+    """TTL + LRU cache of principals keyed by user id"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # Sync routes run in a thread pool, so access is locked
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, Tuple[Principal, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id: int) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                if entry[1] > time.monotonic():
+                    self._entries.move_to_end(user_id)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+
+    def put(self, principal: Principal) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[principal.id] = (principal, time.monotonic() + self.ttl)
+            self._entries.move_to_end(principal.id)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        """Forget a user after its role, status or existence changed"""
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations
+            }
+
+
+principal_cache = PrincipalCache(settings.PRINCIPAL_CACHE_SIZE, settings.PRINCIPAL_CACHE_TTL)
@@ -0,0 +1,91 @@
+"""
+Background pruning of expired sessions and spent OTP codes
+
+user_sessions and otp_codes only ever grow otherwise. Every REAPER_INTERVAL
+seconds expired sessions and expired or used OTP codes are deleted in
+batches of REAPER_BATCH_SIZE rows, each batch its own short transaction so
+the tables are never locked for long.
+"""
+import asyncio
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.db.models.user import OTPCode, UserSession
+from .config import settings
+
+
+class ExpiredRowReaper:
+    """Deletes expired rows in bounded batches and keeps counts of them"""
+
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+        self.runs = 0
+        self.removed: Dict[str, int] = {"user_sessions": 0, "otp_codes": 0}
+        self.last_removed: Dict[str, int] = {}
+        self.last_run_at: Optional[datetime] = None
+
+    def _delete_batches(self, db: Session, model, condition) -> int:
+        removed = 0
+        while True:
+            ids = [row.id for row in db.query(model.id).filter(condition).limit(self.batch_size).all()]
+            if not ids:
+                break
+            db.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
+            db.commit()
+            removed += len(ids)
+            if len(ids) < self.batch_size:
+                break
+        return removed
+
+    def reap(self, db: Session) -> Dict[str, int]:
+        """
+        Delete everything that has expired so far
+
+        Returns:
+            Rows removed per table
+        """
+        now = datetime.utcnow()
+        removed = {
+            "user_sessions": self._delete_batches(db, UserSession, UserSession.expires_at < now),
+            "otp_codes": self._delete_batches(
+                db, OTPCode, or_(OTPCode.expires_at < now, OTPCode.is_used == True)
+            ),
+        }
+        self.runs += 1
+        self.last_run_at = now
+        self.last_removed = removed
+        for table, count in removed.items():
+            self.removed[table] += count
+        if any(removed.values()):
+            print(f"🧹 Pruned {removed['user_sessions']} expired sessions and {removed['otp_codes']} OTP codes")
+        return removed
+
+    async def run(self, session_factory: Callable[[], Session], interval: float) -> None:
+        """Reap every `interval` seconds until cancelled"""
+        def reap() -> None:
+            db = session_factory()
+            try:
+                self.reap(db)
+            finally:
+                db.close()
+
+        while True:
+            try:
+                await asyncio.to_thread(reap)
+            except Exception as e:
+                print(f"❌ Failed to prune expired rows: {e}")
+            await asyncio.sleep(interval)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "runs": self.runs,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "last_removed": self.last_removed,
+            "removed": self.removed,
+        }
+
+
+reaper = ExpiredRowReaper(settings.REAPER_BATCH_SIZE)
@@ -1,12 +1,21 @@
 """
 Security utilities - Password hashing, JWT tokens, OTP generation
 """
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Set
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
 import secrets
 import string
+import threading
+import time
 from .config import settings
 
 # Password hashing context using bcrypt
@@ -27,6 +36,90 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+class PasswordHashingBusy(Exception):
+    """Too many password hashes are queued; the caller should retry shortly"""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a bounded thread pool so it never blocks the event loop
+    
+    bcrypt releases the GIL while hashing, so worker threads hash in
+    parallel. At most `workers` hashes run at once and `max_queue` more may
+    wait; beyond that calls fail fast with PasswordHashingBusy instead of
+    queueing behind work that would time out anyway.
+    """
+    
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_pending = workers + max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self.pending = 0  # Running plus queued
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0  # Total time spent queued
+    
+    async def run(self, func, *args):
+        """
+        Run a hashing function in the pool
+        
+        Raises:
+            PasswordHashingBusy: If the queue is full
+        """
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordHashingBusy("Password hashing is busy, please retry")
+            self.pending += 1
+        
+        queued_at = time.perf_counter()
+        
+        def task():
+            with self._lock:
+                self.active += 1
+                self.wait_seconds += time.perf_counter() - queued_at
+            try:
+                return func(*args)
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self.completed += 1
+        
+        # Released here, not in the worker: a call cancelled while still
+        # queued (e.g. the client went away) never reaches the worker
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, task)
+        finally:
+            with self._lock:
+                self.pending -= 1
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "active": self.active,
+                "queued": max(0, self.pending - self.active),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self.wait_seconds / self.completed * 1000, 2) if self.completed else 0.0,
+            }
+
+
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_QUEUE)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password on the hashing pool, for async routes."""
+    return await password_hasher.run(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash on the hashing pool, for async routes."""
+    return await password_hasher.run(get_password_hash, password)
+
+
 # ============================================================================
 # JWT TOKEN FUNCTIONS
 # ============================================================================
@@ -82,6 +175,92 @@ def create_refresh_token(data: Dict[str, Any]) -> str:
     return encoded_jwt
 
 
+class TokenCache:
+    """
+    Decoded tokens keyed by token digest, each kept until its own exp
+    
+    Saves the signature check when the same token is presented again.
+    Entries are indexed by subject so a user's tokens can be evicted at once.
+    Eviction only drops the cached decode: an evicted token that is still
+    signed and unexpired verifies again, so this is not token revocation.
+    """
+    
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._by_subject: Dict[str, Set[str]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+    
+    def get(self, digest: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            payload = self._entries.get(digest)
+            if payload is not None:
+                if payload["exp"] > time.time():
+                    self._entries.move_to_end(digest)
+                    self.hits += 1
+                    return payload
+                self._remove(digest)
+            self.misses += 1
+            return None
+    
+    def put(self, digest: str, payload: Dict[str, Any]) -> None:
+        if self.max_entries <= 0 or not isinstance(payload.get("exp"), (int, float)):
+            return
+        with self._lock:
+            self._entries[digest] = payload
+            self._by_subject.setdefault(str(payload.get("sub")), set()).add(digest)
+            if len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+    
+    def evict(self, digest: str) -> None:
+        with self._lock:
+            if digest in self._entries:
+                self._remove(digest)
+                self.evicted += 1
+    
+    def evict_subject(self, subject: str) -> None:
+        with self._lock:
+            for digest in self._by_subject.get(subject, set()).copy():
+                self._remove(digest)
+                self.evicted += 1
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_subject.clear()
+    
+    def _remove(self, digest: str) -> None:
+        payload = self._entries.pop(digest)
+        subject = str(payload.get("sub"))
+        digests = self._by_subject.get(subject)
+        if digests is not None:
+            digests.discard(digest)
+            if not digests:
+                del self._by_subject[subject]
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evicted": self.evicted,
+            }
+
+
+token_cache = TokenCache(settings.TOKEN_CACHE_SIZE)
+
+
+def token_digest(token: str) -> str:
+    """Digest identifying a token without keeping the token itself"""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
 def decode_token(token: str) -> Optional[Dict[str, Any]]:
     """
     Decode and verify JWT token
@@ -92,11 +271,33 @@ def decode_token(token: str) -> Optional[Dict[str, Any]]:
     Returns:
         Decoded payload or None if invalid
     """
+    digest = token_digest(token)
+    payload = token_cache.get(digest)
+    if payload is not None:
+        return dict(payload)
+    
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        return payload
     except JWTError:
         return None
+    token_cache.put(digest, payload)
+    return dict(payload)
+
+
+def evict_cached_token(token: str) -> None:
+    """
+    Drop a token from the decoded-token cache (e.g. on logout)
+    
+    This does not revoke the token: until it expires it still verifies
+    (and is cached again) when presented. Sessions end by deleting their
+    UserSession row, which refresh checks.
+    """
+    token_cache.evict(token_digest(token))
+
+
+def evict_cached_user_tokens(user_id: Any) -> None:
+    """Drop all of a user's tokens from the decoded-token cache (no revocation, see evict_cached_token)"""
+    token_cache.evict_subject(str(user_id))
 
 
 def verify_token(token: str, token_type: str = "access") -> Optional[Dict[str, Any]]:
@@ -127,6 +328,52 @@ def verify_token(token: str, token_type: str = "access") -> Optional[Dict[str, A
     return payload
 
 
+# Header in which the API gateway forwards the claims it already verified
+GATEWAY_CLAIMS_HEADER = "X-Gateway-Claims"
+
+
+def verify_gateway_claims(header_value: str, token: str) -> Optional[Dict[str, Any]]:
+    """
+    Verify claims forwarded by the API gateway instead of decoding the JWT
+    
+    The header is base64url(JSON claims) "." base64url(HMAC-SHA256) signed
+    with GATEWAY_CLAIMS_SECRET, and names the digest of the token it was
+    issued for.
+    
+    Args:
+        header_value: X-Gateway-Claims header value
+        token: Bearer token sent with the request
+        
+    Returns:
+        Claims payload or None if the header cannot be trusted
+    """
+    if not settings.GATEWAY_CLAIMS_SECRET:
+        return None
+    
+    encoded, _, signature = header_value.partition(".")
+    expected = hmac.new(
+        settings.GATEWAY_CLAIMS_SECRET.encode("utf-8"), encoded.encode("ascii", "replace"), hashlib.sha256
+    ).digest()
+    try:
+        signature_bytes = base64.urlsafe_b64decode(signature + "=" * (-len(signature) % 4))
+        if not hmac.compare_digest(signature_bytes, expected):
+            return None
+        payload = json.loads(base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)))
+    except (ValueError, TypeError):
+        return None
+    
+    # Bound to the token sent alongside it
+    if payload.get("tkn") != token_digest(token):
+        return None
+    if payload.get("type") != "access":
+        return None
+    exp = payload.get("exp")
+    if not isinstance(exp, (int, float)) or exp < time.time():
+        return None
+    
+    return payload
+
+
 # ============================================================================
 # OTP FUNCTIONS
 # ============================================================================
@@ -0,0 +1,110 @@
+"""
+In-memory SystemConfig store
+
+The system_config table is read once into a typed snapshot and served from
+memory afterwards. Writers reload it after committing; other workers notice
+the change by polling the table's version (row count and latest updated_at)
+every SYSTEM_CONFIG_POLL_INTERVAL seconds in the background, so reading
+configuration never waits on the database.
+"""
+import asyncio
+import threading
+from dataclasses import dataclass
+from typing import Callable, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.db.models.user import SystemConfig
+
+Version = Tuple[int, object]
+
+
+@dataclass(frozen=True)
+class SystemSettings:
+    """Typed view of the system_config rows (None where a key is not set)"""
+    otp_method: Optional[str] = None
+    otp_expiry_minutes: Optional[int] = None
+
+    @classmethod
+    def from_rows(cls, rows) -> "SystemSettings":
+        values = {row.key: row.value for row in rows}
+        expiry = values.get("otp_expiry_minutes")
+        try:
+            expiry = int(expiry) if expiry is not None else None
+        except ValueError:
+            expiry = None
+        return cls(otp_method=values.get("otp_method"), otp_expiry_minutes=expiry)
+
+
+def _version(rows) -> Version:
+    return len(rows), max((row.updated_at for row in rows if row.updated_at), default=None)
+
+
+class SystemConfigStore:
+    """Current SystemSettings snapshot plus the table version it was read at"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot: Optional[SystemSettings] = None
+        self._version: Optional[Version] = None
+        self.loads = 0
+
+    def get(self, db: Session) -> SystemSettings:
+        """
+        Current settings
+
+        Only the first call (or the first after invalidate) reads the
+        database, using the given session.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self.load(db)
+        return snapshot
+
+    def load(self, db: Session) -> SystemSettings:
+        """Read all rows and replace the snapshot"""
+        rows = db.query(SystemConfig).all()
+        snapshot = SystemSettings.from_rows(rows)
+        with self._lock:
+            self._snapshot = snapshot
+            self._version = _version(rows)
+            self.loads += 1
+        return snapshot
+
+    def refresh_if_changed(self, db: Session) -> bool:
+        """
+        Reload if another worker changed the table
+
+        Returns:
+            True if the snapshot was reloaded
+        """
+        count, updated_at = db.query(func.count(SystemConfig.id), func.max(SystemConfig.updated_at)).one()
+        if self._snapshot is not None and (count, updated_at) == self._version:
+            return False
+        self.load(db)
+        return True
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._snapshot = None
+            self._version = None
+
+    async def watch(self, session_factory: Callable[[], Session], interval: float) -> None:
+        """Poll for changes made by other workers until cancelled"""
+        def refresh() -> None:
+            db = session_factory()
+            try:
+                self.refresh_if_changed(db)
+            finally:
+                db.close()
+
+        while True:
+            try:
+                await asyncio.to_thread(refresh)
+            except Exception as e:
+                print(f"❌ Failed to refresh system config: {e}")
+            await asyncio.sleep(interval)
+
+
+system_config = SystemConfigStore()
@@ -0,0 +1,166 @@
+"""
+Materialized user counters for /admin/stats
+
+stat_counters holds running totals (total, active, banned and admin users)
+plus per-day signups and logins ('signups:YYYY-MM-DD', 'logins:YYYY-MM-DD').
+Triggers on users update them in the same transaction as the change itself,
+so every write path - ORM, bulk UPDATE/DELETE or raw SQL - keeps them
+exact, and reading the stats is a primary-key lookup.
+
+The triggers are installed from the metadata's after_create event, which
+create_all fires on new and existing databases alike; the first install
+backfills the totals with one conditional-aggregation pass over users.
+"""
+from datetime import date
+from typing import Dict
+
+from sqlalchemy import case, delete, event, func, insert, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.db.models.user import Base, StatCounter, User, UserRole
+
+TOTAL_KEYS = ("total_users", "active_users", "banned_users", "admin_users")
+
+_SQLITE_UPSERT = (
+    "INSERT INTO stat_counters(key, value) VALUES ({key}, {delta}) "
+    "ON CONFLICT(key) DO UPDATE SET value = value + excluded.value;"
+)
+
+
+def _flags(row: str) -> Dict[str, str]:
+    """Each total's 0/1 contribution of a users row"""
+    return {
+        "'total_users'": "1",
+        "'active_users'": f"{row}.is_active",
+        "'banned_users'": f"{row}.is_banned",
+        "'admin_users'": f"({row}.role = 'ADMIN')",
+    }
+
+
+def _sqlite_bumps(deltas: Dict[str, str]) -> str:
+    return "\n        ".join(_SQLITE_UPSERT.format(key=key, delta=delta) for key, delta in deltas.items())
+
+
+_SQLITE_DDL = (
+    f"""CREATE TRIGGER IF NOT EXISTS stat_counters_users_insert AFTER INSERT ON users BEGIN
+        {_sqlite_bumps(_flags('new'))}
+        {_SQLITE_UPSERT.format(key="'signups:' || date(new.created_at)", delta='1')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stat_counters_users_delete AFTER DELETE ON users BEGIN
+        {_sqlite_bumps({key: f"-{old}" for key, old in _flags('old').items()})}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stat_counters_users_update AFTER UPDATE OF is_active, is_banned, role ON users BEGIN
+        {_sqlite_bumps({key: f"{new} - {_flags('old')[key]}" for key, new in _flags('new').items() if key != "'total_users'"})}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stat_counters_users_login AFTER UPDATE OF last_login ON users
+    WHEN new.last_login IS NOT NULL AND new.last_login IS NOT old.last_login BEGIN
+        {_SQLITE_UPSERT.format(key="'logins:' || date(new.last_login)", delta='1')}
+    END""",
+)
+
+_POSTGRES_DDL = (
+    """CREATE OR REPLACE FUNCTION stat_counters_bump(counter TEXT, delta INTEGER) RETURNS VOID AS $$
+    BEGIN
+        IF delta <> 0 THEN
+            INSERT INTO stat_counters(key, value) VALUES (counter, delta)
+            ON CONFLICT (key) DO UPDATE SET value = stat_counters.value + EXCLUDED.value;
+        END IF;
+    END $$ LANGUAGE plpgsql""",
+    """CREATE OR REPLACE FUNCTION stat_counters_users() RETURNS TRIGGER AS $$
+    DECLARE
+        total INTEGER := 0;
+        active INTEGER := 0;
+        banned INTEGER := 0;
+        admins INTEGER := 0;
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            total := total - 1;
+            active := active - OLD.is_active::int;
+            banned := banned - OLD.is_banned::int;
+            admins := admins - (OLD.role::text = 'ADMIN')::int;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            total := total + 1;
+            active := active + NEW.is_active::int;
+            banned := banned + NEW.is_banned::int;
+            admins := admins + (NEW.role::text = 'ADMIN')::int;
+        END IF;
+        PERFORM stat_counters_bump('total_users', total);
+        PERFORM stat_counters_bump('active_users', active);
+        PERFORM stat_counters_bump('banned_users', banned);
+        PERFORM stat_counters_bump('admin_users', admins);
+        IF TG_OP = 'INSERT' THEN
+            PERFORM stat_counters_bump('signups:' || to_char(NEW.created_at, 'YYYY-MM-DD'), 1);
+        END IF;
+        IF TG_OP = 'UPDATE' AND NEW.last_login IS NOT NULL AND NEW.last_login IS DISTINCT FROM OLD.last_login THEN
+            PERFORM stat_counters_bump('logins:' || to_char(NEW.last_login, 'YYYY-MM-DD'), 1);
+        END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS stat_counters_users ON users",
+    """CREATE TRIGGER stat_counters_users AFTER INSERT OR DELETE OR UPDATE OF is_active, is_banned, role, last_login
+    ON users FOR EACH ROW EXECUTE FUNCTION stat_counters_users()""",
+)
+
+
+def user_totals(connection) -> Dict[str, int]:
+    """Count users by status in a single pass (conditional aggregation)"""
+    row = connection.execute(select(
+        func.count(User.id),
+        func.coalesce(func.sum(case((User.is_active == True, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((User.is_banned == True, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((User.role == UserRole.ADMIN, 1), else_=0)), 0),
+    )).one()
+    return dict(zip(TOTAL_KEYS, row))
+
+
+def rebuild_totals(connection: Connection) -> None:
+    """Recompute the running totals from users"""
+    totals = user_totals(connection)
+    counters = StatCounter.__table__
+    connection.execute(delete(counters).where(counters.c.key.in_(TOTAL_KEYS)))
+    connection.execute(insert(counters), [{"key": key, "value": value} for key, value in totals.items()])
+
+
+def _triggers_exist(connection: Connection) -> bool:
+    if connection.dialect.name == "sqlite":
+        query = "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'stat_counters_users_insert'"
+    else:
+        query = "SELECT 1 FROM pg_trigger WHERE tgname = 'stat_counters_users'"
+    return connection.execute(text(query)).first() is not None
+
+
+def ensure_stat_counters(connection: Connection) -> None:
+    """Install the counter triggers if missing, backfilling the totals"""
+    dialect = connection.dialect.name
+    if dialect not in ("sqlite", "postgresql") or _triggers_exist(connection):
+        return
+    for statement in _SQLITE_DDL if dialect == "sqlite" else _POSTGRES_DDL:
+        connection.execute(text(statement))
+    rebuild_totals(connection)
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _create_stat_counters(target, connection, **kw):
+    ensure_stat_counters(connection)
+
+
+def read_stats(session: Session, day: date) -> Dict[str, int]:
+    """
+    Current totals plus the given day's signups and logins
+
+    Falls back to counting users directly on databases without triggers.
+    """
+    day_keys = (f"signups:{day.isoformat()}", f"logins:{day.isoformat()}")
+    values = dict(
+        session.query(StatCounter.key, StatCounter.value)
+        .filter(StatCounter.key.in_(TOTAL_KEYS + day_keys))
+        .all()
+    )
+    if not all(key in values for key in TOTAL_KEYS):
+        values.update(user_totals(session))
+    stats = {key: values[key] for key in TOTAL_KEYS}
+    stats["signups_today"] = values.get(day_keys[0], 0)
+    stats["logins_today"] = values.get(day_keys[1], 0)
+    return stats
@@ -77,7 +77,7 @@ class OTPCode(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     code = Column(String(6), nullable=False)
     purpose = Column(String(50), nullable=False)  # 'signup', 'reset_password', 'change_email'
-    expires_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
     is_used = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     
@@ -94,7 +94,7 @@ class UserSession(Base):
     refresh_token = Column(String(500), unique=True, nullable=False)
     device_info = Column(String(255), nullable=True)
     ip_address = Column(String(45), nullable=True)
-    expires_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -110,3 +110,11 @@ class SystemConfig(Base):
     value = Column(Text, nullable=False)
     description = Column(Text, nullable=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class StatCounter(Base):
+    """Counters behind /admin/stats, maintained by triggers on users"""
+    __tablename__ = "stat_counters"
+    
+    key = Column(String(64), primary_key=True)  # e.g. 'total_users', 'signups:2024-01-31'
+    value = Column(Integer, default=0, nullable=False)
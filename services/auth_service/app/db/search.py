@@ -0,0 +1,161 @@
+"""
+Indexed user search for the admin panel
+
+Searching username, name and email with ILIKE '%term%' cannot use their
+B-tree indexes, so each dialect gets a dedicated index instead:
+
+- SQLite: an FTS5 table with the trigram tokenizer (users_fts), kept in
+  sync with users by triggers
+- PostgreSQL: pg_trgm GIN indexes on the three columns
+
+Both match any substring (so prefixes too) case-insensitively and rank by
+relevance. Fuzzy search also matches terms with typos by their shared
+trigrams. The DDL runs from the users table's create/drop events, and
+ensure_user_search_index (called at startup) adds it to databases created
+before it existed.
+
+Where the index cannot be created - SQLite without FTS5's trigram tokenizer
+(before 3.34), or a PostgreSQL role that may not create pg_trgm - a warning
+is printed and searches fall back to the unindexed ILIKE query.
+"""
+from sqlalchemy import Float, Integer, event, func, or_, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from app.db.models.user import User
+
+# Trigram indexes cannot match terms shorter than one trigram
+MIN_INDEXED_TERM = 3
+
+# Cleared when the index could not be created; searches then use ILIKE
+search_index_available = True
+
+_SQLITE_DDL = (
+    """CREATE VIRTUAL TABLE users_fts USING fts5(
+        username, name, email, content='users', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS users_fts_insert AFTER INSERT ON users BEGIN
+        INSERT INTO users_fts(rowid, username, name, email) VALUES (new.id, new.username, new.name, new.email);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS users_fts_delete AFTER DELETE ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, username, name, email) VALUES ('delete', old.id, old.username, old.name, old.email);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS users_fts_update AFTER UPDATE OF username, name, email ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, username, name, email) VALUES ('delete', old.id, old.username, old.name, old.email);
+        INSERT INTO users_fts(rowid, username, name, email) VALUES (new.id, new.username, new.name, new.email);
+    END""",
+    # Index rows that existed before the table was created
+    "INSERT INTO users_fts(users_fts) VALUES ('rebuild')",
+)
+
+_POSTGRES_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_users_username_trgm ON users USING gin (username gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_users_name_trgm ON users USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_users_email_trgm ON users USING gin (email gin_trgm_ops)",
+)
+
+
+def _sqlite_index_exists(connection: Connection) -> bool:
+    return connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users_fts'")
+    ).first() is not None
+
+
+def ensure_user_search_index(connection: Connection) -> bool:
+    """
+    Create the search index for this database's dialect, if missing
+    
+    The DDL runs in a savepoint, so a failure leaves the surrounding
+    transaction usable.
+    
+    Returns:
+        Whether indexed search is available
+    """
+    global search_index_available
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        statements = () if _sqlite_index_exists(connection) else _SQLITE_DDL
+    elif dialect == "postgresql":
+        statements = _POSTGRES_DDL
+    else:
+        statements = ()
+    try:
+        with connection.begin_nested():
+            for statement in statements:
+                connection.execute(text(statement))
+    except (OperationalError, ProgrammingError) as e:
+        print(f"⚠️ User search index unavailable, falling back to ILIKE search: {e}")
+        search_index_available = False
+        return False
+    search_index_available = True
+    return True
+
+
+def drop_user_search_index(connection: Connection) -> None:
+    if connection.dialect.name == "sqlite":
+        connection.execute(text("DROP TABLE IF EXISTS users_fts"))
+
+
+@event.listens_for(User.__table__, "after_create")
+def _create_search_index(target, connection, **kw):
+    ensure_user_search_index(connection)
+
+
+@event.listens_for(User.__table__, "before_drop")
+def _drop_search_index(target, connection, **kw):
+    drop_user_search_index(connection)
+
+
+def _trigrams(term: str) -> list:
+    term = term.lower()
+    return sorted({term[i:i + MIN_INDEXED_TERM] for i in range(len(term) - MIN_INDEXED_TERM + 1)})
+
+
+def _fts_phrase(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+
+def search_users(query, db, term: str, fuzzy: bool = False):
+    """
+    Restrict a User query to users matching `term`, best matches first
+
+    Args:
+        query: Query over User
+        db: Session the query runs in
+        term: Text to find in username, name or email
+        fuzzy: Also match misspellings (any shared trigram, ranked by overlap)
+
+    Returns:
+        The filtered and ordered query
+    """
+    term = term.strip()
+    dialect = db.get_bind().dialect.name if search_index_available else None
+
+    if len(term) >= MIN_INDEXED_TERM and dialect == "sqlite":
+        if fuzzy:
+            match = " OR ".join(_fts_phrase(trigram) for trigram in _trigrams(term))
+        else:
+            match = _fts_phrase(term)
+        matches = (
+            text("SELECT rowid AS user_id, bm25(users_fts) AS rank FROM users_fts WHERE users_fts MATCH :match")
+            .bindparams(match=match)
+            .columns(user_id=Integer, rank=Float)
+            .subquery("matches")
+        )
+        return query.join(matches, matches.c.user_id == User.id).order_by(matches.c.rank, User.id)
+
+    if len(term) >= MIN_INDEXED_TERM and dialect == "postgresql":
+        columns = (User.username, User.name, User.email)
+        if fuzzy:
+            condition = or_(*(column.op("%>")(term) for column in columns))
+        else:
+            condition = or_(*(column.ilike(f"%{term}%") for column in columns))
+        relevance = func.greatest(*(func.word_similarity(term, column) for column in columns))
+        return query.filter(condition).order_by(relevance.desc(), User.id)
+
+    # Short terms and other databases: unindexed substring match
+    pattern = f"%{term}%"
+    return query.filter(
+        or_(User.username.ilike(pattern), User.name.ilike(pattern), User.email.ilike(pattern))
+    ).order_by(User.id)
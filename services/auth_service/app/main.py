@@ -1,22 +1,63 @@
 """
 Main FastAPI application for Auth Service
 """
-from fastapi import FastAPI
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
 
 from app.core.config import settings
-from app.db.base import engine
+from app.core.notifications import admin_outbox, notification_client, otp_outbox
+from app.core.reaper import reaper
+from app.core.security import PasswordHashingBusy, password_hasher, token_cache
+from app.core.system_config import system_config
+from app.db.base import SessionLocal, engine
 from app.db.models.user import Base
+from app.db.search import ensure_user_search_index
 from app.api.v1.routes import register, login, users, auth, admin
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Load system config, start background upkeep; flush queued messages on shutdown"""
+    with engine.begin() as connection:
+        ensure_user_search_index(connection)
+    db = SessionLocal()
+    try:
+        system_config.load(db)
+    finally:
+        db.close()
+    tasks = []
+    if settings.SYSTEM_CONFIG_POLL_INTERVAL > 0:
+        tasks.append(asyncio.create_task(system_config.watch(SessionLocal, settings.SYSTEM_CONFIG_POLL_INTERVAL)))
+    if settings.REAPER_INTERVAL > 0:
+        tasks.append(asyncio.create_task(reaper.run(SessionLocal, settings.REAPER_INTERVAL)))
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Let cancelled tasks finish (and release their sessions) before closing shared resources
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await otp_outbox.close()
+        await admin_outbox.close()
+        await notification_client.close()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title=settings.APP_NAME,
     version=settings.VERSION,
-    description="Authentication and User Management Service - Enhanced with JWT & OTP"
+    description="Authentication and User Management Service - Enhanced with JWT & OTP",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -26,8 +67,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Keyset pagination cursor of GET /users and /groups
+    expose_headers=["X-Next-Cursor"],
 )
 
+
+@app.exception_handler(PasswordHashingBusy)
+async def password_hashing_busy_handler(request: Request, exc: PasswordHashingBusy):
+    """Shed logins and signups while the hashing pool is saturated"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": "1"}
+    )
+
+
 # Include enhanced authentication routes
 app.include_router(auth.router, prefix=f"{settings.API_V1_PREFIX}/auth", tags=["🔐 Authentication"])
 app.include_router(admin.router, prefix=f"{settings.API_V1_PREFIX}/admin", tags=["👑 Admin Panel"])
@@ -54,6 +108,35 @@ def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/health/deep")
+def deep_health_check():
+    """Health check including the database connection"""
+    started = time.perf_counter()
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        database = {"status": "healthy"}
+    except SQLAlchemyError as e:
+        database = {"status": "unhealthy", "error": str(e)}
+    database["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    
+    healthy = database["status"] == "healthy"
+    return JSONResponse(
+        status_code=200 if healthy else 503,
+        content={
+            "status": "healthy" if healthy else "unhealthy",
+            "components": {
+                "database": database,
+                "password_hashing": password_hasher.stats(),
+                "token_cache": token_cache.stats(),
+                "otp_outbox": otp_outbox.stats(),
+                "admin_outbox": admin_outbox.stats(),
+                "reaper": reaper.stats()
+            }
+        }
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
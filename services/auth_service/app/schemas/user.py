@@ -6,6 +6,8 @@ from typing import Optional, List
 from datetime import datetime
 from enum import Enum
 
+from app.core.config import settings
+
 
 class UserRole(str, Enum):
     """User role enum"""
@@ -194,9 +196,11 @@ class UserListFilter(BaseModel):
 class UserListResponse(BaseModel):
     """Paginated user list response"""
     users: List[User]
-    total: int
+    total: Optional[int] = None  # Cached for a short while; omitted with include_total=false
     skip: int
     limit: int
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
 
 
 class SendNotificationRequest(BaseModel):
@@ -207,6 +211,50 @@ class SendNotificationRequest(BaseModel):
     message: str
 
 
+class BulkAction(str, Enum):
+    """Operations available in bulk"""
+    BAN = "ban"
+    UNBAN = "unban"
+    ACTIVATE = "activate"
+    DEACTIVATE = "deactivate"
+    DELETE = "delete"
+    NOTIFY = "notify"
+
+
+class BulkUserFilter(BaseModel):
+    """Select users for a bulk operation by filter instead of ids"""
+    search: Optional[str] = None
+    role: Optional[UserRole] = None
+    is_active: Optional[bool] = None
+    is_banned: Optional[bool] = None
+
+
+class BulkUserRequest(BaseModel):
+    """Bulk admin operation on a list of user ids or a filter (exactly one)"""
+    action: BulkAction
+    user_ids: Optional[List[int]] = Field(None, max_length=settings.BULK_MAX_USERS)
+    filter: Optional[BulkUserFilter] = None
+    # For notify
+    method: Optional[OTPMethod] = None
+    subject: Optional[str] = None
+    message: Optional[str] = None
+
+
+class BulkUserResult(BaseModel):
+    """Outcome for one user: updated, deleted, queued, unchanged, skipped or not_found"""
+    user_id: int
+    status: str
+    detail: Optional[str] = None
+
+
+class BulkUserResponse(BaseModel):
+    """Bulk operation summary"""
+    action: BulkAction
+    matched: int
+    affected: int
+    results: List[BulkUserResult]
+
+
 class SystemConfigUpdate(BaseModel):
     """Update system config"""
     otp_method: OTPMethod
@@ -6,8 +6,13 @@ from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from app.main import app
-from app.db.models.user import Base, User
+from app.db.models.user import Base, SystemConfig, User
 from app.db.base import get_db
+from app.core.config import settings
+from app.core.notifications import notification_client
+from app.core.pagination import count_cache
+from app.core.principals import principal_cache
+from app.core.system_config import system_config
 from app.core.security import get_password_hash
 
 # Test database
@@ -28,6 +33,10 @@ app.dependency_overrides[get_db] = override_get_db
 def setup_database():
     Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
+    # User ids repeat across tests
+    principal_cache.clear()
+    system_config.invalidate()
+    count_cache.clear()
     yield
     Base.metadata.drop_all(bind=engine)
 
@@ -112,6 +121,39 @@ class TestListUsersEndpoint:
         assert len(data["users"]) >= 1
         assert any("Regular" in user["name"] for user in data["users"])
     
+    def test_list_users_search_follows_updates(self, client, admin_token, admin_user, regular_user):
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        client.patch(f"/api/v1/admin/users/{regular_user.id}", json={"name": "Renamed Person"}, headers=headers)
+        assert client.get("/api/v1/admin/users?search=Regular", headers=headers).json()["users"] == []
+        data = client.get("/api/v1/admin/users?search=named pers", headers=headers).json()
+        assert [u["username"] for u in data["users"]] == ["user"]
+    
+    def test_list_users_fuzzy_search(self, client, admin_token, admin_user, regular_user):
+        response = client.get(
+            "/api/v1/admin/users?search=Regualr&fuzzy=true",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == 200
+        assert response.json()["users"][0]["username"] == "user"
+    
+    def test_list_users_search_without_index(self, client, admin_token, admin_user, regular_user, monkeypatch):
+        from app.db import search
+        monkeypatch.setattr(search, "search_index_available", True)
+        # e.g. SQLite without the trigram tokenizer
+        monkeypatch.setattr(search, "_SQLITE_DDL", (
+            "CREATE VIRTUAL TABLE users_fts USING fts5(username, tokenize='no_such_tokenizer')",
+        ))
+        with create_engine("sqlite://").begin() as connection:
+            assert search.ensure_user_search_index(connection) is False
+        assert search.search_index_available is False
+        
+        response = client.get(
+            "/api/v1/admin/users?search=Regular",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == 200
+        assert [u["username"] for u in response.json()["users"]] == ["user"]
+    
     def test_list_users_with_role_filter(self, client, admin_token, admin_user, regular_user):
         response = client.get(
             "/api/v1/admin/users?role=ADMIN",
@@ -121,6 +163,33 @@ class TestListUsersEndpoint:
         data = response.json()
         assert all(user["role"] == "ADMIN" for user in data["users"])
     
+    def test_list_users_cursor_pagination(self, client, admin_token, admin_user, regular_user):
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        first = client.get("/api/v1/admin/users?limit=1", headers=headers).json()
+        assert [u["username"] for u in first["users"]] == ["admin"]
+        assert first["total"] == 2
+        assert first["prev_cursor"] is None
+        
+        second = client.get(
+            f"/api/v1/admin/users?limit=1&include_total=false&cursor={first['next_cursor']}", headers=headers
+        ).json()
+        assert [u["username"] for u in second["users"]] == ["user"]
+        assert second["total"] is None
+        assert second["next_cursor"] is None
+        
+        back = client.get(f"/api/v1/admin/users?limit=1&cursor={second['prev_cursor']}", headers=headers).json()
+        assert [u["username"] for u in back["users"]] == ["admin"]
+    
+    def test_list_users_total_follows_single_user_changes(self, client, admin_token, admin_user, regular_user):
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        assert client.get("/api/v1/admin/users?is_banned=true", headers=headers).json()["total"] == 0
+        
+        client.post(f"/api/v1/admin/users/{regular_user.id}/ban", headers=headers)
+        assert client.get("/api/v1/admin/users?is_banned=true", headers=headers).json()["total"] == 1
+        
+        client.delete(f"/api/v1/admin/users/{regular_user.id}", headers=headers)
+        assert client.get("/api/v1/admin/users?is_banned=true", headers=headers).json()["total"] == 0
+    
     def test_list_users_unauthorized(self, client, user_token):
         response = client.get(
             "/api/v1/admin/users",
@@ -182,6 +251,21 @@ class TestUpdateUserEndpoint:
         assert response.status_code == 200
         assert response.json()["role"] == "ADMIN"
     
+    def test_update_user_role_takes_effect_immediately(self, client, admin_token, user_token, regular_user):
+        # The first request caches the user's principal
+        response = client.get("/api/v1/admin/stats", headers={"Authorization": f"Bearer {user_token}"})
+        assert response.status_code == 403
+        
+        response = client.patch(
+            f"/api/v1/admin/users/{regular_user.id}",
+            json={"role": "admin"},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == 200
+        
+        response = client.get("/api/v1/admin/stats", headers={"Authorization": f"Bearer {user_token}"})
+        assert response.status_code == 200
+    
     def test_update_user_telegram(self, client, admin_token, regular_user):
         response = client.patch(
             f"/api/v1/admin/users/{regular_user.id}",
@@ -324,6 +408,54 @@ class TestDeleteUserEndpoint:
         assert response.status_code == 404
 
 
+class TestBulkUserEndpoint:
+    """Test POST /api/v1/admin/users/bulk"""
+    
+    def test_bulk_ban_by_ids(self, client, admin_token, admin_user, regular_user):
+        response = client.post(
+            "/api/v1/admin/users/bulk",
+            json={"action": "ban", "user_ids": [regular_user.id, admin_user.id, 99999]},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["affected"] == 1
+        assert [r["status"] for r in data["results"]] == ["updated", "skipped", "not_found"]
+        
+        db = TestingSessionLocal()
+        assert db.query(User).filter(User.id == regular_user.id).first().is_banned == True
+        db.close()
+    
+    def test_bulk_delete_by_filter(self, client, admin_token, admin_user, regular_user, user_token):
+        response = client.post(
+            "/api/v1/admin/users/bulk",
+            json={"action": "delete", "filter": {"role": "user"}},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == 200
+        assert response.json()["results"] == [{"user_id": regular_user.id, "status": "deleted", "detail": None}]
+        
+        db = TestingSessionLocal()
+        assert db.query(User).count() == 1
+        db.close()
+    
+    def test_bulk_rejects_too_many_ids_before_querying(self, client, admin_token):
+        response = client.post(
+            "/api/v1/admin/users/bulk",
+            json={"action": "ban", "user_ids": list(range(1, settings.BULK_MAX_USERS + 2))},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == 422
+    
+    def test_bulk_requires_ids_or_filter(self, client, admin_token):
+        response = client.post(
+            "/api/v1/admin/users/bulk",
+            json={"action": "unban"},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == 400
+
+
 class TestNotifyUserEndpoint:
     """Test POST /api/v1/admin/users/{user_id}/notify"""
     
@@ -336,6 +468,37 @@ class TestNotifyUserEndpoint:
         assert response.status_code == 200
         assert "notification" in response.json()["message"].lower()
 
+    
+    def test_notify_user_by_email_uses_the_shared_client(self, client, admin_token, regular_user, monkeypatch):
+        sent = []
+        
+        async def deliver(message):
+            sent.append(message)
+            return {"email": True, "telegram": False}
+        monkeypatch.setattr(notification_client, "deliver", deliver)
+        
+        response = client.post(
+            f"/api/v1/admin/users/{regular_user.id}/notify",
+            json={"user_id": regular_user.id, "method": "email", "subject": "Hi", "message": "Test notification"},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == 200
+        assert [(m.email, m.telegram_id, m.subject, m.body) for m in sent] == [
+            (regular_user.email, None, "Hi", "Test notification")
+        ]
+    
+    def test_notify_user_failure_is_500(self, client, admin_token, regular_user, monkeypatch):
+        async def deliver(message):
+            return {"email": False, "telegram": False}
+        monkeypatch.setattr(notification_client, "deliver", deliver)
+        
+        response = client.post(
+            f"/api/v1/admin/users/{regular_user.id}/notify",
+            json={"user_id": regular_user.id, "method": "email", "message": "Test notification"},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == 500
+
 
 class TestOTPConfigEndpoints:
     """Test GET/PUT /api/v1/admin/config/otp"""
@@ -358,6 +521,29 @@ class TestOTPConfigEndpoints:
         )
         assert response.status_code == 200
     
+    def test_update_otp_config_refreshes_cached_config(self, client, admin_token):
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        assert client.get("/api/v1/admin/config/otp", headers=headers).json()["otp_method"] == "disabled"
+        client.put(
+            "/api/v1/admin/config/otp",
+            json={"otp_method": "telegram", "otp_expiry_minutes": 10},
+            headers=headers
+        )
+        data = client.get("/api/v1/admin/config/otp", headers=headers).json()
+        assert data["otp_method"] == "telegram"
+        assert data["otp_expiry_minutes"] == 10
+    
+    def test_config_change_from_another_worker_is_picked_up(self, client, admin_token):
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        client.get("/api/v1/admin/config/otp", headers=headers)
+        db = TestingSessionLocal()
+        db.add(SystemConfig(key="otp_method", value="email"))
+        db.commit()
+        assert system_config.refresh_if_changed(db)
+        assert not system_config.refresh_if_changed(db)
+        db.close()
+        assert client.get("/api/v1/admin/config/otp", headers=headers).json()["otp_method"] == "email"
+    
     def test_otp_config_unauthorized(self, client, user_token):
         response = client.get(
             "/api/v1/admin/config/otp",
@@ -383,6 +569,22 @@ class TestSystemStatsEndpoint:
         assert "admin_users" in data
         assert data["total_users"] >= 2
     
+    def test_stats_follow_writes(self, client, admin_token, admin_user, regular_user):
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        before = client.get("/api/v1/admin/stats", headers=headers).json()
+        assert before["total_users"] == 2
+        assert before["admin_users"] == 1
+        assert before["logins_today"] >= 1
+        
+        client.post(f"/api/v1/admin/users/{regular_user.id}/ban", json={}, headers=headers)
+        assert client.get("/api/v1/admin/stats", headers=headers).json()["banned_users"] == 1
+        
+        client.delete(f"/api/v1/admin/users/{regular_user.id}", headers=headers)
+        after = client.get("/api/v1/admin/stats", headers=headers).json()
+        assert after["total_users"] == 1
+        assert after["banned_users"] == 0
+        assert after["active_users"] == 1
+    
     def test_get_stats_unauthorized(self, client, user_token):
         response = client.get(
             "/api/v1/admin/stats",
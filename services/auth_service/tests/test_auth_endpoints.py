@@ -1,6 +1,14 @@
 """
 Comprehensive tests for all Authentication endpoints
 """
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import threading
+import time
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
@@ -8,7 +16,14 @@ from sqlalchemy.orm import sessionmaker
 from app.main import app
 from app.db.models.user import Base, User
 from app.db.base import get_db
-from app.core.security import get_password_hash
+from app.core.notifications import NotificationClient, notification_client
+from app.core.reaper import reaper
+from app.core.principals import principal_cache
+from app.core.system_config import system_config
+from app.core.security import (
+    PasswordHasher, create_access_token, get_password_hash, password_hasher, evict_cached_user_tokens, token_cache,
+    verify_token
+)
 from app.core.config import settings
 
 # Test database
@@ -29,6 +44,9 @@ app.dependency_overrides[get_db] = override_get_db
 def setup_database():
     Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
+    # User ids repeat across tests
+    principal_cache.clear()
+    system_config.invalidate()
     yield
     Base.metadata.drop_all(bind=engine)
 
@@ -68,6 +86,18 @@ class TestSignupEndpoint:
         assert response.status_code == 201
         assert "message" in response.json()
     
+    def test_signup_outbox_mode_responds_before_delivery(self, monkeypatch):
+        monkeypatch.setattr(settings, "OTP_DELIVERY_MODE", "outbox")
+        with TestClient(app) as client:
+            response = client.post("/api/v1/auth/signup", json={
+                "username": "newuser",
+                "name": "New User",
+                "email": "newuser@example.com",
+                "password": "SecurePass123!"
+            })
+        assert response.status_code == 201
+        assert response.json()["detail"] == "otp_sent_via: queued"
+    
     def test_signup_duplicate_username(self, client, test_user):
         response = client.post("/api/v1/auth/signup", json={
             "username": "testuser",
@@ -126,6 +156,15 @@ class TestLoginEndpoint:
         })
         assert response.status_code == 401
     
+    def test_login_sheds_when_hashing_pool_is_full(self, client, test_user, monkeypatch):
+        monkeypatch.setattr(password_hasher, "max_pending", 0)
+        response = client.post("/api/v1/auth/login", json={
+            "username_or_email": "testuser",
+            "password": "TestPassword123!"
+        })
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+    
     def test_login_nonexistent_user(self, client):
         response = client.post("/api/v1/auth/login", json={
             "username_or_email": "nonexistent",
@@ -288,6 +327,29 @@ class TestChangePasswordEndpoint:
         )
         assert response.status_code == 400
     
+    def test_change_password_replaces_the_hash(self, client, test_user):
+        token = client.post("/api/v1/auth/login", json={
+            "username_or_email": "testuser",
+            "password": "TestPassword123!"
+        }).json()["access_token"]
+        
+        client.post(
+            "/api/v1/auth/change-password",
+            json={"old_password": "TestPassword123!", "new_password": "NewPassword123!"},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        
+        old_login = client.post("/api/v1/auth/login", json={
+            "username_or_email": "testuser",
+            "password": "TestPassword123!"
+        })
+        new_login = client.post("/api/v1/auth/login", json={
+            "username_or_email": "testuser",
+            "password": "NewPassword123!"
+        })
+        assert old_login.status_code == 401
+        assert new_login.status_code == 200
+    
     def test_change_password_unauthorized(self, client):
         response = client.post("/api/v1/auth/change-password", json={
             "old_password": "OldPass123!",
@@ -343,3 +405,217 @@ class TestLogoutEndpoint:
         response = client.post("/api/v1/auth/logout", params={"refresh_token": refresh_token})
         assert response.status_code == 200
         assert "logged out" in response.json()["message"].lower()
+    
+    def test_logout_evicts_cached_access_token(self, client, test_user):
+        tokens = client.post("/api/v1/auth/login", json={
+            "username_or_email": "testuser",
+            "password": "TestPassword123!"
+        }).json()
+        assert verify_token(tokens["access_token"]) is not None
+        assert verify_token(tokens["refresh_token"], token_type="refresh") is not None
+        evicted = token_cache.stats()["evicted"]
+        
+        response = client.post(
+            "/api/v1/auth/logout",
+            params={"refresh_token": tokens["refresh_token"]},
+            headers={"Authorization": f"Bearer {tokens['access_token']}"}
+        )
+        assert response.status_code == 200
+        # Refresh and access token both dropped from the cache
+        assert token_cache.stats()["evicted"] == evicted + 2
+
+
+def make_gateway_claims(claims, token, secret):
+    """Build an X-Gateway-Claims header the way the API gateway signs it"""
+    payload = {**claims, "tkn": hashlib.sha256(token.encode("utf-8")).hexdigest()}
+    encoded = base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).rstrip(b"=")
+    signature = base64.urlsafe_b64encode(hmac.new(secret.encode("utf-8"), encoded, hashlib.sha256).digest()).rstrip(b"=")
+    return f"{encoded.decode()}.{signature.decode()}"
+
+
+class TestGatewayClaims:
+    """Test claims forwarded by the API gateway in X-Gateway-Claims"""
+    
+    def test_signed_claims_skip_token_decoding(self, client, test_user, monkeypatch):
+        monkeypatch.setattr(settings, "GATEWAY_CLAIMS_SECRET", "gateway-secret")
+        
+        # The token is opaque to the service; the gateway vouches for it
+        token = "verified-at-the-edge"
+        claims = {"sub": str(test_user.id), "type": "access", "exp": int(time.time()) + 60}
+        response = client.post(
+            "/api/v1/auth/change-password",
+            json={"old_password": "WrongPassword!", "new_password": "NewPassword123!"},
+            headers={
+                "Authorization": f"Bearer {token}",
+                "X-Gateway-Claims": make_gateway_claims(claims, token, "gateway-secret")
+            }
+        )
+        # Authenticated (wrong old password), not rejected as unauthorized
+        assert response.status_code == 400
+    
+    def test_forged_claims_are_ignored(self, client, test_user, monkeypatch):
+        monkeypatch.setattr(settings, "GATEWAY_CLAIMS_SECRET", "gateway-secret")
+        
+        token = "not-a-jwt"
+        claims = {"sub": str(test_user.id), "type": "access", "exp": int(time.time()) + 60}
+        response = client.post(
+            "/api/v1/auth/change-password",
+            json={"old_password": "TestPassword123!", "new_password": "NewPassword123!"},
+            headers={
+                "Authorization": f"Bearer {token}",
+                "X-Gateway-Claims": make_gateway_claims(claims, token, "wrong-secret")
+            }
+        )
+        assert response.status_code == 401
+    
+    def test_claims_bound_to_token(self, client, test_user, monkeypatch):
+        monkeypatch.setattr(settings, "GATEWAY_CLAIMS_SECRET", "gateway-secret")
+        
+        claims = {"sub": str(test_user.id), "type": "access", "exp": int(time.time()) + 60}
+        response = client.post(
+            "/api/v1/auth/change-password",
+            json={"old_password": "TestPassword123!", "new_password": "NewPassword123!"},
+            headers={
+                "Authorization": "Bearer another-token",
+                "X-Gateway-Claims": make_gateway_claims(claims, "original-token", "gateway-secret")
+            }
+        )
+        assert response.status_code == 401
+
+
+class TestTokenCache:
+    """Test the decoded-token cache behind verify_token"""
+    
+    def test_repeated_token_is_served_from_cache(self):
+        token = create_access_token({"sub": "42"})
+        assert verify_token(token)["sub"] == "42"
+        hits = token_cache.stats()["hits"]
+        assert verify_token(token)["sub"] == "42"
+        assert token_cache.stats()["hits"] == hits + 1
+    
+    def test_cached_token_still_checks_type(self):
+        token = create_access_token({"sub": "42"})
+        assert verify_token(token) is not None
+        assert verify_token(token, token_type="refresh") is None
+    
+    def test_evict_cached_user_tokens_evicts_entries(self):
+        token = create_access_token({"sub": "43"})
+        verify_token(token)
+        evicted = token_cache.stats()["evicted"]
+        evict_cached_user_tokens(43)
+        assert token_cache.stats()["evicted"] == evicted + 1
+        misses = token_cache.stats()["misses"]
+        assert verify_token(token) is not None
+        assert token_cache.stats()["misses"] == misses + 1
+
+
+class TestPasswordHasher:
+    """Test the bounded bcrypt pool"""
+    
+    def test_cancelled_queued_call_releases_its_slot(self):
+        hasher = PasswordHasher(workers=1, max_queue=1)
+        release = threading.Event()
+        
+        async def scenario():
+            running = asyncio.ensure_future(hasher.run(release.wait))
+            queued = asyncio.ensure_future(hasher.run(lambda: "never runs"))
+            await asyncio.sleep(0.05)
+            assert hasher.pending == 2
+            queued.cancel()
+            await asyncio.gather(queued, return_exceptions=True)
+            release.set()
+            await running
+        
+        asyncio.run(scenario())
+        assert hasher.pending == 0
+        assert hasher.stats()["queued"] == 0
+        assert asyncio.run(hasher.run(lambda: "ok")) == "ok"
+
+
+class TestNotificationClient:
+    """Test the pooled notification service client"""
+    
+    def test_client_of_a_previous_loop_is_closed(self):
+        notifier = NotificationClient()
+        old_loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=old_loop.run_forever, daemon=True)
+        thread.start()
+        
+        async def get_client():
+            return notifier.client
+        
+        try:
+            old_client = asyncio.run_coroutine_threadsafe(get_client(), old_loop).result(timeout=2)
+            new_client = asyncio.run(get_client())
+            time.sleep(0.1)  # Let the old loop run the close
+            assert new_client is not old_client
+            assert old_client.is_closed
+        finally:
+            old_loop.call_soon_threadsafe(old_loop.stop)
+            thread.join(timeout=2)
+            old_loop.close()
+
+
+class TestDeepHealth:
+    """Test /health/deep"""
+    
+    def test_deep_health_reports_database(self, client):
+        response = client.get("/health/deep")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "healthy"
+        assert data["components"]["database"]["status"] == "healthy"
+        assert "latency_ms" in data["components"]["database"]
+        assert "queued" in data["components"]["password_hashing"]
+
+
+class TestLifespan:
+    """Test application shutdown"""
+    
+    def test_shutdown_waits_for_background_tasks(self, monkeypatch):
+        events = []
+        
+        async def run(session_factory, interval):
+            try:
+                await asyncio.Event().wait()
+            finally:
+                await asyncio.sleep(0.01)
+                events.append("reaper stopped")
+        
+        async def close():
+            events.append("client closed")
+        
+        monkeypatch.setattr(settings, "REAPER_INTERVAL", 60)
+        monkeypatch.setattr(reaper, "run", run)
+        monkeypatch.setattr(notification_client, "close", close)
+        with TestClient(app):
+            pass
+        assert events == ["reaper stopped", "client closed"]
+
+
+class TestExpiredRowReaper:
+    """Test pruning of expired sessions and OTP codes"""
+    
+    def test_reap_removes_expired_rows_in_batches(self, test_user):
+        from datetime import datetime, timedelta
+        from app.core.reaper import ExpiredRowReaper
+        from app.db.models.user import OTPCode, UserSession
+        past = datetime.utcnow() - timedelta(minutes=1)
+        future = datetime.utcnow() + timedelta(hours=1)
+        db = TestingSessionLocal()
+        db.add_all([UserSession(user_id=test_user.id, refresh_token=f"expired-{i}", expires_at=past) for i in range(5)])
+        db.add(UserSession(user_id=test_user.id, refresh_token="live", expires_at=future))
+        db.add_all([
+            OTPCode(user_id=test_user.id, code="111111", purpose="signup", expires_at=past),
+            OTPCode(user_id=test_user.id, code="222222", purpose="signup", expires_at=future, is_used=True),
+            OTPCode(user_id=test_user.id, code="333333", purpose="signup", expires_at=future),
+        ])
+        db.commit()
+        
+        reaper = ExpiredRowReaper(batch_size=2)
+        assert reaper.reap(db) == {"user_sessions": 5, "otp_codes": 2}
+        assert db.query(UserSession).count() == 1
+        assert db.query(OTPCode).one().code == "333333"
+        assert reaper.reap(db) == {"user_sessions": 0, "otp_codes": 0}
+        assert reaper.stats()["removed"] == {"user_sessions": 5, "otp_codes": 2}
+        db.close()
@@ -1,12 +1,15 @@
 """
 Comprehensive tests for Users and Groups endpoints
 """
+import ast
+from pathlib import Path
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 from app.main import app
-from app.db.models.user import Base, User, Group
+from app.db.models.user import Base, User, Group, group_members_table
 from app.db.base import get_db
 from app.core.security import get_password_hash
 
@@ -15,6 +18,9 @@ SQLALCHEMY_DATABASE_URL = "sqlite:///./test_users_groups.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Models of the legacy monolith, which shares this service's database
+LEGACY_MODELS = Path(__file__).resolve().parents[3] / "models.py"
+
 def override_get_db():
     try:
         db = TestingSessionLocal()
@@ -88,6 +94,19 @@ class TestGetUsersEndpoint:
         assert response.status_code == 200
         data = response.json()
         assert len(data) >= 1
+    
+    def test_get_users_with_cursor(self, client, test_users):
+        response = client.get("/api/v1/users?limit=2")
+        assert [u["username"] for u in response.json()] == ["user1", "user2"]
+        cursor = response.headers["X-Next-Cursor"]
+        
+        response = client.get(f"/api/v1/users?limit=2&cursor={cursor}")
+        assert [u["username"] for u in response.json()] == ["user3"]
+        assert "X-Next-Cursor" not in response.headers
+    
+    def test_get_users_invalid_cursor(self, client, test_users):
+        response = client.get("/api/v1/users?cursor=not-a-cursor")
+        assert response.status_code == 400
 
 
 class TestGetUserByNameEndpoint:
@@ -227,6 +246,49 @@ class TestGetUserGroupsEndpoint:
         assert response.status_code == 404
 
 
+
+
+class TestSharedLegacyIds:
+    """
+    The legacy app (root main.py) shares the users, groups and group_members
+    tables, so the ids it publishes live events with are the ids in auth
+    service tokens and membership lookups that the gateway checks them against
+    """
+    
+    def test_legacy_models_map_the_same_tables(self):
+        tree = ast.parse(LEGACY_MODELS.read_text())
+        tablenames = {
+            node.name: statement.value.value
+            for node in tree.body if isinstance(node, ast.ClassDef)
+            for statement in node.body
+            if isinstance(statement, ast.Assign) and statement.targets[0].id == "__tablename__"
+        }
+        assert tablenames["User"] == User.__tablename__
+        assert tablenames["Group"] == Group.__tablename__
+        
+        membership = next(
+            node.value for node in tree.body
+            if isinstance(node, ast.Assign) and node.targets[0].id == "group_members_table"
+        )
+        assert membership.args[0].value == group_members_table.name
+        assert [column.args[0].value for column in membership.args[2:]] == list(group_members_table.c.keys())
+    
+    def test_membership_written_by_legacy_ids_is_served(self, client, test_users):
+        db = TestingSessionLocal()
+        group = Group(name="Flat")
+        db.add(group)
+        db.commit()
+        group_id = group.id
+        # The legacy app writes membership rows directly by its own ids
+        db.execute(
+            text("INSERT INTO group_members (user_id, group_id) VALUES (:user_id, :group_id)"),
+            {"user_id": test_users[1].id, "group_id": group_id}
+        )
+        db.commit()
+        db.close()
+        
+        response = client.get(f"/api/v1/users/{test_users[1].id}/groups")
+        assert [g["id"] for g in response.json()] == [group_id]
 class TestAddMemberToGroupEndpoint:
     """Test POST /api/v1/groups/{group_id}/add_member/{user_id}"""
     
@@ -22,6 +22,7 @@ class Settings:
     # Celery (for async tasks)
     CELERY_BROKER_URL: str = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
     CELERY_RESULT_BACKEND: str = os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/0")
+    HEALTH_BROKER_TIMEOUT: float = float(os.getenv("HEALTH_BROKER_TIMEOUT", "2"))
     
     # CORS
     BACKEND_CORS_ORIGINS: list = ["*"]
@@ -1,9 +1,13 @@
 """
 Main FastAPI application for Notification Service
 """
+import time
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
+from app.core.celery_config import celery_app
 from app.core.config import settings
 from app.api.v1.routes import send_email, send_sms, send_push
 
@@ -45,6 +49,28 @@ def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/health/deep")
+def deep_health_check():
+    """Health check including the Celery broker connection"""
+    started = time.perf_counter()
+    try:
+        with celery_app.connection_for_write() as connection:
+            connection.ensure_connection(max_retries=1, timeout=settings.HEALTH_BROKER_TIMEOUT)
+        broker = {"status": "healthy"}
+    except Exception as e:
+        broker = {"status": "unhealthy", "error": str(e)}
+    broker["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    
+    healthy = broker["status"] == "healthy"
+    return JSONResponse(
+        status_code=200 if healthy else 503,
+        content={
+            "status": "healthy" if healthy else "unhealthy",
+            "components": {"broker": broker}
+        }
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8002)